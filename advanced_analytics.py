@@ -3,20 +3,29 @@ from datetime import datetime, timedelta
 import pandas as pd
 import numpy as np
 
-# ⚠️ Make sure you import your db and models:
-#from models import db
-from models import Student, Grade, Subject, FeePayment, FeeStatement
+from extensions import db
+from models import Student, Grade, Class, FeePayment, FeeStatement
+from fee_collections import fee_collection_service
+from sql_stats import sql_stats
+from gradebook_stats import gradebook_stats
+from risk_scoring import risk_engine
 
 class AdvancedAnalytics:
     @staticmethod
     def get_performance_trends(student_id=None, class_name=None, subject_id=None):
         """Get detailed performance trends with statistical analysis"""
+        # Spread is aggregated in the database on SQLite and PostgreSQL alike
         query = db.session.query(
             Grade.term,
             Grade.year,
             func.avg(Grade.percentage).label('avg_percentage'),
             func.count(Grade.id).label('total_grades'),
-            func.stddev(Grade.percentage).label('std_dev')
+            sql_stats.stddev(Grade.percentage).label('std_dev'),
+            sql_stats.percentile(Grade.percentage, 0.25).label('q1'),
+            sql_stats.median(Grade.percentage).label('median'),
+            sql_stats.percentile(Grade.percentage, 0.75).label('q3'),
+            func.min(Grade.percentage).label('lowest'),
+            func.max(Grade.percentage).label('highest')
         )
         
         if student_id:
@@ -38,6 +47,9 @@ class AdvancedAnalytics:
                 'average': round(result.avg_percentage or 0, 2),
                 'total_grades': result.total_grades,
                 'std_deviation': round(result.std_dev or 0, 2),
+                'median': round(result.median or 0, 2),
+                'quartiles': [round(result.q1 or 0, 2), round(result.q3 or 0, 2)],
+                'range': [round(result.lowest or 0, 2), round(result.highest or 0, 2)],
                 'improvement': 0
             }
             
@@ -50,25 +62,19 @@ class AdvancedAnalytics:
         return trends
     
     @staticmethod
-    def get_subject_performance_matrix():
+    def get_subject_performance_matrix(term=None, year=None):
         """Get performance matrix across all subjects and classes"""
-        results = db.session.query(
-            Subject.name.label('subject'),
-            Class.name.label('class_name'),
-            func.avg(Grade.percentage).label('avg_percentage'),
-            func.count(Grade.id).label('student_count')
-        ).join(Grade).join(Student).join(Class).group_by(
-            Subject.name, Class.name
-        ).all()
-        
-        # Convert to matrix format
+        # Pivoted and cached per term/year by the gradebook stats service
+        grid = gradebook_stats.matrix(term, year)
         matrix = {}
-        for result in results:
-            if result.subject not in matrix:
-                matrix[result.subject] = {}
-            matrix[result.subject][result.class_name] = {
-                'average': round(result.avg_percentage or 0, 2),
-                'count': result.student_count
+        for i, subject in enumerate(grid['subjects']):
+            matrix[subject] = {
+                class_name: {
+                    'average': grid['averages'][i][j],
+                    'count': grid['counts'][i][j]
+                }
+                for j, class_name in enumerate(grid['classes'])
+                if grid['counts'][i][j]
             }
         
         return matrix
@@ -78,15 +84,8 @@ class AdvancedAnalytics:
         """Detailed fee collection analysis"""
         current_year = datetime.now().year
         
-        # Monthly collection trends
-        monthly_data = db.session.query(
-            func.extract('month', FeePayment.payment_date).label('month'),
-            func.sum(FeePayment.amount_paid).label('total_collected'),
-            func.count(FeePayment.id).label('payment_count'),
-            func.avg(FeePayment.amount_paid).label('avg_payment')
-        ).filter(
-            func.extract('year', FeePayment.payment_date) == current_year
-        ).group_by('month').all()
+        # Monthly collection trends (from the daily rollup, O(days))
+        monthly_data = fee_collection_service.monthly_totals(current_year)
         
         # Collection efficiency by class
         class_efficiency = db.session.query(
@@ -109,64 +108,15 @@ class AdvancedAnalytics:
         ).outerjoin(FeePayment, FeePayment.student_id == FeeStatement.student_id).group_by('balance_category').all()
         
         return {
-            'monthly_trends': [dict(row._mapping) for row in monthly_data],
+            'monthly_trends': monthly_data,
             'class_efficiency': [dict(row._mapping) for row in class_efficiency],
             'overdue_analysis': [dict(row._mapping) for row in overdue_analysis]
         }
     
     @staticmethod
-    def get_student_risk_assessment():
-        """Identify students at risk based on academic and financial factors"""
-        current_year = datetime.now().year
-        current_term = "Term 1"  # TODO: Dynamically fetch current term
-        
-        # Academic risk factors
-        academic_risk = db.session.query(
-            Student.id,
-            Student.full_name,
-            Class.name.label("class"),
-            func.avg(Grade.percentage).label('avg_performance'),
-            func.count(Grade.id).label('grade_count')
-        ).join(Grade).join(Class).filter(
-            Grade.year == current_year,
-            Grade.term == current_term
-        ).group_by(Student.id, Class.name).having(
-            func.avg(Grade.percentage) < 50  # Below 50% average
-        ).all()
-        
-        # Financial risk factors
-        financial_risk = db.session.query(
-            Student.id,
-            Student.full_name,
-            func.sum(FeeStatement.amount_due - func.coalesce(FeePayment.amount_paid, 0)).label('total_balance')
-        ).join(FeeStatement).outerjoin(FeePayment, FeePayment.student_id == Student.id).group_by(Student.id).having(
-            func.sum(FeeStatement.amount_due - func.coalesce(FeePayment.amount_paid, 0)) > 20000
-        ).all()
-        
-        # Combine risks
-        risk_students = []
-        academic_dict = {s.id: s for s in academic_risk}
-        financial_dict = {s.id: s for s in financial_risk}
-        
-        all_risk_ids = set(academic_dict.keys()) | set(financial_dict.keys())
-        
-        for student_id in all_risk_ids:
-            risk_factors = []
-            if student_id in academic_dict:
-                risk_factors.append('Academic')
-            if student_id in financial_dict:
-                risk_factors.append('Financial')
-            
-            student = Student.query.get(student_id)
-            risk_students.append({
-                'student_id': student_id,
-                'name': student.full_name,
-                'class': student.current_class.name if student.current_class else "N/A",
-                'risk_factors': risk_factors,
-                'academic_avg': getattr(academic_dict.get(student_id), "avg_performance", None),
-                'outstanding_balance': getattr(financial_dict.get(student_id), "total_balance", 0)
-            })
-        
-        return risk_students
+    def get_student_risk_assessment(term=None, year=None, page=1, per_page=50, weights=None):
+        """Identify students at risk based on academic, attendance and financial factors"""
+        # Scored for the whole school at once; see risk_scoring.py
+        return risk_engine.assess(term, year, page, per_page, weights)
 
 advanced_analytics = AdvancedAnalytics()
@@ -26,7 +26,10 @@ def get_subject_matrix():
     if current_user.role not in ['admin', 'teacher']:
         return jsonify({'error': 'Access denied'}), 403
     
-    matrix = advanced_analytics.get_subject_performance_matrix()
+    term = request.args.get('term')
+    year = request.args.get('year', type=int)
+    
+    matrix = advanced_analytics.get_subject_performance_matrix(term, year)
     return jsonify({'matrix': matrix})
 
 @advanced_api.route('/analytics/fee-analysis')
@@ -46,8 +49,13 @@ def get_risk_assessment():
     if current_user.role != 'admin':
         return jsonify({'error': 'Access denied'}), 403
     
-    risk_students = advanced_analytics.get_student_risk_assessment()
-    return jsonify({'risk_students': risk_students})
+    term = request.args.get('term')
+    year = request.args.get('year', type=int)
+    page = request.args.get('page', 1, type=int)
+    per_page = request.args.get('per_page', 50, type=int)
+    
+    assessment = advanced_analytics.get_student_risk_assessment(term, year, page, per_page)
+    return jsonify(assessment)
 
 @advanced_api.route('/bulk/import-students', methods=['POST'])
 @login_required
@@ -124,6 +132,7 @@ import io
 
 # Import the service classes
 from advanced_analytics import AdvancedAnalytics
+from gradebook_stats import gradebook_stats
 from bulk_operations import BulkOperations
 from audit_logs import AuditLog, AuditLogger
 
@@ -153,9 +162,23 @@ def get_subject_matrix():
     if current_user.role not in ['admin', 'teacher']:
         return jsonify({'error': 'Access denied'}), 403
     
-    matrix = AdvancedAnalytics.get_subject_performance_matrix()
+    term = request.args.get('term')
+    year = request.args.get('year', type=int)
+    
+    matrix = AdvancedAnalytics.get_subject_performance_matrix(term, year)
     return jsonify({'matrix': matrix})
 
+@advanced_api.route('/analytics/subject-matrix/heatmap')
+@login_required
+def get_subject_heatmap():
+    """Subject x class averages as Chart.js matrix data"""
+    if current_user.role not in ['admin', 'teacher']:
+        return jsonify({'error': 'Access denied'}), 403
+    
+    term = request.args.get('term')
+    year = request.args.get('year', type=int)
+    return jsonify(gradebook_stats.heatmap(term, year))
+
 @advanced_api.route('/analytics/fee-analysis')
 @login_required
 def get_fee_analysis():
@@ -173,8 +196,13 @@ def get_at_risk_students():
     if current_user.role not in ['admin', 'teacher']:
         return jsonify({'error': 'Access denied'}), 403
     
-    students = AdvancedAnalytics.get_at_risk_students()
-    return jsonify({'students': students})
+    term = request.args.get('term')
+    year = request.args.get('year', type=int)
+    page = request.args.get('page', 1, type=int)
+    per_page = request.args.get('per_page', 50, type=int)
+    
+    assessment = AdvancedAnalytics.get_student_risk_assessment(term, year, page, per_page)
+    return jsonify(assessment)
 
 
 # Bulk Operations Endpoints
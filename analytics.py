@@ -3,6 +3,7 @@ from sqlalchemy import func, extract
 from datetime import datetime
 from collections import defaultdict
 import json
+from term_summaries import term_summary_service
 
 class AnalyticsService:
     @staticmethod
@@ -14,14 +15,10 @@ class AnalyticsService:
         
         current_year = datetime.now().year
         
-        # Academic performance over time
-        performance_trend = db.session.query(
-            Grade.term,
-            func.avg(Grade.percentage)
-        ).filter_by(
-            student_id=student_id,
-            year=current_year
-        ).group_by(Grade.term).all()
+        # Academic performance over time (one summary row per term)
+        summaries = term_summary_service.history(student_id, year=current_year)
+        performance_trend = [(s.term, s.mean) for s in summaries]
+        latest = summaries[-1] if summaries else None
         
         # Subject-wise performance
         subject_performance = db.session.query(
@@ -49,7 +46,14 @@ class AnalyticsService:
             },
             'academic': {
                 'performance_trend': dict(performance_trend),
-                'subject_performance': dict(subject_performance)
+                'subject_performance': dict(subject_performance),
+                'current_standing': {
+                    'term': latest.term,
+                    'mean': latest.mean,
+                    'rubric': latest.rubric,
+                    'rank': latest.rank,
+                    'subject_count': latest.subject_count
+                } if latest else None
             },
             'financial': {
                 'payment_history': dict(payment_history),
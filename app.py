@@ -6,10 +6,18 @@ from config import Config
 from routes.__init__ import register_blueprints
 from flask.cli import with_appcontext
 import click
-from models import Subject, User
+from sqlalchemy import func, select, or_
+from models import (
+    Subject,
+    User,
+    FeeStatement,
+    fee_status_case,
+    refresh_fee_statement_totals,
+)
 from flask_login import LoginManager
 from livereload import Server
 from template_debugger import debug_template_context
+from sql_stats import sql_stats
 
 login_manager = LoginManager()
 login_manager.login_view = "auth_bp.login"
@@ -39,6 +47,10 @@ def create_app():
     mail.init_app(app)
     login_manager.login_view = "auth_bp.login"
 
+    # SQLite lacks stddev/percentile aggregates; install them per connection
+    with app.app_context():
+        sql_stats.register(db.engine)
+
     # Add `now` to Jinja templates
     @app.context_processor
     def inject_now():
@@ -62,6 +74,23 @@ def create_app():
 
 
 # -------------------- CLI Commands -------------------- #
+def write_pdf_batch(batch, items, out_path, **options):
+    """Render ``items`` to OUT_PATH (.pdf merged, otherwise .zip) behind a progress bar."""
+    with click.progressbar(length=len(items), label="Rendering") as bar:
+        state = {"done": 0}
+
+        def progress(done, total):
+            bar.update(done - state["done"])
+            state["done"] = done
+
+        with open(out_path, "wb") as out:
+            if out_path.lower().endswith(".pdf"):
+                batch.write_merged(items, out, on_progress=progress, **options)
+            else:
+                for chunk in batch.stream_zip(items, on_progress=progress, **options):
+                    out.write(chunk)
+
+
 def register_cli(app):
     @app.cli.command("seed_subjects")
     @with_appcontext
@@ -107,6 +136,153 @@ def register_cli(app):
         db.session.commit()
         click.echo(f"✅ Seed complete! {added} subjects added or updated.")
 
+    @app.cli.command("repair_fee_ledger")
+    @click.option("--dry-run", is_flag=True, help="Only report drifted statements.")
+    @click.option("--batch-size", default=500, show_default=True)
+    @with_appcontext
+    def repair_fee_ledger(dry_run, batch_size):
+        """Backfill/repair FeeStatement paid, balance and status from payments."""
+        paid = FeeStatement.ledger_paid
+        credited = FeeStatement.ledger_credited
+        expected_status = fee_status_case(FeeStatement.ledger_balance, paid + credited)
+        drifted_ids = db.session.scalars(
+            select(FeeStatement.id).where(
+                or_(
+                    func.abs(FeeStatement.amount_paid - paid) > 0.005,
+                    func.abs(FeeStatement.amount_credited - credited) > 0.005,
+                    func.abs(FeeStatement.balance - FeeStatement.ledger_balance) > 0.005,
+                    FeeStatement.status != expected_status,
+                )
+            )
+        ).all()
+
+        if dry_run or not drifted_ids:
+            click.echo(f"{len(drifted_ids)} fee statement(s) out of sync.")
+            return
+
+        for start in range(0, len(drifted_ids), batch_size):
+            refresh_fee_statement_totals(
+                db.session.connection(), drifted_ids[start : start + batch_size]
+            )
+        db.session.commit()
+        click.echo(f"✅ Repaired {len(drifted_ids)} fee statement(s).")
+
+    @app.cli.command("reconcile_statement")
+    @click.argument("path", type=click.Path(exists=True, dir_okay=False))
+    @click.option("--source", default="M-Pesa", show_default=True)
+    @click.option("--post", is_flag=True, help="Post matched lines as payments.")
+    @with_appcontext
+    def reconcile_statement(path, source, post):
+        """Match a bank / M-Pesa statement CSV against fee payments."""
+        from fee_reconciliation import fee_reconciliation_service
+
+        with open(path, "rb") as stream:
+            result = fee_reconciliation_service.reconcile(stream, source=source)
+
+        for key in ("matched", "already_posted", "ambiguous", "unmatched"):
+            click.echo(f"{key}: {len(result[key])}")
+        for line in result["ambiguous"] + result["unmatched"]:
+            click.echo(f"  line {line['line']} {line['reference']}: {line['reason']}")
+
+        if post:
+            posted = fee_reconciliation_service.post_matches(result)
+            click.echo(f"✅ Posted {posted['payments_created']} payment(s).")
+
+    @app.cli.command("snapshot_finance_kpis")
+    @with_appcontext
+    def snapshot_finance_kpis():
+        """Store today's finance KPI snapshot (safe to re-run)."""
+        from finance_kpis import finance_kpi_service
+
+        snapshot = finance_kpi_service.take_snapshot()
+        click.echo(f"✅ Finance KPIs snapshotted for {snapshot.snapshot_date}.")
+
+    @app.cli.command("batch_fee_statements")
+    @click.argument("out_path", type=click.Path(dir_okay=False, writable=True))
+    @click.option("--year", type=int, default=lambda: datetime.utcnow().year)
+    @click.option("--class-id", type=int, default=None, help="Omit for the whole school")
+    @click.option("--workers", type=int, default=None, help="Render processes (default: CPUs)")
+    @with_appcontext
+    def batch_fee_statements(out_path, year, class_id, workers):
+        """Render fee statements to OUT_PATH (.pdf merged, otherwise .zip)."""
+        from fee_statement_pdfs import fee_statement_batch
+
+        documents = fee_statement_batch.load(year, class_id=class_id)
+        if not documents:
+            click.echo("No students in scope.")
+            return
+
+        write_pdf_batch(fee_statement_batch, documents, out_path, workers=workers)
+        click.echo(f"✅ {len(documents)} statement(s) written to {out_path}.")
+
+    @app.cli.command("batch_report_cards")
+    @click.argument("out_path", type=click.Path(dir_okay=False, writable=True))
+    @click.option("--term", required=True)
+    @click.option("--year", type=int, default=lambda: datetime.utcnow().year)
+    @click.option("--class-id", type=int, default=None, help="Omit for the whole school")
+    @click.option("--workers", type=int, default=None, help="Render processes (default: CPUs)")
+    @with_appcontext
+    def batch_report_cards(out_path, term, year, class_id, workers):
+        """Render report cards to OUT_PATH (.pdf merged, otherwise .zip)."""
+        from report_card_pdfs import report_card_batch, load_render_context
+
+        cards = report_card_batch.load(term, year, class_id=class_id)
+        if not cards:
+            click.echo("No students in scope.")
+            return
+        write_pdf_batch(
+            report_card_batch,
+            cards,
+            out_path,
+            context=load_render_context(),
+            workers=workers,
+        )
+        click.echo(f"✅ {len(cards)} report card(s) written to {out_path}.")
+
+    @app.cli.command("backfill_fee_collections")
+    @click.option("--from", "date_from", type=click.DateTime(formats=["%Y-%m-%d"]))
+    @click.option("--to", "date_to", type=click.DateTime(formats=["%Y-%m-%d"]))
+    @click.option("--batch-days", default=31, show_default=True)
+    @with_appcontext
+    def backfill_fee_collections(date_from, date_to, batch_days):
+        """Rebuild the daily fee collection rollup from fee_payments."""
+        from fee_collections import fee_collection_service
+
+        result = fee_collection_service.backfill(date_from, date_to, batch_days)
+        click.echo(
+            f"✅ Rebuilt {result['days']} day(s) of collections ({result['rows']} rollup rows)."
+        )
+
+
+    @app.cli.command("rank_results")
+    @click.option("--term", required=True)
+    @click.option("--year", type=int, required=True)
+    @click.option("--exam-type", default="Summative", show_default=True)
+    @click.option("--level", default=None, help="Only rank classes of this level.")
+    @with_appcontext
+    def rank_results(term, year, exam_type, level):
+        """Compute positions and store result snapshots for a term's exam."""
+        from results import results_engine
+
+        if level:
+            snapshots = results_engine.rank_level(level, term, year, exam_type)
+        else:
+            snapshots = results_engine.rank_school(term, year, exam_type)
+        students = sum(s.student_count for s in snapshots)
+        click.echo(f"✅ Ranked {students} student(s) across {len(snapshots)} class(es).")
+
+    @app.cli.command("rebuild_term_summaries")
+    @click.option("--year", type=int, default=None, help="Only rebuild one year")
+    @click.option("--batch-size", default=500, show_default=True)
+    @with_appcontext
+    def rebuild_term_summaries(year, batch_size):
+        """Recompute student_term_summary from grades."""
+        from term_summaries import term_summary_service
+
+        result = term_summary_service.rebuild(year, batch_size)
+        click.echo(
+            f"✅ Rebuilt {result['rows']} summary row(s) from {result['keys']} student term(s)."
+        )
 
 # -------------------- App Runner -------------------- #
 app = create_app()
@@ -29,6 +29,17 @@ class Config:
     # Pagination
     STUDENTS_PER_PAGE = 20
     GRADES_PER_PAGE = 50
+    # Seconds to cache school/class/term fee balance aggregates
+    FEE_BALANCE_CACHE_TTL = int(os.environ.get('FEE_BALANCE_CACHE_TTL') or 30)
+    RECEIPT_BLOCK_SIZE = int(os.environ.get('RECEIPT_BLOCK_SIZE') or 20)
+    SUBJECT_INDEX_TTL = int(os.environ.get('SUBJECT_INDEX_TTL') or 300)
+    # Per-process cache: other workers serve stats up to this many seconds old
+    GRADEBOOK_STATS_CACHE_TTL = int(os.environ.get('GRADEBOOK_STATS_CACHE_TTL') or 60)
+    # CBC rubric bands [(minimum, code, level, points[, color]), ...]; None = rubric.DEFAULT_BANDS
+    CBC_RUBRIC = None
+    # Early-warning weights {"academic", "trend", "attendance", "financial"}; None = risk_scoring.DEFAULT_WEIGHTS
+    RISK_WEIGHTS = None
+    RISK_ATTENDANCE_DAYS = int(os.environ.get('RISK_ATTENDANCE_DAYS') or 90)
     # SMS Configuration (Fill this in with your Africa's Talking API key)
     SMS_API_KEY = 'your_africas_talking_api_key'
     SMS_SENDER_ID = 'TUSOME'
@@ -6,6 +6,7 @@ from flask_login import current_user
 from sqlalchemy import func
 from extensions import db
 from models import FeeStatement, Student, User
+from rubric import rubric
 
 
 
@@ -224,11 +225,4 @@ def normalize_cbc(value: str):
 
 def convert_to_cbc(marks: float) -> str:
     """Convert numeric marks into a CBC level (school can customize thresholds)."""
-    if marks >= 80:
-        return "Exceeding Expectations"
-    elif marks >= 50:
-        return "Meeting Expectations"
-    elif marks >= 30:
-        return "Approaching Expectations"
-    else:
-        return "Below Expectations"
+    return rubric().level(marks)
@@ -0,0 +1,124 @@
+# fee_balances.py
+# Set-based fee balance aggregates (school / class / term) with a short TTL cache
+import time
+from flask import current_app, has_app_context
+from sqlalchemy import func, case
+from extensions import db
+from models import FeeStatement, Student, Class
+
+DEFAULT_CACHE_TTL = 30  # seconds; override with FEE_BALANCE_CACHE_TTL
+
+_cache = {}
+
+
+def _aggregate_columns():
+    positive_balance = case((FeeStatement.balance > 0, FeeStatement.balance), else_=0)
+    return (
+        func.coalesce(func.sum(FeeStatement.amount_due), 0).label("total_due"),
+        func.coalesce(func.sum(FeeStatement.amount_paid), 0).label("total_paid"),
+        func.coalesce(func.sum(FeeStatement.balance), 0).label("balance"),
+        func.coalesce(func.sum(positive_balance), 0).label("outstanding"),
+        func.count(FeeStatement.id).label("statement_count"),
+        func.count(
+            func.distinct(case((FeeStatement.balance > 0, FeeStatement.student_id)))
+        ).label("students_owing"),
+    )
+
+
+def _row_to_dict(row, *keys):
+    data = {key: getattr(row, key) for key in keys}
+    data.update(
+        {
+            "total_due": float(row.total_due or 0),
+            "total_paid": float(row.total_paid or 0),
+            "balance": float(row.balance or 0),
+            "outstanding": float(row.outstanding or 0),
+            "statement_count": row.statement_count,
+            "students_owing": row.students_owing,
+        }
+    )
+    return data
+
+
+def _scoped(query, year, term):
+    if year:
+        query = query.filter(FeeStatement.year == year)
+    if term:
+        query = query.filter(FeeStatement.term == term)
+    return query
+
+
+class FeeBalanceService:
+    @staticmethod
+    def _cached(key, compute, use_cache=True):
+        if not use_cache:
+            return compute()
+
+        ttl = DEFAULT_CACHE_TTL
+        if has_app_context():
+            ttl = current_app.config.get("FEE_BALANCE_CACHE_TTL", DEFAULT_CACHE_TTL)
+
+        now = time.monotonic()
+        hit = _cache.get(key)
+        if hit and now - hit[0] < ttl:
+            return hit[1]
+
+        value = compute()
+        _cache[key] = (now, value)
+        return value
+
+    @staticmethod
+    def invalidate():
+        """Drop all cached aggregates (e.g. after a bulk posting)."""
+        _cache.clear()
+
+    @staticmethod
+    def school_totals(year=None, term=None, use_cache=True):
+        """Due / paid / balance across the whole school in one statement."""
+
+        def compute():
+            row = _scoped(db.session.query(*_aggregate_columns()), year, term).one()
+            return _row_to_dict(row)
+
+        return FeeBalanceService._cached(("school", year, term), compute, use_cache)
+
+    @staticmethod
+    def by_class(year=None, term=None, use_cache=True):
+        """Per-class aggregates, largest outstanding first."""
+
+        def compute():
+            query = (
+                db.session.query(
+                    Class.id.label("class_id"),
+                    Class.name.label("class_name"),
+                    *_aggregate_columns(),
+                )
+                .select_from(FeeStatement)
+                .join(Student, Student.id == FeeStatement.student_id)
+                .outerjoin(Class, Class.id == Student.current_class_id)
+                .group_by(Class.id, Class.name)
+            )
+            rows = _scoped(query, year, term).all()
+            results = [_row_to_dict(row, "class_id", "class_name") for row in rows]
+            return sorted(results, key=lambda r: r["outstanding"], reverse=True)
+
+        return FeeBalanceService._cached(("class", year, term), compute, use_cache)
+
+    @staticmethod
+    def by_term(year=None, use_cache=True):
+        """Per (year, term) aggregates, most recent first."""
+
+        def compute():
+            query = db.session.query(
+                FeeStatement.year.label("year"),
+                FeeStatement.term.label("term"),
+                *_aggregate_columns(),
+            ).group_by(FeeStatement.year, FeeStatement.term)
+            rows = _scoped(query, year, None).all()
+            results = [_row_to_dict(row, "year", "term") for row in rows]
+            return sorted(results, key=lambda r: (r["year"], r["term"]), reverse=True)
+
+        return FeeBalanceService._cached(("term", year), compute, use_cache)
+
+
+fee_balance_service = FeeBalanceService()
@@ -0,0 +1,83 @@
+# fee_billing.py
+# Set-based fee statement generation for a class or the whole school
+from datetime import datetime
+from sqlalchemy import select, insert, and_, exists, func
+from extensions import db
+from models import FeeStatement, Student
+
+
+class FeeBillingService:
+    @staticmethod
+    def _target_students(class_id=None):
+        query = select(Student.id)
+        if class_id:
+            query = query.where(Student.current_class_id == class_id)
+        return query
+
+    @staticmethod
+    def missing_student_ids(term, year, fee_type, class_id=None):
+        """Students in scope without a statement for (term, year, fee_type) - one anti-join."""
+        already_billed = exists().where(
+            and_(
+                FeeStatement.student_id == Student.id,
+                FeeStatement.term == term,
+                FeeStatement.year == year,
+                FeeStatement.fee_type == fee_type,
+            )
+        )
+        query = FeeBillingService._target_students(class_id).where(~already_billed)
+        return db.session.scalars(query.order_by(Student.id)).all()
+
+    @staticmethod
+    def generate(
+        term, year, fee_type, amount_due, class_id=None, due_date=None, dry_run=False
+    ):
+        """
+        Create missing statements with a single executemany in one transaction.
+        Returns {"created", "skipped", "targeted", "student_ids", "dry_run"}.
+        """
+        targeted = db.session.scalar(
+            select(func.count()).select_from(
+                FeeBillingService._target_students(class_id).subquery()
+            )
+        )
+        student_ids = FeeBillingService.missing_student_ids(
+            term, year, fee_type, class_id
+        )
+        result = {
+            "targeted": targeted,
+            "created": len(student_ids),
+            "skipped": targeted - len(student_ids),
+            "student_ids": student_ids,
+            "dry_run": dry_run,
+        }
+        if dry_run or not student_ids:
+            return result
+
+        now = datetime.utcnow()
+        rows = [
+            {
+                "student_id": student_id,
+                "term": term,
+                "year": year,
+                "fee_type": fee_type,
+                "amount_due": amount_due,
+                "due_date": due_date,
+                "amount_paid": 0,
+                "amount_credited": 0,
+                "balance": amount_due,
+                "status": "paid" if amount_due <= 0 else "unpaid",
+                "created_at": now,
+            }
+            for student_id in student_ids
+        ]
+        try:
+            db.session.execute(insert(FeeStatement), rows)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        return result
+
+
+fee_billing_service = FeeBillingService()
@@ -0,0 +1,171 @@
+# fee_collections.py
+# Fee collection time series served from the fee_collection_daily rollup.
+# The rollup is kept current by the session flush hook in models.py; chart
+# queries therefore scan one row per day/dimension, never raw payments.
+from datetime import date, datetime, timedelta
+from sqlalchemy import func
+from extensions import db
+from models import FeeCollectionDaily, FeePayment, refresh_fee_collection_daily
+
+RESOLUTIONS = ("daily", "weekly", "monthly", "termly")
+TERM_ORDER = {"Term 1": 1, "Term 2": 2, "Term 3": 3}
+
+
+def _period_start(day, resolution):
+    if resolution == "weekly":
+        return day - timedelta(days=day.weekday())
+    if resolution == "monthly":
+        return day.replace(day=1)
+    return day
+
+
+def _next_period(day, resolution):
+    if resolution == "weekly":
+        return day + timedelta(days=7)
+    if resolution == "monthly":
+        return (day.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return day + timedelta(days=1)
+
+
+class FeeCollectionService:
+    @staticmethod
+    def query(
+        date_from=None,
+        date_to=None,
+        class_id=None,
+        fee_type=None,
+        payment_method=None,
+        term=None,
+        year=None,
+    ):
+        query = FeeCollectionDaily.query
+        if date_from:
+            query = query.filter(FeeCollectionDaily.day >= date_from)
+        if date_to:
+            query = query.filter(FeeCollectionDaily.day <= date_to)
+        if class_id:
+            query = query.filter(FeeCollectionDaily.class_id == class_id)
+        if fee_type:
+            query = query.filter(FeeCollectionDaily.fee_type == fee_type)
+        if payment_method:
+            query = query.filter(FeeCollectionDaily.payment_method == payment_method)
+        if term:
+            query = query.filter(FeeCollectionDaily.term == term)
+        if year:
+            query = query.filter(FeeCollectionDaily.year == year)
+        return query
+
+    @staticmethod
+    def series(resolution="daily", date_from=None, date_to=None, **filters):
+        """
+        [{"period", "payments", "amount"}] oldest first. Daily/weekly/monthly
+        periods are zero-filled when both bounds are given; termly periods are
+        the term/year of the statements paid against.
+        """
+        if resolution not in RESOLUTIONS:
+            raise ValueError(f"resolution must be one of {', '.join(RESOLUTIONS)}")
+
+        base = FeeCollectionService.query(date_from, date_to, **filters)
+        count = func.coalesce(func.sum(FeeCollectionDaily.payment_count), 0)
+        amount = func.coalesce(func.sum(FeeCollectionDaily.amount_total), 0)
+
+        if resolution == "termly":
+            rows = (
+                base.with_entities(
+                    FeeCollectionDaily.year, FeeCollectionDaily.term, count, amount
+                )
+                .group_by(FeeCollectionDaily.year, FeeCollectionDaily.term)
+                .all()
+            )
+            rows.sort(key=lambda r: (r[0] or 0, TERM_ORDER.get(r[1], 99), r[1] or ""))
+            return [
+                {
+                    "period": f"{term or 'Unassigned'} {year or ''}".strip(),
+                    "year": year,
+                    "term": term,
+                    "payments": int(n),
+                    "amount": round(float(total), 2),
+                }
+                for year, term, n, total in rows
+            ]
+
+        rows = (
+            base.with_entities(FeeCollectionDaily.day, count, amount)
+            .group_by(FeeCollectionDaily.day)
+            .order_by(FeeCollectionDaily.day)
+            .all()
+        )
+        buckets = {}
+        for day, n, total in rows:
+            key = _period_start(day, resolution)
+            bucket = buckets.setdefault(key, [0, 0.0])
+            bucket[0] += int(n)
+            bucket[1] += float(total)
+
+        if date_from and date_to:
+            cursor = _period_start(date_from, resolution)
+            while cursor <= date_to:
+                buckets.setdefault(cursor, [0, 0.0])
+                cursor = _next_period(cursor, resolution)
+
+        return [
+            {"period": key.isoformat(), "payments": n, "amount": round(total, 2)}
+            for key, (n, total) in sorted(buckets.items())
+        ]
+
+    @staticmethod
+    def monthly_totals(year):
+        """Month -> collected / count / average payment for one calendar year."""
+        rows = FeeCollectionService.series(
+            "monthly", date(year, 1, 1), date(year, 12, 31)
+        )
+        return [
+            {
+                "month": int(row["period"][5:7]),
+                "total_collected": row["amount"],
+                "payment_count": row["payments"],
+                "avg_payment": round(row["amount"] / row["payments"], 2)
+                if row["payments"]
+                else 0,
+            }
+            for row in rows
+        ]
+
+    @staticmethod
+    def backfill(date_from=None, date_to=None, batch_days=31):
+        """
+        Rebuild the rollup from fee_payments, ``batch_days`` days per
+        transaction. Defaults to the full span of recorded payments.
+        """
+        if date_from is None or date_to is None:
+            first, last = db.session.query(
+                func.min(FeePayment.payment_date), func.max(FeePayment.payment_date)
+            ).one()
+            if first is None:
+                return {"days": 0, "rows": 0}
+            date_from = date_from or first.date()
+            date_to = date_to or last.date()
+        if isinstance(date_from, datetime):
+            date_from = date_from.date()
+        if isinstance(date_to, datetime):
+            date_to = date_to.date()
+
+        days = rows = 0
+        cursor = date_from
+        while cursor <= date_to:
+            window_end = min(cursor + timedelta(days=batch_days - 1), date_to)
+            window = [
+                cursor + timedelta(days=i) for i in range((window_end - cursor).days + 1)
+            ]
+            try:
+                rows += refresh_fee_collection_daily(db.session.connection(), window)
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
+            days += len(window)
+            cursor = window_end + timedelta(days=1)
+        return {"days": days, "rows": rows}
+
+
+fee_collection_service = FeeCollectionService()
@@ -0,0 +1,228 @@
+# fee_credits.py
+# Apply bursary / scholarship awards against outstanding fee statements for a term.
+# Every allocation is a FeeCredit row (the audit trail), one per award and
+# statement: later runs top that row up, and awards reduced below what they
+# already credited give the excess back. Statement balances are then refreshed
+# with one set-based UPDATE.
+from datetime import datetime
+from sqlalchemy import bindparam, delete, func, insert, literal, or_, tuple_
+from extensions import db
+from models import (
+    Bursary,
+    Scholarship,
+    FeeCredit,
+    FeeStatement,
+    FinanceAuditLog,
+    refresh_fee_statement_totals,
+)
+
+SOURCES = (("bursary", Bursary), ("scholarship", Scholarship))
+CHUNK_SIZE = 500
+
+
+class SponsorshipAllocator:
+    @staticmethod
+    def award_balances(term, year):
+        """
+        Awards for the term whose credits do not add up to the award amount,
+        one grouped query per source. Returns [(source, id, student_id,
+        remaining)]; remaining is negative for awards reduced below what they
+        have already credited.
+        """
+        awards = []
+        for source, model in SOURCES:
+            allocated = (
+                db.session.query(
+                    FeeCredit.source_id.label("source_id"),
+                    func.sum(FeeCredit.amount).label("allocated"),
+                )
+                .filter(FeeCredit.source == source)
+                .group_by(FeeCredit.source_id)
+                .subquery()
+            )
+            remaining = model.amount - func.coalesce(allocated.c.allocated, 0)
+            rows = (
+                db.session.query(
+                    literal(source), model.id, model.student_id, remaining
+                )
+                .outerjoin(allocated, allocated.c.source_id == model.id)
+                .filter(
+                    model.term == term,
+                    model.year == year,
+                    or_(remaining > 0.005, remaining < -0.005),
+                )
+                .order_by(model.id)
+                .all()
+            )
+            awards.extend((source, i, s, float(r)) for _src, i, s, r in rows)
+        return awards
+
+    @staticmethod
+    def existing_credits(award_keys):
+        """(source, source_id) -> [[credit_id, statement_id, amount]] oldest due first."""
+        by_award = {}
+        award_keys = list(award_keys)
+        for start in range(0, len(award_keys), CHUNK_SIZE):
+            rows = (
+                db.session.query(
+                    FeeCredit.id,
+                    FeeCredit.source,
+                    FeeCredit.source_id,
+                    FeeCredit.fee_statement_id,
+                    FeeCredit.amount,
+                )
+                .join(FeeStatement, FeeStatement.id == FeeCredit.fee_statement_id)
+                .filter(
+                    tuple_(FeeCredit.source, FeeCredit.source_id).in_(
+                        award_keys[start : start + CHUNK_SIZE]
+                    )
+                )
+                .order_by(FeeStatement.due_date, FeeStatement.id)
+                .all()
+            )
+            for credit_id, source, source_id, statement_id, amount in rows:
+                by_award.setdefault((source, source_id), []).append(
+                    [credit_id, statement_id, float(amount)]
+                )
+        return by_award
+
+    @staticmethod
+    def open_statements(student_ids, term, year):
+        """student_id -> [[statement_id, balance]] oldest due first."""
+        by_student = {}
+        student_ids = list(student_ids)
+        for start in range(0, len(student_ids), CHUNK_SIZE):
+            rows = (
+                db.session.query(
+                    FeeStatement.id, FeeStatement.student_id, FeeStatement.balance
+                )
+                .filter(
+                    FeeStatement.student_id.in_(student_ids[start : start + CHUNK_SIZE]),
+                    FeeStatement.term == term,
+                    FeeStatement.year == year,
+                    FeeStatement.balance > 0,
+                )
+                .order_by(FeeStatement.due_date, FeeStatement.id)
+                .all()
+            )
+            for statement_id, student_id, balance in rows:
+                by_student.setdefault(student_id, []).append([statement_id, float(balance)])
+        return by_student
+
+    @staticmethod
+    def allocate(term, year, user_id=None, dry_run=False):
+        """
+        Apply every unallocated award for (term, year) to that student's open
+        statements, topping up the award's existing credit on a statement
+        rather than adding a second one. Awards reduced below what they have
+        credited give the excess back, latest-due statement first; balances
+        reopened that way are picked up by the next run. Returns a summary
+        dict; with dry_run nothing is written.
+        """
+        awards = SponsorshipAllocator.award_balances(term, year)
+        credits = SponsorshipAllocator.existing_credits((a[0], a[1]) for a in awards)
+        statements = SponsorshipAllocator.open_statements(
+            {a[2] for a in awards if a[3] > 0}, term, year
+        )
+
+        inserts, adjustments, removed, touched = [], [], [], set()
+        applied = reversed_amount = unapplied = 0.0
+        now = datetime.utcnow()
+        for source, source_id, student_id, remaining in awards:
+            existing = credits.get((source, source_id), [])
+            if remaining < 0:
+                excess = -remaining
+                for credit_id, statement_id, amount in reversed(existing):
+                    if excess <= 0.005:
+                        break
+                    take = round(min(amount, excess), 2)
+                    excess = round(excess - take, 2)
+                    reversed_amount += take
+                    if take >= amount - 0.005:
+                        removed.append(credit_id)
+                    else:
+                        adjustments.append({"b_id": credit_id, "b_amount": -take})
+                    touched.add(statement_id)
+                continue
+
+            credited = {statement_id: credit_id for credit_id, statement_id, _a in existing}
+            for entry in statements.get(student_id, ()):
+                if remaining <= 0.005:
+                    break
+                statement_id, balance = entry
+                if balance <= 0.005:
+                    continue
+                amount = round(min(balance, remaining), 2)
+                entry[1] = round(balance - amount, 2)
+                remaining = round(remaining - amount, 2)
+                applied += amount
+                if statement_id in credited:
+                    adjustments.append({"b_id": credited[statement_id], "b_amount": amount})
+                else:
+                    inserts.append(
+                        {
+                            "fee_statement_id": statement_id,
+                            "student_id": student_id,
+                            "source": source,
+                            "source_id": source_id,
+                            "amount": amount,
+                            "created_by": user_id,
+                            "created_at": now,
+                        }
+                    )
+                touched.add(statement_id)
+            unapplied += max(remaining, 0)
+
+        summary = {
+            "term": term,
+            "year": year,
+            "awards": len(awards),
+            "credits": len(inserts) + sum(1 for a in adjustments if a["b_amount"] > 0),
+            "amount_applied": round(applied, 2),
+            "amount_reversed": round(reversed_amount, 2),
+            "amount_unapplied": round(unapplied, 2),
+            "statements": len(touched),
+            "dry_run": dry_run,
+        }
+        if dry_run or not touched:
+            return summary
+
+        try:
+            if inserts:
+                db.session.execute(insert(FeeCredit), inserts)
+            if adjustments:
+                # Core table: an executemany UPDATE keyed on a bound id
+                table = FeeCredit.__table__
+                db.session.execute(
+                    table.update()
+                    .where(table.c.id == bindparam("b_id"))
+                    .values(amount=table.c.amount + bindparam("b_amount")),
+                    adjustments,
+                )
+            for start in range(0, len(removed), CHUNK_SIZE):
+                db.session.execute(
+                    delete(FeeCredit).where(
+                        FeeCredit.id.in_(removed[start : start + CHUNK_SIZE])
+                    )
+                )
+            touched = list(touched)
+            for start in range(0, len(touched), CHUNK_SIZE):
+                refresh_fee_statement_totals(
+                    db.session.connection(), touched[start : start + CHUNK_SIZE]
+                )
+            db.session.add(
+                FinanceAuditLog(
+                    user_id=user_id,
+                    action=f"Applied {summary['credits']} sponsorship credit(s), "
+                    f"reversed KES {summary['amount_reversed']:,.2f} for {term} {year}",
+                    entity="fee_credits",
+                )
+            )
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        return summary
+
+
+sponsorship_allocator = SponsorshipAllocator()
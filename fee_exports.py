@@ -0,0 +1,153 @@
+# fee_exports.py
+# Streaming exports of the payments and fee statement ledgers (CSV / XLSX / NDJSON).
+# Rows come from one joined, column-only query read in yield_per windows, so
+# memory stays flat no matter how many years of ledger are exported.
+import csv
+import json
+import tempfile
+from datetime import date, datetime
+from io import StringIO
+from openpyxl import Workbook
+from extensions import db
+from models import FeePayment, FeeStatement, Student, Class
+
+FORMATS = ("csv", "xlsx", "ndjson")
+BATCH_SIZE = 1000
+
+# dataset -> [(key, header, column)]
+DATASETS = {
+    "payments": [
+        ("receipt_no", "Receipt", FeePayment.receipt_no),
+        ("payment_date", "Date Paid", FeePayment.payment_date),
+        ("admission_number", "Adm No", Student.admission_number),
+        ("student_name", "Student", Student.full_name),
+        ("class_name", "Class", Class.name),
+        ("fee_type", "Fee Type", FeeStatement.fee_type),
+        ("term", "Term", FeeStatement.term),
+        ("year", "Year", FeeStatement.year),
+        ("amount_paid", "Paid", FeePayment.amount_paid),
+        ("balance", "Statement Balance", FeeStatement.balance),
+        ("payment_method", "Method", FeePayment.payment_method),
+        ("reference", "Bank/M-Pesa Ref", FeePayment.reference),
+        ("reconciled_at", "Reconciled", FeePayment.reconciled_at),
+    ],
+    "statements": [
+        ("statement_id", "Statement", FeeStatement.id),
+        ("admission_number", "Adm No", Student.admission_number),
+        ("student_name", "Student", Student.full_name),
+        ("class_name", "Class", Class.name),
+        ("fee_type", "Fee Type", FeeStatement.fee_type),
+        ("term", "Term", FeeStatement.term),
+        ("year", "Year", FeeStatement.year),
+        ("amount_due", "Due", FeeStatement.amount_due),
+        ("amount_paid", "Paid", FeeStatement.amount_paid),
+        ("balance", "Balance", FeeStatement.balance),
+        ("status", "Status", FeeStatement.status),
+        ("due_date", "Due Date", FeeStatement.due_date),
+    ],
+}
+
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return str(value)
+
+
+class LedgerExporter:
+    @staticmethod
+    def columns(dataset):
+        if dataset not in DATASETS:
+            raise ValueError(f"dataset must be one of {', '.join(DATASETS)}")
+        return DATASETS[dataset]
+
+    @staticmethod
+    def query(
+        dataset="payments",
+        date_from=None,
+        date_to=None,
+        class_id=None,
+        term=None,
+        year=None,
+        student_id=None,
+    ):
+        columns = LedgerExporter.columns(dataset)
+        query = db.session.query(*[col.label(key) for key, _h, col in columns])
+
+        if dataset == "payments":
+            query = (
+                query.select_from(FeePayment)
+                .join(FeeStatement, FeeStatement.id == FeePayment.fee_statement_id)
+                .join(Student, Student.id == FeePayment.student_id)
+                .outerjoin(Class, Class.id == Student.current_class_id)
+            )
+            date_column = FeePayment.payment_date
+            order = (FeePayment.payment_date, FeePayment.id)
+        else:
+            query = (
+                query.select_from(FeeStatement)
+                .join(Student, Student.id == FeeStatement.student_id)
+                .outerjoin(Class, Class.id == Student.current_class_id)
+            )
+            date_column = FeeStatement.created_at
+            order = (FeeStatement.year, FeeStatement.term, FeeStatement.id)
+
+        if date_from:
+            query = query.filter(date_column >= date_from)
+        if date_to:
+            query = query.filter(date_column < date_to)
+        if class_id:
+            query = query.filter(Student.current_class_id == class_id)
+        if term:
+            query = query.filter(FeeStatement.term == term)
+        if year:
+            query = query.filter(FeeStatement.year == year)
+        if student_id:
+            query = query.filter(Student.id == student_id)
+        return query.order_by(*order)
+
+    @staticmethod
+    def iter_rows(dataset="payments", batch_size=BATCH_SIZE, **filters):
+        """Yield plain dicts, ``batch_size`` rows per database round trip."""
+        query = LedgerExporter.query(dataset, **filters)
+        for row in query.yield_per(batch_size):
+            yield dict(row._mapping)
+
+    @staticmethod
+    def stream_csv(dataset, rows):
+        columns = LedgerExporter.columns(dataset)
+        buffer = StringIO()
+        writer = csv.writer(buffer)
+
+        writer.writerow([header for _k, header, _c in columns])
+        for row in rows:
+            writer.writerow(
+                ["" if row[key] is None else row[key] for key, _h, _c in columns]
+            )
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate(0)
+        yield buffer.getvalue()
+
+    @staticmethod
+    def stream_ndjson(dataset, rows):
+        for row in rows:
+            yield json.dumps(row, default=_json_default) + "\n"
+
+    @staticmethod
+    def write_xlsx(dataset, rows):
+        """Write rows with openpyxl's write-only workbook into a spooled temp file."""
+        columns = LedgerExporter.columns(dataset)
+        workbook = Workbook(write_only=True)
+        sheet = workbook.create_sheet(title=dataset.title())
+        sheet.append([header for _k, header, _c in columns])
+        for row in rows:
+            sheet.append([row[key] for key, _h, _c in columns])
+
+        out = tempfile.SpooledTemporaryFile(max_size=5 * 1024 * 1024)
+        workbook.save(out)
+        out.seek(0)
+        return out
+
+
+ledger_exporter = LedgerExporter()
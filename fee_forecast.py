@@ -0,0 +1,300 @@
+# fee_forecast.py
+# Fee collection forecasting and cash-flow scenarios.
+# Historical collections (from the fee_collection_daily rollup) are loaded into
+# NumPy arrays and turned into per-class cumulative collection curves against
+# days since the term opened. Open and upcoming terms are projected along those
+# curves, and a vectorized Monte Carlo compares collections with payroll.
+from datetime import date, datetime
+import numpy as np
+from sqlalchemy import func, case
+from extensions import db
+from models import FeeCollectionDaily, FeeStatement, Student, StaffSalary
+
+HORIZON_DAYS = 150  # collections tracked this many days after a term opens
+DEFAULT_SIMULATIONS = 2000
+TERMS = ("Term 1", "Term 2", "Term 3")
+DEFAULT_CV = 0.15  # spread of final collection rate when history is thin
+DEFAULT_PAYROLL_CV = 0.02
+
+
+def _shift_year(day, years):
+    try:
+        return day.replace(year=day.year + years)
+    except ValueError:  # 29 February
+        return day.replace(year=day.year + years, day=28)
+
+
+class FeeForecastService:
+    @staticmethod
+    def term_openings():
+        """(year, term) -> date the term was first billed."""
+        rows = db.session.query(
+            FeeStatement.year, FeeStatement.term, func.min(FeeStatement.created_at)
+        ).group_by(FeeStatement.year, FeeStatement.term)
+        return {
+            (year, term): opened.date() if isinstance(opened, datetime) else opened
+            for year, term, opened in rows
+            if opened
+        }
+
+    @staticmethod
+    def billing():
+        """(year, term, class_id) -> (billed, settled, outstanding)."""
+        outstanding = case((FeeStatement.balance > 0, FeeStatement.balance), else_=0)
+        rows = (
+            db.session.query(
+                FeeStatement.year,
+                FeeStatement.term,
+                Student.current_class_id,
+                func.coalesce(func.sum(FeeStatement.amount_due), 0),
+                func.coalesce(
+                    func.sum(FeeStatement.amount_paid + FeeStatement.amount_credited), 0
+                ),
+                func.coalesce(func.sum(outstanding), 0),
+            )
+            .join(Student, Student.id == FeeStatement.student_id)
+            .group_by(FeeStatement.year, FeeStatement.term, Student.current_class_id)
+        )
+        return {
+            (y, t, c): (float(billed), float(settled), float(owing))
+            for y, t, c, billed, settled, owing in rows
+        }
+
+    @staticmethod
+    def fit_curves(openings, billing, today, horizon=HORIZON_DAYS):
+        """
+        Cumulative fraction-collected curves per class from completed terms.
+        Returns (class_ids, curves[n_classes, horizon+1], cv[n_classes],
+        school_curve, school_cv).
+        """
+        series = [
+            key
+            for key, (billed, _s, _o) in billing.items()
+            if billed > 0
+            and (key[0], key[1]) in openings
+            and (today - openings[(key[0], key[1])]).days > horizon
+        ]
+        if not series:
+            school = np.linspace(0.0, 0.9, horizon + 1)
+            return [], np.empty((0, horizon + 1)), np.empty(0), school, DEFAULT_CV
+
+        position = {key: i for i, key in enumerate(series)}
+        years = sorted({key[0] for key in series})
+        rows = (
+            db.session.query(
+                FeeCollectionDaily.year,
+                FeeCollectionDaily.term,
+                FeeCollectionDaily.class_id,
+                FeeCollectionDaily.day,
+                func.sum(FeeCollectionDaily.amount_total),
+            )
+            .filter(FeeCollectionDaily.year.in_(years))
+            .group_by(
+                FeeCollectionDaily.year,
+                FeeCollectionDaily.term,
+                FeeCollectionDaily.class_id,
+                FeeCollectionDaily.day,
+            )
+            .all()
+        )
+        idx, offset, amount = [], [], []
+        for year, term, class_id, day, total in rows:
+            i = position.get((year, term, class_id))
+            if i is None:
+                continue
+            idx.append(i)
+            offset.append((day - openings[(year, term)]).days)
+            amount.append(total or 0)
+
+        daily = np.zeros((len(series), horizon + 1))
+        if idx:
+            np.add.at(
+                daily,
+                (np.asarray(idx), np.clip(np.asarray(offset), 0, horizon)),
+                np.asarray(amount, dtype=float),
+            )
+        billed = np.array([billing[key][0] for key in series])
+        fractions = np.clip(np.cumsum(daily, axis=1) / billed[:, None], 0.0, 1.5)
+
+        class_ids, inverse = np.unique(
+            np.array([-1 if k[2] is None else k[2] for k in series]), return_inverse=True
+        )
+        counts = np.bincount(inverse).astype(float)
+        sums = np.zeros((len(class_ids), horizon + 1))
+        np.add.at(sums, inverse, fractions)
+        curves = sums / counts[:, None]
+
+        final = fractions[:, -1]
+        squares = np.bincount(inverse, weights=final**2)
+        variance = np.maximum(squares / counts - curves[:, -1] ** 2, 0.0)
+        cv = np.where(
+            (counts > 1) & (curves[:, -1] > 0),
+            np.sqrt(variance) / np.maximum(curves[:, -1], 1e-9),
+            DEFAULT_CV,
+        )
+        school_final = final.mean()
+        school_cv = float(final.std() / school_final) if len(final) > 1 and school_final else DEFAULT_CV
+        return list(class_ids), curves, cv, fractions.mean(axis=0), school_cv
+
+    @staticmethod
+    def monthly_payroll(year):
+        """Month -> total payroll for ``year`` and the history used for estimates."""
+        rows = (
+            db.session.query(
+                StaffSalary.year,
+                StaffSalary.month,
+                func.coalesce(func.sum(StaffSalary.total_pay), 0),
+            )
+            .filter(StaffSalary.year.between(year - 1, year))
+            .group_by(StaffSalary.year, StaffSalary.month)
+            .order_by(StaffSalary.year, StaffSalary.month)
+            .all()
+        )
+        known = {month: float(total) for y, month, total in rows if y == year}
+        history = np.array([float(total) for _y, _m, total in rows], dtype=float)
+        return known, history
+
+    @staticmethod
+    def project(year=None, simulations=DEFAULT_SIMULATIONS, seed=None, today=None):
+        """
+        Month-by-month projection of fee collections against payroll for a
+        school year, with P10/P50/P90 bands from ``simulations`` scenarios.
+        """
+        today = today or datetime.utcnow().date()
+        year = year or today.year
+        horizon = HORIZON_DAYS
+        openings = FeeForecastService.term_openings()
+        billing = FeeForecastService.billing()
+        class_ids, curves, class_cv, school_curve, school_cv = (
+            FeeForecastService.fit_curves(openings, billing, today, horizon)
+        )
+        curve_row = {c: i for i, c in enumerate(class_ids)}
+
+        # Terms to project: billed this year, or estimated from last year's billing
+        targets, terms = [], []
+        for term in TERMS:
+            if (year, term) in openings:
+                opened, estimated = openings[(year, term)], False
+                scope = {k[2]: v for k, v in billing.items() if k[:2] == (year, term)}
+            elif (year - 1, term) in openings:
+                opened, estimated = _shift_year(openings[(year - 1, term)], 1), True
+                scope = {
+                    k[2]: (v[0], 0.0, v[0])
+                    for k, v in billing.items()
+                    if k[:2] == (year - 1, term)
+                }
+            else:
+                continue
+            for class_id, (billed, settled, owing) in scope.items():
+                targets.append((opened, class_id, billed, settled, owing))
+            terms.append(
+                {
+                    "term": term,
+                    "opened": opened.isoformat(),
+                    "estimated": estimated,
+                    "billed": round(sum(v[0] for v in scope.values()), 2),
+                    "collected": round(sum(v[1] for v in scope.values()), 2),
+                }
+            )
+
+        k = len(targets)
+        fallback = np.vstack([curves, school_curve[None, :]])
+        rows = np.array(
+            [curve_row.get(-1 if t[1] is None else t[1], len(class_ids)) for t in targets],
+            dtype=int,
+        )
+        cv = np.append(class_cv, school_cv)[rows] if k else np.empty(0)
+        billed = np.array([t[2] for t in targets], dtype=float)
+        owing = np.array([t[4] for t in targets], dtype=float)
+        opened = np.array([t[0] for t in targets], dtype="datetime64[D]")
+        elapsed = np.clip(
+            (np.datetime64(today, "D") - opened).astype(int), -1, horizon
+        )
+
+        # Expected daily inflow along each curve after today, mapped to months of ``year``
+        offsets = np.arange(horizon + 1)
+        increments = np.diff(fallback[rows], axis=1, prepend=0.0) * billed[:, None]
+        increments[offsets[None, :] <= elapsed[:, None]] = 0.0
+        days = opened[:, None] + offsets[None, :].astype("timedelta64[D]")
+        months = days.astype("datetime64[M]").astype(int) % 12
+        in_year = days.astype("datetime64[Y]").astype(int) + 1970 == year
+        projected = np.zeros((k, 12))
+        target_idx = np.broadcast_to(np.arange(k)[:, None], days.shape)
+        np.add.at(
+            projected,
+            (target_idx[in_year], months[in_year]),
+            increments[in_year],
+        )
+        remaining = projected.sum(axis=1)
+        cap = np.divide(owing, remaining, out=np.ones(k), where=remaining > 0)
+
+        # Actual collections so far this year (rollup, one row per day)
+        actual = np.zeros(12)
+        for day, total in (
+            db.session.query(FeeCollectionDaily.day, func.sum(FeeCollectionDaily.amount_total))
+            .filter(
+                FeeCollectionDaily.day >= date(year, 1, 1),
+                FeeCollectionDaily.day <= date(year, 12, 31),
+            )
+            .group_by(FeeCollectionDaily.day)
+        ):
+            actual[day.month - 1] += total or 0
+
+        known_payroll, payroll_history = FeeForecastService.monthly_payroll(year)
+        recent = payroll_history[-3:]
+        baseline = float(recent.mean()) if recent.size else 0.0
+        payroll_cv = (
+            float(np.clip(payroll_history.std() / payroll_history.mean(), 0.01, 0.25))
+            if payroll_history.size > 1 and payroll_history.mean() > 0
+            else DEFAULT_PAYROLL_CV
+        )
+        payroll = np.array([known_payroll.get(m, baseline) for m in range(1, 13)])
+        payroll_estimated = np.array([m not in known_payroll for m in range(1, 13)])
+
+        # Scenarios: one collection-rate multiplier per term-class, one payroll
+        # multiplier per estimated month
+        rng = np.random.default_rng(seed)
+        factors = np.clip(rng.normal(1.0, cv, size=(simulations, k)), 0.0, None)
+        factors = np.minimum(factors, cap[None, :])
+        collections = actual[None, :] + factors @ projected
+        payroll_noise = rng.normal(1.0, payroll_cv, size=(simulations, 12))
+        payroll_sims = payroll[None, :] * np.where(payroll_estimated, payroll_noise, 1.0)
+        net = np.cumsum(collections - payroll_sims, axis=1)
+
+        expected = actual + np.minimum(1.0, cap) @ projected if k else actual
+        p_collect = np.percentile(collections, (10, 50, 90), axis=0)
+        p_net = np.percentile(net, (10, 50, 90), axis=0)
+
+        return {
+            "year": year,
+            "as_of": today.isoformat(),
+            "simulations": simulations,
+            "terms": terms,
+            "months": [
+                {
+                    "month": m + 1,
+                    "actual_collections": round(float(actual[m]), 2),
+                    "expected_collections": round(float(expected[m]), 2),
+                    "collections_p10": round(float(p_collect[0, m]), 2),
+                    "collections_p90": round(float(p_collect[2, m]), 2),
+                    "payroll": round(float(payroll[m]), 2),
+                    "payroll_estimated": bool(payroll_estimated[m]),
+                    "cumulative_net_p10": round(float(p_net[0, m]), 2),
+                    "cumulative_net_p50": round(float(p_net[1, m]), 2),
+                    "cumulative_net_p90": round(float(p_net[2, m]), 2),
+                }
+                for m in range(12)
+            ],
+            "totals": {
+                "expected_collections": round(float(expected.sum()), 2),
+                "expected_payroll": round(float(payroll.sum()), 2),
+                "net_p10": round(float(p_net[0, -1]), 2),
+                "net_p50": round(float(p_net[1, -1]), 2),
+                "net_p90": round(float(p_net[2, -1]), 2),
+                # Share of scenarios where cumulative cash goes negative in any month
+                "shortfall_probability": round(float((net.min(axis=1) < 0).mean()), 3),
+            },
+        }
+
+
+fee_forecast_service = FeeForecastService()
@@ -0,0 +1,365 @@
+# fee_reconciliation.py
+# Match bank / M-Pesa statement lines against fee payments and open statements.
+# Students and open statements are loaded up front into dicts and the file is
+# consumed in one pass, CHUNK_SIZE lines at a time with one payment lookup per
+# chunk, so matching is linear in its length rather than a query per line.
+import csv
+import io
+import re
+from collections import defaultdict
+from itertools import islice
+from datetime import datetime, timezone
+from sqlalchemy import insert, update, or_
+from extensions import db
+from receipts import receipt_allocator
+from models import (
+    FeePayment,
+    FeeStatement,
+    Student,
+    User,
+    FEE_COLLECTION_SOURCE,
+    add_fee_collections,
+    refresh_fee_statement_totals,
+)
+
+# Accepted header spellings (lower-cased, stripped) for each logical field
+COLUMN_ALIASES = {
+    "reference": (
+        "reference",
+        "ref",
+        "transaction id",
+        "transaction code",
+        "receipt",
+        "receipt no",
+        "receipt no.",
+        "bank reference",
+    ),
+    "amount": ("amount", "paid in", "credit", "credit amount", "amount paid"),
+    "account": (
+        "account",
+        "account no",
+        "account no.",
+        "bill ref",
+        "admission number",
+        "adm no",
+    ),
+    "phone": ("phone", "msisdn", "phone number", "mobile"),
+    "date": ("date", "completion time", "transaction date", "value date"),
+    "name": ("name", "other party info", "payer", "customer name"),
+}
+
+# Statement date layouts after ISO 8601; day-first, as Kenyan banks print them
+DATE_FORMATS = (
+    "%d/%m/%Y %H:%M:%S",
+    "%d/%m/%Y %H:%M",
+    "%d/%m/%Y",
+    "%d-%m-%Y %H:%M:%S",
+    "%d-%m-%Y",
+    "%d.%m.%Y",
+    "%d %b %Y",
+    "%d-%b-%Y",
+)
+CHUNK_SIZE = 500
+
+
+def normalize_phone(value):
+    """Compare phones on their last 9 digits (07.. / +2547.. / 2547..)."""
+    digits = re.sub(r"\D", "", value or "")
+    return digits[-9:] if len(digits) >= 9 else None
+
+
+def normalize_ref(value):
+    return (value or "").strip().upper() or None
+
+
+def parse_amount(value):
+    try:
+        return round(float(re.sub(r"[^\d.\-]", "", str(value or ""))), 2)
+    except ValueError:
+        return None
+
+
+def parse_date(value):
+    """Statement line date/time as a naive datetime, or None when unreadable."""
+    value = (value or "").strip()
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        pass
+    else:
+        # Offsets are converted to UTC like the other stored payment dates
+        if parsed.tzinfo:
+            parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+        return parsed
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, fmt)
+        except ValueError:
+            continue
+    return None
+
+
+def iter_statement_lines(stream, encoding="utf-8-sig"):
+    """
+    Stream-parse an uploaded CSV (binary or text stream), yielding one dict per
+    line with the logical fields from COLUMN_ALIASES.
+    """
+    if not isinstance(stream, io.TextIOBase):
+        stream = io.TextIOWrapper(stream, encoding=encoding, newline="")
+    reader = csv.DictReader(stream)
+
+    mapping = {}
+    for header in reader.fieldnames or []:
+        key = header.strip().lower()
+        for field, aliases in COLUMN_ALIASES.items():
+            if key in aliases and field not in mapping:
+                mapping[field] = header
+
+    for line_no, raw in enumerate(reader, start=2):
+        yield {
+            "line": line_no,
+            "reference": normalize_ref(raw.get(mapping.get("reference"))),
+            "amount": parse_amount(raw.get(mapping.get("amount"))),
+            "account": (raw.get(mapping.get("account")) or "").strip().upper() or None,
+            "phone": normalize_phone(raw.get(mapping.get("phone"))),
+            "date": (raw.get(mapping.get("date")) or "").strip() or None,
+            "name": (raw.get(mapping.get("name")) or "").strip() or None,
+        }
+
+
+class ReconciliationIndex:
+    """In-memory hash maps over students, open statements and posted payments."""
+
+    def __init__(self):
+        self.student_by_admission = {}
+        self.students_by_phone = defaultdict(set)
+        self.open_statements = defaultdict(list)  # student_id -> [[id, balance]]
+        self.payment_by_ref = {}
+
+    @classmethod
+    def build(cls):
+        index = cls()
+
+        rows = (
+            db.session.query(Student.id, Student.admission_number, User.phone)
+            .outerjoin(User, User.id == Student.parent_id)
+            .all()
+        )
+        for student_id, admission_number, phone in rows:
+            if admission_number:
+                index.student_by_admission[admission_number.strip().upper()] = student_id
+            phone = normalize_phone(phone)
+            if phone:
+                index.students_by_phone[phone].add(student_id)
+
+        statements = (
+            db.session.query(
+                FeeStatement.id, FeeStatement.student_id, FeeStatement.balance
+            )
+            .filter(FeeStatement.balance > 0)
+            .order_by(FeeStatement.due_date, FeeStatement.id)
+            .all()
+        )
+        for statement_id, student_id, balance in statements:
+            index.open_statements[student_id].append([statement_id, float(balance)])
+        return index
+
+    def load_payments(self, references):
+        """Add posted payments whose receipt_no or reference is in ``references``."""
+        refs = list({r for r in references if r} - self.payment_by_ref.keys())
+        if not refs:
+            return
+        payments = db.session.query(
+            FeePayment.id, FeePayment.receipt_no, FeePayment.reference
+        ).filter(or_(FeePayment.receipt_no.in_(refs), FeePayment.reference.in_(refs)))
+        for payment_id, receipt_no, reference in payments:
+            for ref in (normalize_ref(receipt_no), normalize_ref(reference)):
+                if ref:
+                    self.payment_by_ref[ref] = payment_id
+
+    def candidate_students(self, line):
+        if line["account"] and line["account"] in self.student_by_admission:
+            return {self.student_by_admission[line["account"]]}
+        if line["phone"]:
+            return set(self.students_by_phone.get(line["phone"], ()))
+        return set()
+
+    def allocate(self, student_id, amount):
+        """Spread ``amount`` over the student's open statements, oldest first."""
+        statements = self.open_statements.get(student_id)
+        if not statements:
+            return []
+
+        allocations, remaining = [], amount
+        for entry in statements:
+            if remaining <= 0:
+                break
+            statement_id, balance = entry
+            if balance <= 0:
+                continue
+            portion = min(balance, remaining)
+            allocations.append((statement_id, round(portion, 2)))
+            entry[1] = round(balance - portion, 2)
+            remaining = round(remaining - portion, 2)
+        if remaining > 0:
+            # Overpayment is credited to the student's latest-due open statement
+            latest_id = statements[-1][0]
+            if allocations and allocations[-1][0] == latest_id:
+                allocations[-1] = (latest_id, round(allocations[-1][1] + remaining, 2))
+            else:
+                allocations.append((latest_id, remaining))
+        return allocations
+
+
+class FeeReconciliationService:
+    @staticmethod
+    def reconcile(stream, source="M-Pesa"):
+        """
+        Classify every statement line as matched, already_posted, ambiguous or
+        unmatched. Nothing is written; pass the result to ``post_matches``.
+        """
+        index = ReconciliationIndex.build()
+        result = {
+            "source": source,
+            "matched": [],
+            "already_posted": [],
+            "ambiguous": [],
+            "unmatched": [],
+        }
+        seen_refs = set()
+
+        lines = iter_statement_lines(stream)
+        while True:
+            chunk = list(islice(lines, CHUNK_SIZE))
+            if not chunk:
+                break
+            index.load_payments(line["reference"] for line in chunk)
+            for line in chunk:
+                FeeReconciliationService._classify(line, index, seen_refs, result)
+
+        return result
+
+    @staticmethod
+    def _classify(line, index, seen_refs, result):
+        """Append ``line`` to the matching bucket of ``result``."""
+        ref = line["reference"]
+        if not line["amount"] or line["amount"] <= 0:
+            result["unmatched"].append(dict(line, reason="No credit amount"))
+            return
+        if ref and ref in seen_refs:
+            result["ambiguous"].append(
+                dict(line, reason="Duplicate reference in file")
+            )
+            return
+        if ref:
+            seen_refs.add(ref)
+        if ref and ref in index.payment_by_ref:
+            result["already_posted"].append(
+                dict(line, payment_id=index.payment_by_ref[ref])
+            )
+            return
+
+        candidates = index.candidate_students(line)
+        if len(candidates) > 1:
+            # Siblings sharing a parent phone: only an exact balance match decides
+            exact = [
+                sid
+                for sid in candidates
+                if any(
+                    abs(balance - line["amount"]) < 0.01
+                    for _, balance in index.open_statements.get(sid, ())
+                )
+            ]
+            if len(exact) != 1:
+                result["ambiguous"].append(
+                    dict(
+                        line,
+                        reason="Phone shared by several students",
+                        student_ids=sorted(candidates),
+                    )
+                )
+                return
+            candidates = set(exact)
+
+        if not candidates:
+            result["unmatched"].append(
+                dict(line, reason="No student for account/phone")
+            )
+            return
+
+        student_id = candidates.pop()
+        allocations = index.allocate(student_id, line["amount"])
+        if not allocations:
+            result["unmatched"].append(
+                dict(
+                    line,
+                    reason="Student has no open fee statements",
+                    student_id=student_id,
+                )
+            )
+            return
+        result["matched"].append(
+            dict(line, student_id=student_id, allocations=allocations)
+        )
+
+    @staticmethod
+    def post_matches(result):
+        """
+        Insert FeePayment rows for matched lines with one executemany, mark
+        already-posted payments reconciled, and refresh touched statements.
+        Payments are dated (and receipts numbered) by the statement line's
+        date; lines without a readable date are posted as of now.
+        """
+        now = datetime.utcnow()
+        rows, statement_ids = [], set()
+        for match in result["matched"]:
+            paid_at = parse_date(match["date"]) or now
+            for statement_id, amount in match["allocations"]:
+                rows.append(
+                    {
+                        "fee_statement_id": statement_id,
+                        "student_id": match["student_id"],
+                        "amount_paid": amount,
+                        "payment_method": result["source"],
+                        "payment_date": paid_at,
+                        "reference": match["reference"],
+                        "reconciled_at": now,
+                        "receipt_no": receipt_allocator.next_receipt_no(
+                            paid_at.year, db.session
+                        ),
+                    }
+                )
+                statement_ids.add(statement_id)
+        posted_ids = [line["payment_id"] for line in result["already_posted"]]
+
+        try:
+            if rows:
+                db.session.execute(insert(FeePayment), rows)
+            for start in range(0, len(posted_ids), CHUNK_SIZE):
+                db.session.execute(
+                    update(FeePayment)
+                    .where(FeePayment.id.in_(posted_ids[start : start + CHUNK_SIZE]))
+                    .where(FeePayment.reconciled_at.is_(None))
+                    .values(reconciled_at=now)
+                )
+            # Core inserts bypass the flush hook, so refresh totals explicitly
+            statement_ids = list(statement_ids)
+            for start in range(0, len(statement_ids), CHUNK_SIZE):
+                refresh_fee_statement_totals(
+                    db.session.connection(), statement_ids[start : start + CHUNK_SIZE]
+                )
+            add_fee_collections(
+                db.session.connection(),
+                [(1, *(row[c] for c in FEE_COLLECTION_SOURCE)) for row in rows],
+            )
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+        return {"payments_created": len(rows), "payments_reconciled": len(posted_ids)}
+
+
+fee_reconciliation_service = FeeReconciliationService()
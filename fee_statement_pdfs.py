@@ -0,0 +1,299 @@
+# fee_statement_pdfs.py
+# Batch fee statement PDFs for a class or the whole school.
+# All statements and payments are prefetched with three queries into plain
+# dicts; rendering is pure reportlab work and runs in a process pool. Output is
+# either one merged PDF or a ZIP streamed as each student's PDF is finished.
+from collections import defaultdict
+from datetime import datetime
+from io import BytesIO
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.lib.units import inch
+from reportlab.platypus import (
+    SimpleDocTemplate,
+    Table,
+    TableStyle,
+    Paragraph,
+    Spacer,
+)
+from extensions import db
+from models import FeeStatement, FeePayment, Student, Class
+from pdf_batch import PdfBatch, filename_part, iter_pdfs
+
+SCHOOL_NAME = "TUSOME ACADEMY"
+
+# Table templates, built once per process
+INFO_STYLE = TableStyle(
+    [
+        ("BACKGROUND", (0, 0), (0, -1), colors.lightgrey),
+        ("GRID", (0, 0), (-1, -1), 1, colors.black),
+        ("FONTNAME", (0, 0), (-1, -1), "Helvetica"),
+        ("FONTSIZE", (0, 0), (-1, -1), 10),
+        ("BOTTOMPADDING", (0, 0), (-1, -1), 12),
+    ]
+)
+LEDGER_STYLE = TableStyle(
+    [
+        ("BACKGROUND", (0, 0), (-1, 0), colors.grey),
+        ("TEXTCOLOR", (0, 0), (-1, 0), colors.whitesmoke),
+        ("ALIGN", (0, 0), (-1, -1), "CENTER"),
+        ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
+        ("FONTSIZE", (0, 0), (-1, 0), 9),
+        ("BOTTOMPADDING", (0, 0), (-1, 0), 12),
+        ("BACKGROUND", (0, 1), (-1, -2), colors.beige),
+        ("BACKGROUND", (0, -1), (-1, -1), colors.lightblue),
+        ("FONTNAME", (0, -1), (-1, -1), "Helvetica-Bold"),
+        ("GRID", (0, 0), (-1, -1), 1, colors.black),
+    ]
+)
+PAYMENTS_STYLE = TableStyle(
+    [
+        ("BACKGROUND", (0, 0), (-1, 0), colors.grey),
+        ("TEXTCOLOR", (0, 0), (-1, 0), colors.whitesmoke),
+        ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
+        ("FONTSIZE", (0, 0), (-1, -1), 9),
+        ("GRID", (0, 0), (-1, -1), 0.5, colors.black),
+    ]
+)
+FEE_COLUMNS = [1.3 * inch, 0.8 * inch, 1 * inch, 1 * inch, 1 * inch, 1 * inch, 0.8 * inch]
+PAYMENT_COLUMNS = [1.6 * inch, 1.2 * inch, 1.4 * inch, 1.4 * inch, 1.4 * inch]
+
+_styles = None
+
+
+def _get_styles():
+    global _styles
+    if _styles is None:
+        base = getSampleStyleSheet()
+        _styles = {
+            "title": ParagraphStyle(
+                "CustomTitle",
+                parent=base["Heading1"],
+                fontSize=18,
+                spaceAfter=30,
+                alignment=1,
+            ),
+            "heading": base["Heading2"],
+        }
+    return _styles
+
+
+def _kes(value):
+    return f"KES {value:,.2f}"
+
+
+def statement_story(doc_data):
+    """Flowables for one student's statement (no page break)."""
+    styles = _get_styles()
+    student = doc_data["student"]
+    story = [
+        Paragraph(f"{SCHOOL_NAME}<br/>FEE STATEMENT", styles["title"]),
+        Spacer(1, 12),
+    ]
+
+    info = Table(
+        [
+            ["Student Name:", student["full_name"]],
+            ["Admission Number:", student["admission_number"]],
+            ["Class:", student["class_name"] or "-"],
+            ["Academic Year:", str(doc_data["year"])],
+            ["Statement Date:", doc_data["generated_on"]],
+        ],
+        colWidths=[2 * inch, 3 * inch],
+    )
+    info.setStyle(INFO_STYLE)
+    story += [info, Spacer(1, 20)]
+
+    fees = doc_data["fees"]
+    if fees:
+        rows = [
+            ["Fee Type", "Term", "Amount Due", "Amount Paid", "Credits", "Balance", "Status"]
+        ]
+        for fee in fees:
+            rows.append(
+                [
+                    fee["fee_type"],
+                    fee["term"],
+                    _kes(fee["amount_due"]),
+                    _kes(fee["amount_paid"]),
+                    _kes(fee["amount_credited"]),
+                    _kes(fee["balance"]),
+                    fee["status"],
+                ]
+            )
+        rows.append(
+            [
+                "TOTAL",
+                "",
+                _kes(sum(f["amount_due"] for f in fees)),
+                _kes(sum(f["amount_paid"] for f in fees)),
+                _kes(sum(f["amount_credited"] for f in fees)),
+                _kes(sum(f["balance"] for f in fees)),
+                "",
+            ]
+        )
+        table = Table(rows, colWidths=FEE_COLUMNS, repeatRows=1)
+        table.setStyle(LEDGER_STYLE)
+        story += [Paragraph("FEE DETAILS", styles["heading"]), Spacer(1, 12), table]
+
+    payments = doc_data["payments"]
+    if payments:
+        rows = [["Receipt", "Date", "Method", "Reference", "Amount"]]
+        for p in payments:
+            rows.append(
+                [
+                    p["receipt_no"] or "-",
+                    p["payment_date"],
+                    p["payment_method"] or "-",
+                    p["reference"] or "-",
+                    _kes(p["amount_paid"]),
+                ]
+            )
+        table = Table(rows, colWidths=PAYMENT_COLUMNS, repeatRows=1)
+        table.setStyle(PAYMENTS_STYLE)
+        story += [
+            Spacer(1, 20),
+            Paragraph("PAYMENTS RECEIVED", styles["heading"]),
+            Spacer(1, 12),
+            table,
+        ]
+    return story
+
+
+def render_fee_statement(doc_data):
+    """One student's statement as PDF bytes."""
+    buffer = BytesIO()
+    SimpleDocTemplate(buffer, pagesize=A4).build(statement_story(doc_data))
+    return buffer.getvalue()
+
+
+def _render_chunk(documents):
+    return [render_fee_statement(d) for d in documents]
+
+
+class FeeStatementBatch(PdfBatch):
+    @staticmethod
+    def load(year, class_id=None, student_ids=None):
+        """
+        Prefetch everything the statements need: students, their statements
+        for ``year`` and the payments against them - three queries in total.
+        """
+        students = (
+            db.session.query(
+                Student.id,
+                Student.full_name,
+                Student.admission_number,
+                Class.name.label("class_name"),
+            )
+            .outerjoin(Class, Class.id == Student.current_class_id)
+            .order_by(Class.name, Student.full_name)
+        )
+        scope = []
+        if class_id:
+            scope.append(Student.current_class_id == class_id)
+        if student_ids:
+            scope.append(Student.id.in_(student_ids))
+        students = students.filter(*scope).all()
+
+        fees = defaultdict(list)
+        now = datetime.utcnow()
+        statements = (
+            db.session.query(
+                FeeStatement.student_id,
+                FeeStatement.fee_type,
+                FeeStatement.term,
+                FeeStatement.amount_due,
+                FeeStatement.amount_paid,
+                FeeStatement.amount_credited,
+                FeeStatement.balance,
+                FeeStatement.status,
+                FeeStatement.due_date,
+            )
+            .join(Student, Student.id == FeeStatement.student_id)
+            .filter(FeeStatement.year == year, *scope)
+            .order_by(FeeStatement.term, FeeStatement.id)
+        )
+        for row in statements:
+            if row.status == "paid":
+                status = "PAID"
+            elif row.due_date and row.due_date < now:
+                status = "OVERDUE"
+            else:
+                status = "PENDING"
+            fees[row.student_id].append(
+                {
+                    "fee_type": row.fee_type,
+                    "term": row.term,
+                    "amount_due": float(row.amount_due or 0),
+                    "amount_paid": float(row.amount_paid or 0),
+                    # Bursary / scholarship credits, shown apart from cash paid
+                    "amount_credited": float(row.amount_credited or 0),
+                    "balance": float(row.balance or 0),
+                    "status": status,
+                }
+            )
+
+        payments = defaultdict(list)
+        rows = (
+            db.session.query(
+                FeePayment.student_id,
+                FeePayment.receipt_no,
+                FeePayment.payment_date,
+                FeePayment.payment_method,
+                FeePayment.reference,
+                FeePayment.amount_paid,
+            )
+            .join(FeeStatement, FeeStatement.id == FeePayment.fee_statement_id)
+            .join(Student, Student.id == FeePayment.student_id)
+            .filter(FeeStatement.year == year, *scope)
+            .order_by(FeePayment.payment_date, FeePayment.id)
+        )
+        for row in rows:
+            payments[row.student_id].append(
+                {
+                    "receipt_no": row.receipt_no,
+                    "payment_date": row.payment_date.strftime("%Y-%m-%d")
+                    if row.payment_date
+                    else "-",
+                    "payment_method": row.payment_method,
+                    "reference": row.reference,
+                    "amount_paid": float(row.amount_paid or 0),
+                }
+            )
+
+        generated_on = now.strftime("%Y-%m-%d")
+        return [
+            {
+                "student": {
+                    "id": s.id,
+                    "full_name": s.full_name,
+                    "admission_number": s.admission_number,
+                    "class_name": s.class_name,
+                },
+                "year": year,
+                "generated_on": generated_on,
+                "fees": fees.get(s.id, []),
+                "payments": payments.get(s.id, []),
+            }
+            for s in students
+        ]
+
+    @staticmethod
+    def iter_pdfs(documents, workers=None, on_progress=None):
+        """Yield (doc_data, pdf_bytes) in input order, rendered by a process pool."""
+        return iter_pdfs(
+            documents,
+            render_fee_statement,
+            _render_chunk,
+            workers=workers,
+            on_progress=on_progress,
+        )
+
+    @staticmethod
+    def filename(doc_data):
+        admission = filename_part(doc_data["student"]["admission_number"])
+        return f"fee_statement_{admission}_{doc_data['year']}.pdf"
+
+
+fee_statement_batch = FeeStatementBatch()
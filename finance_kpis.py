@@ -0,0 +1,101 @@
+# finance_kpis.py
+# Finance KPIs computed with SQL aggregates, plus per-day snapshots for charts
+from datetime import datetime, timedelta
+from sqlalchemy import func, case
+from extensions import db
+from models import FeeStatement, StaffSalary, Employee, FinanceKPISnapshot
+
+ACADEMIC_ROLES = ("teacher",)
+ADMIN_ROLES = ("admin", "finance")
+
+
+class FinanceKPIService:
+    @staticmethod
+    def fee_kpis(year=None):
+        """Billed / collected / outstanding / overdue count in one pass."""
+        outstanding = case((FeeStatement.balance > 0, FeeStatement.balance), else_=0)
+        overdue = case((FeeStatement.is_overdue, 1), else_=0)
+
+        query = db.session.query(
+            func.coalesce(func.sum(FeeStatement.amount_due), 0).label("billed"),
+            func.coalesce(func.sum(FeeStatement.amount_paid), 0).label("collected"),
+            func.coalesce(func.sum(outstanding), 0).label("outstanding"),
+            func.coalesce(func.sum(overdue), 0).label("overdue_count"),
+        )
+        if year:
+            query = query.filter(FeeStatement.year == year)
+        row = query.one()
+
+        return {
+            "total_billed": float(row.billed),
+            "total_collected": float(row.collected),
+            "total_outstanding": float(row.outstanding),
+            "overdue_count": int(row.overdue_count),
+        }
+
+    @staticmethod
+    def salary_kpis(year=None):
+        """Salary budget / paid and department split in one pass."""
+        pay = func.coalesce(StaffSalary.total_pay, 0)
+
+        query = db.session.query(
+            func.coalesce(func.sum(pay), 0).label("budget"),
+            func.coalesce(
+                func.sum(case((StaffSalary.paid.is_(True), pay), else_=0)), 0
+            ).label("paid"),
+            func.coalesce(
+                func.sum(case((Employee.role.in_(ACADEMIC_ROLES), pay), else_=0)), 0
+            ).label("academic"),
+            func.coalesce(
+                func.sum(case((Employee.role.in_(ADMIN_ROLES), pay), else_=0)), 0
+            ).label("admin"),
+        ).outerjoin(Employee, Employee.id == StaffSalary.staff_id)
+        if year:
+            query = query.filter(StaffSalary.year == year)
+        row = query.one()
+
+        return {
+            "total_salary_budget": float(row.budget),
+            "total_salary_paid": float(row.paid),
+            "academic_salaries": float(row.academic),
+            "admin_salaries": float(row.admin),
+        }
+
+    @staticmethod
+    def compute(year=None):
+        kpis = FinanceKPIService.fee_kpis(year)
+        kpis.update(FinanceKPIService.salary_kpis(year))
+        return kpis
+
+    @staticmethod
+    def take_snapshot(day=None):
+        """Store (or refresh) the school-wide KPIs for ``day``."""
+        day = day or datetime.utcnow().date()
+        kpis = FinanceKPIService.compute()
+
+        snapshot = FinanceKPISnapshot.query.filter_by(snapshot_date=day).first()
+        if snapshot is None:
+            snapshot = FinanceKPISnapshot(snapshot_date=day)
+            db.session.add(snapshot)
+
+        snapshot.total_billed = kpis["total_billed"]
+        snapshot.total_collected = kpis["total_collected"]
+        snapshot.total_outstanding = kpis["total_outstanding"]
+        snapshot.overdue_count = kpis["overdue_count"]
+        snapshot.total_salary_budget = kpis["total_salary_budget"]
+        snapshot.total_salary_paid = kpis["total_salary_paid"]
+        db.session.commit()
+        return snapshot
+
+    @staticmethod
+    def history(days=90):
+        """Snapshots for the last ``days`` days, oldest first."""
+        since = datetime.utcnow().date() - timedelta(days=days)
+        return (
+            FinanceKPISnapshot.query.filter(FinanceKPISnapshot.snapshot_date >= since)
+            .order_by(FinanceKPISnapshot.snapshot_date)
+            .all()
+        )
+
+
+finance_kpi_service = FinanceKPIService()
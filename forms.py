@@ -14,6 +14,7 @@ from wtforms import (
 )
 from wtforms.validators import (
     DataRequired,
+    InputRequired,
     Length,
     Email,
     NumberRange,
@@ -280,7 +281,7 @@ class FeeStatementForm(FlaskForm):
     class_id = SelectField(
         "Class",
         coerce=int,
-        validators=[DataRequired()],
+        validators=[InputRequired()],
     )
     fee_type = SelectField(
         "Fee Type",
@@ -297,6 +298,8 @@ class FeeStatementForm(FlaskForm):
     amount_due = FloatField(
         "Amount Due", validators=[DataRequired(), NumberRange(min=0)]
     )
+    due_date = DateField("Due Date", validators=[Optional()])
+    dry_run = BooleanField("Preview only (don't create statements)")
     submit = SubmitField("Generate Fee Statements")
 
 
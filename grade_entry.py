@@ -0,0 +1,113 @@
+# grade_entry.py
+# Idempotent mark entry. A class sheet is written as one multi-row
+# INSERT ... ON CONFLICT (student, subject, exam_type, term, year) DO UPDATE,
+# so resubmitting or retrying a sheet updates marks instead of duplicating
+# rows. Dialects without ON CONFLICT fall back to one lookup plus executemany.
+from sqlalchemy import insert, update, tuple_
+from sqlalchemy.dialects import postgresql, sqlite
+from extensions import db
+from models import Grade, refresh_student_term_summary
+from gradebook_stats import gradebook_stats
+from rubric import rubric
+
+KEY_COLUMNS = ("student_id", "subject_id", "exam_type", "term", "year")
+CHUNK_SIZE = 100  # rows per statement; keeps SQLite under its bind-parameter limit
+DEFAULT_EXAM = "Summative"
+
+_DIALECT_INSERTS = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+
+
+class GradeEntryService:
+    @staticmethod
+    def row(student_id, subject_id, marks, term, year, exam_type=DEFAULT_EXAM):
+        """
+        A grade row with percentage and CBC level derived from ``marks``.
+        Raises ValueError when term or year is missing, or for marks that are
+        not a number from 0 to 100.
+        """
+        if not term or year in (None, ""):
+            raise ValueError("Term and year are required.")
+        marks = float(marks)
+        if not 0 <= marks <= 100:
+            raise ValueError("Marks must be between 0 and 100.")
+        return {
+            "student_id": student_id,
+            "subject_id": subject_id,
+            "exam_type": exam_type or DEFAULT_EXAM,
+            "term": term,
+            "year": int(year),
+            "marks": marks,
+            "percentage": marks,
+            "cbc_level": rubric().level(marks),
+        }
+
+    @staticmethod
+    def upsert(rows):
+        """
+        Insert or update ``rows`` (see row()) keyed on student, subject,
+        exam_type, term and year, then commit. Later rows win when a sheet
+        repeats a key. Returns the number of rows written.
+        """
+        unique = {tuple(r[c] for c in KEY_COLUMNS): r for r in rows}
+        rows = list(unique.values())
+        if not rows:
+            return 0
+
+        dialect_insert = _DIALECT_INSERTS.get(db.session.get_bind().dialect.name)
+        try:
+            for start in range(0, len(rows), CHUNK_SIZE):
+                chunk = rows[start : start + CHUNK_SIZE]
+                if dialect_insert is None:
+                    GradeEntryService._upsert_generic(chunk)
+                    continue
+                stmt = dialect_insert(Grade).values(chunk)
+                stmt = stmt.on_conflict_do_update(
+                    index_elements=list(KEY_COLUMNS),
+                    set_={
+                        "marks": stmt.excluded.marks,
+                        "percentage": stmt.excluded.percentage,
+                        "cbc_level": stmt.excluded.cbc_level,
+                    },
+                )
+                db.session.execute(stmt)
+            refresh_student_term_summary(
+                db.session.connection(), {(r["student_id"], r["term"], r["year"]) for r in rows}
+            )
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+        # Core statements skip the Grade mapper events; the term summaries were
+        # refreshed above, the gradebook stats cache is dropped here
+        gradebook_stats.invalidate({(r["term"], r["year"]) for r in rows})
+        return len(rows)
+
+    @staticmethod
+    def _upsert_generic(chunk):
+        """One key lookup, then executemany UPDATE and INSERT."""
+        keys = [tuple(r[c] for c in KEY_COLUMNS) for r in chunk]
+        existing = {
+            tuple(row[1:]): row[0]
+            for row in db.session.query(
+                Grade.id, *(getattr(Grade, c) for c in KEY_COLUMNS)
+            ).filter(tuple_(*(getattr(Grade, c) for c in KEY_COLUMNS)).in_(keys))
+        }
+        updates = [
+            {
+                "id": existing[key],
+                "marks": r["marks"],
+                "percentage": r["percentage"],
+                "cbc_level": r["cbc_level"],
+            }
+            for key, r in zip(keys, chunk)
+            if key in existing
+        ]
+        inserts = [r for key, r in zip(keys, chunk) if key not in existing]
+        if updates:
+            db.session.execute(update(Grade), updates)
+        if inserts:
+            db.session.execute(insert(Grade), inserts)
+
+
+grade_entry_service = GradeEntryService()
@@ -0,0 +1,269 @@
+# grade_import.py
+# Bulk grade import: preload every lookup the sheet needs, validate rows in
+# memory, then insert with batched executemany in a single transaction.
+# Savepoints isolate a failing batch so errors are still reported per row.
+from sqlalchemy import insert
+from sqlalchemy.exc import SQLAlchemyError
+from extensions import db
+from models import Grade, Student, Class, refresh_student_term_summary
+from subject_resolver import subject_resolver
+from gradebook_stats import gradebook_stats
+
+EXAM_TYPES = ("Exam 1", "Exam 2", "Exam 3", "Summative")
+LONG_REQUIRED = ["admission_number", "subject_name", "exam_type", "marks", "term", "year"]
+WIDE_REQUIRED = ["admission_number", "term", "year", "exam_type"]
+CHUNK_SIZE = 500  # ids per IN (...) when preloading
+BATCH_SIZE = 1000  # grade rows per executemany
+
+
+def parse_class_grade(class_name):
+    """"Grade 7 Blue" -> 7, "7A" -> 7; None when no number is present."""
+    for part in (class_name or "").split():
+        digits = "".join(ch for ch in part if ch.isdigit())
+        if digits:
+            return int(digits)
+    return None
+
+
+class GradeImportEngine:
+    @staticmethod
+    def load_students(admissions):
+        """admission_number -> (student_id, class_name, class_level, pathway)."""
+        admissions = list(admissions)
+        students = {}
+        for start in range(0, len(admissions), CHUNK_SIZE):
+            rows = (
+                db.session.query(
+                    Student.admission_number,
+                    Student.id,
+                    Class.name,
+                    Class.level,
+                    Student.pathway,
+                )
+                .outerjoin(Class, Class.id == Student.current_class_id)
+                .filter(Student.admission_number.in_(admissions[start : start + CHUNK_SIZE]))
+            )
+            for admission, *student in rows:
+                students[admission] = tuple(student)
+        return students
+
+    @staticmethod
+    def load_existing_keys(student_ids, terms, years):
+        """{(student_id, subject_id, exam_type, term, year)} already stored."""
+        student_ids = list(student_ids)
+        keys = set()
+        if not student_ids or not terms or not years:
+            return keys
+        for start in range(0, len(student_ids), CHUNK_SIZE):
+            rows = db.session.query(
+                Grade.student_id, Grade.subject_id, Grade.exam_type, Grade.term, Grade.year
+            ).filter(
+                Grade.student_id.in_(student_ids[start : start + CHUNK_SIZE]),
+                Grade.term.in_(terms),
+                Grade.year.in_(years),
+            )
+            keys.update(tuple(row) for row in rows)
+        return keys
+
+    @staticmethod
+    def run(rows, normalise_headers, level_for):
+        """
+        Import grades from CSV rows (header row first), long or wide format.
+        ``level_for(marks)`` gives the CBC level stored on each grade.
+        Returns {"success": int, "errors": [str, ...]}.
+        """
+        results = {"success": 0, "errors": []}
+        if not rows or len(rows) < 2:
+            results["errors"].append("Empty CSV or missing header/rows.")
+            return results
+
+        headers = normalise_headers(rows[0])
+        idx = {h: i for i, h in enumerate(headers)}
+        if all(h in headers for h in LONG_REQUIRED):
+            wide, subject_cols = False, []
+        elif all(h in headers for h in WIDE_REQUIRED):
+            wide = True
+            subject_cols = [h for h in headers if h not in WIDE_REQUIRED]
+            if not subject_cols:
+                results["errors"].append("No subject columns found in wide format CSV.")
+                return results
+        else:
+            results["errors"].append(
+                "CSV headers do not match long format (admission_number,subject_name,"
+                "exam_type,marks,term,year) or wide format (admission_number,term,year,"
+                "exam_type + subject columns)."
+            )
+            return results
+
+        def val(row, h):
+            i = idx[h]
+            return row[i].strip() if i < len(row) and row[i] is not None else ""
+
+        # ----- Preload lookups -----
+        body = list(enumerate(rows[1:], start=2))
+        students = GradeImportEngine.load_students(
+            {val(r, "admission_number") for _i, r in body if val(r, "admission_number")}
+        )
+        years = set()
+        for _i, r in body:
+            try:
+                years.add(int(val(r, "year")))
+            except ValueError:
+                pass
+        existing = GradeImportEngine.load_existing_keys(
+            {student[0] for student in students.values()},
+            {val(r, "term") for _i, r in body if val(r, "term")},
+            years,
+        )
+
+        # ----- Validate in memory -----
+        pending = []  # [(row_no, [grade values])]
+        for i, row in body:
+            try:
+                admission = val(row, "admission_number")
+                term = val(row, "term")
+                year_raw = val(row, "year")
+                exam_type = val(row, "exam_type")
+                if wide:
+                    if not admission or not term or not year_raw or not exam_type:
+                        raise ValueError("Missing admission_number, term, year, or exam_type.")
+                    if exam_type not in EXAM_TYPES:
+                        raise ValueError(f"Invalid exam_type: {exam_type}")
+                    cells = [(h, val(row, h)) for h in subject_cols]
+                    cells = [(h, v) for h, v in cells if v != ""]
+                else:
+                    subject_name, marks_raw = val(row, "subject_name"), val(row, "marks")
+                    if not all([admission, subject_name, exam_type, marks_raw, term, year_raw]):
+                        raise ValueError("Missing required grade fields.")
+                    if exam_type not in EXAM_TYPES:
+                        raise ValueError(
+                            "exam_type must be one of: Exam 1, Exam 2, Exam 3, "
+                            f"Summative (got '{exam_type}')."
+                        )
+                    cells = [(subject_name, marks_raw)]
+
+                try:
+                    year = int(year_raw)
+                except ValueError:
+                    raise ValueError("Year must be an integer.")
+
+                if admission not in students:
+                    raise ValueError(f"Student with admission number {admission} not found.")
+                student_id, class_name, class_level, pathway = students[admission]
+                # Class.level is "Grade 8", not a subject level: it only gives the grade
+                class_grade = parse_class_grade(class_level) or parse_class_grade(class_name)
+
+                values, row_keys, cell_errors = [], [], []
+                for subject_name, marks_raw in cells:
+                    prefix = f"Row {i}, subject '{subject_name}': " if wide else ""
+                    subject_id = subject_resolver.resolve(
+                        subject_name, pathway=pathway, class_grade=class_grade
+                    )
+                    if subject_id is None:
+                        cell_errors.append(
+                            f"{prefix}Subject not found."
+                            if wide
+                            else f"Subject '{subject_name}' not found for class '{class_name or '?'}'."
+                        )
+                        continue
+                    try:
+                        marks = float(marks_raw)
+                    except ValueError:
+                        cell_errors.append(f"{prefix}Marks must be a number.")
+                        continue
+                    if not 0 <= marks <= 100:
+                        cell_errors.append(
+                            f"{prefix}Marks must be 0-100." if wide else "Marks must be between 0 and 100."
+                        )
+                        continue
+                    key = (student_id, subject_id, exam_type, term, year)
+                    if key in existing or key in row_keys:
+                        cell_errors.append(
+                            f"{prefix}Duplicate grade exists."
+                            if wide
+                            else "A grade for this student, subject, exam_type, term, year already exists."
+                        )
+                        continue
+                    row_keys.append(key)
+                    values.append(
+                        {
+                            "student_id": student_id,
+                            "subject_id": subject_id,
+                            "exam_type": exam_type,
+                            "term": term,
+                            "year": year,
+                            "marks": marks,
+                            "percentage": marks,
+                            "cbc_level": level_for(marks),
+                        }
+                    )
+
+                if cell_errors:
+                    # A row is all-or-nothing, as before
+                    if wide:
+                        results["errors"].extend(cell_errors)
+                    else:
+                        results["errors"].append(f"Row {i}: {cell_errors[0]}")
+                    continue
+                if values:
+                    existing.update(row_keys)
+                    pending.append((i, values))
+            except ValueError as e:
+                results["errors"].append(f"Row {i}: {e}")
+
+        inserted, errors = GradeImportEngine.insert(pending)
+        results["success"] += inserted
+        results["errors"].extend(errors)
+        return results
+
+    @staticmethod
+    def insert(pending):
+        """
+        executemany the validated rows in batches, one transaction overall.
+        A batch that fails is retried row by row, each in its own savepoint.
+        Returns (rows_inserted, errors).
+        """
+        inserted, errors = 0, []
+        batches, batch, size = [], [], 0
+        for unit in pending:
+            batch.append(unit)
+            size += len(unit[1])
+            if size >= BATCH_SIZE:
+                batches.append(batch)
+                batch, size = [], 0
+        if batch:
+            batches.append(batch)
+
+        try:
+            for batch in batches:
+                try:
+                    with db.session.begin_nested():
+                        db.session.execute(
+                            insert(Grade), [v for _i, values in batch for v in values]
+                        )
+                    inserted += len(batch)
+                except SQLAlchemyError:
+                    for row_no, values in batch:
+                        try:
+                            with db.session.begin_nested():
+                                db.session.execute(insert(Grade), values)
+                            inserted += 1
+                        except SQLAlchemyError as e:
+                            errors.append(f"Row {row_no}: {getattr(e, 'orig', e)}")
+            # Core inserts skip the Grade mapper events: refresh the term
+            # summaries here and drop the gradebook stats cache below
+            refresh_student_term_summary(
+                db.session.connection(),
+                {(v["student_id"], v["term"], v["year"]) for _i, values in pending for v in values},
+            )
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        gradebook_stats.invalidate(
+            {(v["term"], v["year"]) for _i, values in pending for v in values}
+        )
+        return inserted, errors
+
+
+grade_import_engine = GradeImportEngine()
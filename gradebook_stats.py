@@ -0,0 +1,238 @@
+# gradebook_stats.py
+# Gradebook statistics for a (class, term, year) filter: per-subject averages,
+# CBC level distributions and counts from a single grouped query, plus the
+# subject x class average matrix for a term. Results are cached per filter
+# and dropped once a commit changes grades in a matching term/year. The cache
+# is per process: other workers only see the change when their entry expires,
+# so the TTL is kept short.
+import time
+import numpy as np
+from flask import current_app, has_app_context
+from sqlalchemy import event, func, inspect
+from sqlalchemy.orm import Session
+from extensions import db
+from models import Grade, Student, Class, Subject
+from rubric import rubric
+
+DEFAULT_CACHE_TTL = 60  # seconds; override with GRADEBOOK_STATS_CACHE_TTL
+LEVELS = (
+    ("exceeding", "Exceeding Expectations"),
+    ("meeting", "Meeting Expectations"),
+    ("approaching", "Approaching Expectations"),
+    ("below", "Below Expectations"),
+)
+LEVEL_KEYS = {name: key for key, name in LEVELS}
+
+_cache = {}
+
+
+def _empty_levels():
+    return {key: 0 for key, _name in LEVELS}
+
+
+class GradebookStatsService:
+    @staticmethod
+    def _cached(key, compute, use_cache=True):
+        if not use_cache:
+            return compute()
+
+        ttl = DEFAULT_CACHE_TTL
+        if has_app_context():
+            ttl = current_app.config.get("GRADEBOOK_STATS_CACHE_TTL", DEFAULT_CACHE_TTL)
+
+        now = time.monotonic()
+        hit = _cache.get(key)
+        if hit and now - hit[0] < ttl:
+            return hit[1]
+
+        value = compute()
+        _cache[key] = (now, value)
+        return value
+
+    @staticmethod
+    def invalidate(scopes=None):
+        """
+        Drop cached stats. ``scopes`` is an iterable of (term, year) that
+        changed; filters on another term or year are kept. None clears all.
+        """
+        if scopes is None:
+            _cache.clear()
+            return
+        scopes = set(scopes)
+        for key in list(_cache):
+            *_filter, term, year = key
+            if any(
+                (term is None or term == t) and (year is None or year == y)
+                for t, y in scopes
+            ):
+                _cache.pop(key, None)
+
+    @staticmethod
+    def stats(class_name=None, term=None, year=None, use_cache=True):
+        """
+        {"subjects": {subject_id: {"average", "count", "levels"}},
+         "levels": {exceeding/meeting/approaching/below: n}, "count": n}
+        Grades without a recognised CBC level count as "below".
+        """
+
+        def compute():
+            # Level from the rubric applied in SQL; stored cbc_level only when marks are missing
+            level_expr = func.coalesce(rubric().case(Grade.marks, "level"), Grade.cbc_level)
+            query = db.session.query(
+                Grade.subject_id,
+                level_expr,
+                func.count(Grade.id),
+                func.count(Grade.marks),
+                func.coalesce(func.sum(Grade.marks), 0),
+            )
+            if class_name:
+                query = (
+                    query.join(Student, Student.id == Grade.student_id)
+                    .join(Class, Class.id == Student.current_class_id)
+                    .filter(Class.name == class_name)
+                )
+            if term:
+                query = query.filter(Grade.term == term)
+            if year:
+                query = query.filter(Grade.year == year)
+            rows = query.group_by(Grade.subject_id, level_expr).all()
+
+            subjects, levels, total = {}, _empty_levels(), 0
+            marked = {}
+            for subject_id, cbc_level, count, with_marks, marks_sum in rows:
+                entry = subjects.setdefault(
+                    subject_id, {"average": 0.0, "count": 0, "levels": _empty_levels()}
+                )
+                level = LEVEL_KEYS.get(cbc_level, "below")
+                entry["count"] += count
+                entry["levels"][level] += count
+                levels[level] += count
+                total += count
+                n, s = marked.get(subject_id, (0, 0.0))
+                marked[subject_id] = (n + with_marks, s + float(marks_sum))
+            for subject_id, (n, s) in marked.items():
+                subjects[subject_id]["average"] = round(s / n, 1) if n else 0.0
+            return {"subjects": subjects, "levels": levels, "count": total}
+
+        return GradebookStatsService._cached(
+            ("stats", class_name, term, year), compute, use_cache
+        )
+
+    @staticmethod
+    def subject_averages(subject_ids, class_name=None, term=None, year=None):
+        """subject_id -> average marks for the filter (0 when no grades)."""
+        subjects = GradebookStatsService.stats(class_name, term, year)["subjects"]
+        return {
+            sid: subjects[sid]["average"] if sid in subjects else 0 for sid in subject_ids
+        }
+
+    @staticmethod
+    def matrix(term=None, year=None, use_cache=True):
+        """
+        Average percentage per subject (rows) and class (columns):
+        {"subjects": [...], "classes": [...], "averages": [[avg or None]],
+         "counts": [[n]]}, rows and columns sorted by name.
+        """
+
+        def compute():
+            query = (
+                db.session.query(
+                    Subject.name,
+                    Class.name,
+                    func.count(Grade.percentage),
+                    func.coalesce(func.sum(Grade.percentage), 0),
+                )
+                .join(Subject, Subject.id == Grade.subject_id)
+                .join(Student, Student.id == Grade.student_id)
+                .join(Class, Class.id == Student.current_class_id)
+            )
+            if term:
+                query = query.filter(Grade.term == term)
+            if year:
+                query = query.filter(Grade.year == year)
+            rows = query.group_by(Subject.name, Class.name).all()
+            if not rows:
+                return {"subjects": [], "classes": [], "averages": [], "counts": []}
+
+            subject_names, class_names, counts, sums = zip(*rows)
+            subjects, s_idx = np.unique(subject_names, return_inverse=True)
+            classes, c_idx = np.unique(class_names, return_inverse=True)
+            count_grid = np.zeros((subjects.size, classes.size), dtype=int)
+            sum_grid = np.zeros((subjects.size, classes.size))
+            count_grid[s_idx, c_idx] = counts
+            sum_grid[s_idx, c_idx] = np.asarray(sums, dtype=float)
+            with np.errstate(invalid="ignore"):
+                averages = np.round(sum_grid / count_grid, 2)  # 0/0 -> NaN
+            return {
+                "subjects": subjects.tolist(),
+                "classes": classes.tolist(),
+                "averages": np.where(count_grid > 0, averages, None).tolist(),
+                "counts": count_grid.tolist(),
+            }
+
+        return GradebookStatsService._cached(("matrix", term, year), compute, use_cache)
+
+    @staticmethod
+    def heatmap(term=None, year=None):
+        """
+        The matrix as Chart.js matrix-chart data: class on x, subject on y,
+        ``v`` the average and ``color`` its rubric band colour. Empty cells
+        are left out.
+        """
+        matrix = GradebookStatsService.matrix(term, year)
+        scale = rubric()
+        cells = []
+        for i, subject in enumerate(matrix["subjects"]):
+            for j, class_name in enumerate(matrix["classes"]):
+                average = matrix["averages"][i][j]
+                if average is None:
+                    continue
+                cells.append(
+                    {
+                        "x": class_name,
+                        "y": subject,
+                        "v": average,
+                        "count": matrix["counts"][i][j],
+                        "color": scale.color(scale.code(average)),
+                    }
+                )
+        return {
+            "term": term,
+            "year": year,
+            "x_labels": matrix["classes"],
+            "y_labels": matrix["subjects"],
+            "data": cells,
+        }
+
+
+gradebook_stats = GradebookStatsService()
+
+
+def _grade_scopes(target):
+    """(term, year) pairs a grade belongs to now and before this flush."""
+    state = inspect(target)
+    terms = set(state.attrs.term.history.deleted or ()) | {target.term}
+    years = set(state.attrs.year.history.deleted or ()) | {target.year}
+    return {(t, y) for t in terms for y in years}
+
+
+@event.listens_for(Grade, "after_insert")
+@event.listens_for(Grade, "after_update")
+@event.listens_for(Grade, "after_delete")
+def _mark_gradebook_stats_stale(mapper, connection, target):
+    # Dropped on commit: invalidating now would let a concurrent request
+    # recompute from pre-commit data and cache it
+    scopes = inspect(target).session.info.setdefault("stale_gradebook_stats", set())
+    scopes.update(_grade_scopes(target))
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_gradebook_stats(session):
+    scopes = session.info.pop("stale_gradebook_stats", None)
+    if scopes:
+        gradebook_stats.invalidate(scopes)
+
+
+@event.listens_for(Session, "after_rollback")
+def _keep_gradebook_stats(session):
+    session.info.pop("stale_gradebook_stats", None)
@@ -0,0 +1,61 @@
+"""Add materialized ledger columns to fee_statements
+
+Revision ID: a3f1c9d27e54
+Revises: 23c1d61e48bb
+Create Date: 2026-10-16 09:12:41.208334
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a3f1c9d27e54'
+down_revision = '23c1d61e48bb'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('fee_statements', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('amount_paid', sa.Float(), server_default=sa.text('0'), nullable=False))
+        batch_op.add_column(sa.Column('balance', sa.Float(), server_default=sa.text('0'), nullable=False))
+        batch_op.add_column(sa.Column('status', sa.String(length=20), server_default='unpaid', nullable=False))
+
+    with op.batch_alter_table('fee_payments', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_fee_payments_fee_statement_id'), ['fee_statement_id'], unique=False)
+
+    # Backfill from the existing payments ledger
+    op.execute(
+        """
+        UPDATE fee_statements
+        SET amount_paid = (
+                SELECT COALESCE(SUM(p.amount_paid), 0) FROM fee_payments p
+                WHERE p.fee_statement_id = fee_statements.id
+            ),
+            balance = amount_due - (
+                SELECT COALESCE(SUM(p.amount_paid), 0) FROM fee_payments p
+                WHERE p.fee_statement_id = fee_statements.id
+            )
+        """
+    )
+    op.execute(
+        """
+        UPDATE fee_statements
+        SET status = CASE
+            WHEN balance <= 0 THEN 'paid'
+            WHEN amount_paid > 0 THEN 'partial'
+            ELSE 'unpaid'
+        END
+        """
+    )
+
+
+def downgrade():
+    with op.batch_alter_table('fee_payments', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_fee_payments_fee_statement_id'))
+
+    with op.batch_alter_table('fee_statements', schema=None) as batch_op:
+        batch_op.drop_column('status')
+        batch_op.drop_column('balance')
+        batch_op.drop_column('amount_paid')
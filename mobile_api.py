@@ -2,6 +2,8 @@ from flask import Blueprint, jsonify, request, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity, create_access_token
 from werkzeug.security import check_password_hash
 from datetime import datetime, timedelta
+from rubric import rubric
+from term_summaries import term_summary_service
 import json
 
 # Create blueprint
@@ -196,15 +198,21 @@ def get_student_grades(student_id):
                 },
                 'term': grade.term,
                 'year': grade.year,
+                'exam_type': grade.exam_type,
                 'marks': grade.marks,
-                'max_marks': grade.max_marks,
+                'max_marks': 100,
                 'percentage': grade.percentage,
                 'grade_letter': grade.grade_letter,
-                'points': grade.points,
-                'teacher_comment': grade.teacher_comment,
+                'points': rubric().points(grade.marks),
+                'teacher_comment': None,
                 'created_at': grade.created_at.isoformat() if grade.created_at else None
             })
         
+        # Standing per term from the maintained summary table
+        summaries = term_summary_service.history(student_id, year=year)
+        if term:
+            summaries = [s for s in summaries if s.term == term]
+        
         return jsonify({
             'success': True,
             'student': {
@@ -213,7 +221,16 @@ def get_student_grades(student_id):
                 'admission_number': student.admission_number,
                 'current_class': student.current_class
             },
-            'grades': grades_data
+            'grades': grades_data,
+            'summary': [{
+                'term': s.term,
+                'year': s.year,
+                'subject_count': s.subject_count,
+                'total': s.total,
+                'mean': s.mean,
+                'rubric': s.rubric,
+                'rank': s.rank
+            } for s in summaries]
         })
         
     except Exception as e:
@@ -381,7 +398,7 @@ def get_dashboard_data():
         user_id = get_jwt_identity()
         
         # Import here to avoid circular imports
-        from app import User, Student, Grade, FeeStatement, Announcement
+        from app import User, Student, FeeStatement, Announcement
         
         user = User.query.get(user_id)
         if not user:
@@ -399,7 +416,8 @@ def get_dashboard_data():
         
         if user.role == 'parent':
             # Get children
-            children = Student.query.filter_by(parent_id=user_id, is_active=True).all()
+            children = Student.query.filter_by(parent_id=user_id, status='active').all()
+            latest = term_summary_service.latest([c.id for c in children])
             
             children_data = []
             total_balance = 0
@@ -407,11 +425,7 @@ def get_dashboard_data():
             for child in children:
                 child_balance = child.get_total_fees_balance()
                 total_balance += child_balance
-                
-                # Get recent grades
-                recent_grades = Grade.query.filter_by(
-                    student_id=child.id
-                ).order_by(Grade.created_at.desc()).limit(5).all()
+                summary = latest.get(child.id)
                 
                 children_data.append({
                     'id': child.id,
@@ -419,7 +433,11 @@ def get_dashboard_data():
                     'admission_number': child.admission_number,
                     'current_class': child.current_class,
                     'fee_balance': child_balance,
-                    'recent_grades_count': len(recent_grades)
+                    'recent_grades_count': summary.grade_count if summary else 0,
+                    'latest_term': f'{summary.term} {summary.year}' if summary else None,
+                    'latest_mean': summary.mean if summary else None,
+                    'latest_rubric': summary.rubric if summary else None,
+                    'latest_rank': summary.rank if summary else None
                 })
             
             dashboard_data.update({
@@ -1,11 +1,15 @@
 # models.py
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
-from datetime import datetime, date
+from datetime import datetime, date, timedelta
 from werkzeug.security import generate_password_hash, check_password_hash
-import uuid
-from sqlalchemy import func
+from sqlalchemy import func, select, case, and_, or_, event, inspect, type_coerce, tuple_
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.hybrid import hybrid_property
+from sqlalchemy.orm import Session
 from extensions import db
+from receipts import receipt_allocator
+from rubric import rubric
 
 
 # -------------------- User --------------------
@@ -230,8 +234,8 @@ class Student(db.Model):
 
     def get_total_fees_balance(self):
         """
-        Sum balances across this student's fee_statements using Python properties.
-        This avoids attempting SQL func.sum() on a Python @property.
+        Sum the stored balances across this student's fee_statements.
+        Balances are maintained by the fee ledger, so no payments are loaded.
         """
         return (
             sum((fs.balance or 0) for fs in self.fee_statements)
@@ -244,8 +248,12 @@ class Student(db.Model):
 
     @classmethod
     def get_school_fees_balance(cls):
-        # This works for all students
-        return sum(student.get_total_fees_balance() for student in cls.query.all())
+        # Single SUM over the materialized statement balances
+        return (
+            db.session.query(func.coalesce(func.sum(FeeStatement.balance), 0))
+            .join(cls, cls.id == FeeStatement.student_id)
+            .scalar()
+        )
 
     # -------------------- Teacher --------------------
     # -------------------- Association Tables --------------------
@@ -345,10 +353,19 @@ class Subject(db.Model):
 # -------------------- Grade --------------------
 class Grade(db.Model):
     __tablename__ = "grades"
+    __table_args__ = (
+        # One mark per student, subject and exam; grade_entry upserts on this key
+        db.UniqueConstraint(
+            "student_id", "subject_id", "exam_type", "term", "year", name="uq_grade_entry"
+        ),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     student_id = db.Column(db.Integer, db.ForeignKey("students.id"), nullable=False)
     subject_id = db.Column(db.Integer, db.ForeignKey("subjects.id"), nullable=False)
+    exam_type = db.Column(
+        db.String(20), nullable=False, default="Summative", server_default="Summative"
+    )  # Exam 1 / Exam 2 / Exam 3 / Summative
     term = db.Column(db.String(20), nullable=True)
     year = db.Column(db.Integer, nullable=True)
     marks = db.Column(db.Float, nullable=True)
@@ -359,41 +376,105 @@ class Grade(db.Model):
     student = db.relationship("Student", back_populates="grades", lazy="joined")
     subject = db.relationship("Subject", back_populates="grades", lazy="joined")
 
+    @property
     def grade_letter(self):
-        """Return letter grade based on percentage (fallback safe)."""
-        p = self.percentage or (self.marks if self.marks is not None else None)
-        if p is None:
-            return "N/A"
-        try:
-            p = float(p)
-        except Exception:
-            return "N/A"
-        if p >= 63:
-            return "EE1"
-        if p >= 54:
-            return "EE2"
-        if p >= 45:
-            return "ME1"
-        if p >= 36:
-            return "ME2"
-        if p >= 27:
-            return "AE1"
-        if p >= 18:
-            return "AE2"
-        if p >= 9:
-            return "BE1"
-        return "BE2"
+        """CBC rubric code (EE1 ... BE2) for percentage, else marks."""
+        p = self.percentage if self.percentage is not None else self.marks
+        return rubric().code(p, default="N/A")
 
     def __repr__(self):
         return f"<Grade Student:{self.student_id} Subject:{self.subject_id}>"
 
 
+# -------------------- Result Snapshot --------------------
+class ResultSnapshot(db.Model):
+    """Ranked results for one class and exam, written by results.ResultsEngine."""
+
+    __tablename__ = "result_snapshots"
+    __table_args__ = (
+        db.UniqueConstraint(
+            "class_id", "term", "year", "exam_type", name="uq_result_snapshot_scope"
+        ),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    class_id = db.Column(db.Integer, db.ForeignKey("classes.id"), nullable=False)
+    term = db.Column(db.String(20), nullable=False)
+    year = db.Column(db.Integer, nullable=False)
+    exam_type = db.Column(db.String(20), nullable=False)
+    student_count = db.Column(db.Integer, nullable=False, default=0)
+    class_mean = db.Column(db.Float, nullable=True)
+    mean_grade = db.Column(db.String(10), nullable=True)
+    subject_means = db.Column(db.Text)  # JSON {subject_id: mean}
+    computed_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    entries = db.relationship(
+        "ResultSnapshotEntry",
+        back_populates="snapshot",
+        cascade="all, delete-orphan",
+        order_by="ResultSnapshotEntry.position",
+        lazy="select",
+    )
+
+
+class ResultSnapshotEntry(db.Model):
+    __tablename__ = "result_snapshot_entries"
+
+    id = db.Column(db.Integer, primary_key=True)
+    snapshot_id = db.Column(
+        db.Integer, db.ForeignKey("result_snapshots.id"), nullable=False, index=True
+    )
+    student_id = db.Column(db.Integer, db.ForeignKey("students.id"), nullable=False, index=True)
+    subjects_taken = db.Column(db.Integer, nullable=False, default=0)
+    total = db.Column(db.Float, nullable=False, default=0)
+    mean = db.Column(db.Float, nullable=True)
+    mean_grade = db.Column(db.String(10), nullable=True)
+    position = db.Column(db.Integer, nullable=True)  # competition rank in the class (1, 2, 2, 4)
+    dense_position = db.Column(db.Integer, nullable=True)  # dense rank in the class (1, 2, 2, 3)
+    level_position = db.Column(db.Integer, nullable=True)  # rank across all streams of the level
+    previous_mean = db.Column(db.Float, nullable=True)
+    deviation = db.Column(db.Float, nullable=True)  # mean minus previous term's mean
+    subject_scores = db.Column(db.Text)  # JSON {subject_id: [marks, position]}
+
+    snapshot = db.relationship("ResultSnapshot", back_populates="entries")
+    student = db.relationship("Student", lazy="joined")
+
+
+# -------------------- Student Term Summary --------------------
+class StudentTermSummary(db.Model):
+    """
+    Per student/term/year standing, kept current from grades by the flush hook
+    at the bottom of this module (refresh_student_term_summary).
+    """
+
+    __tablename__ = "student_term_summary"
+    __table_args__ = (
+        db.UniqueConstraint("student_id", "term", "year", name="uq_student_term_summary"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    student_id = db.Column(db.Integer, db.ForeignKey("students.id"), nullable=False, index=True)
+    term = db.Column(db.String(20), nullable=False)
+    year = db.Column(db.Integer, nullable=False)
+    subject_count = db.Column(db.Integer, nullable=False, default=0)
+    grade_count = db.Column(db.Integer, nullable=False, default=0)
+    total = db.Column(db.Float, nullable=False, default=0)  # sum of subject averages
+    mean = db.Column(db.Float, nullable=True)  # mean of subject averages
+    rubric = db.Column(db.String(10), nullable=True)
+    rank = db.Column(db.Integer, nullable=True)  # filled by the results engine; kept on grade changes
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    student = db.relationship("Student")
+
+
 # -------------------- Fee Statement --------------------
 class FeeStatement(db.Model):
     __tablename__ = "fee_statements"
 
     id = db.Column(db.Integer, primary_key=True)
-    student_id = db.Column(db.Integer, db.ForeignKey("students.id"), nullable=False)
+    student_id = db.Column(
+        db.Integer, db.ForeignKey("students.id"), nullable=False, index=True
+    )
     year = db.Column(db.Integer, nullable=False)
     term = db.Column(db.String(20), nullable=False)
     fee_type = db.Column(db.String(50), nullable=False)
@@ -401,6 +482,24 @@ class FeeStatement(db.Model):
     due_date = db.Column(db.DateTime, nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    # Denormalized ledger totals, kept in sync with fee_payments / fee_credits
+    # by the flush hook at the bottom of this module (refresh_fee_statement_totals)
+    amount_paid = db.Column(db.Float, nullable=False, default=0)
+    amount_credited = db.Column(db.Float, nullable=False, default=0)  # bursaries etc.
+    balance = db.Column(
+        db.Float,
+        nullable=False,
+        default=lambda ctx: ctx.get_current_parameters().get("amount_due") or 0,
+    )
+    status = db.Column(db.String(20), nullable=False, default="unpaid")  # unpaid, partial, paid
+
+    __table_args__ = (
+        db.Index("ix_fee_statements_status_due_date", "status", "due_date"),
+        db.Index(
+            "ix_fee_statements_student_period", "student_id", "year", "term", "fee_type"
+        ),
+    )
+
     student = db.relationship("Student", back_populates="fee_statements", lazy="joined")
     payments = db.relationship(
         "FeePayment",
@@ -408,24 +507,72 @@ class FeeStatement(db.Model):
         cascade="all, delete-orphan",
         lazy="select",
     )
+    credits = db.relationship(
+        "FeeCredit",
+        back_populates="fee_statement",
+        cascade="all, delete-orphan",
+        lazy="select",
+    )
 
-    @property
-    def amount_paid(self):
+    @hybrid_property
+    def ledger_paid(self):
+        """Paid total recomputed from the payments ledger (source of truth)."""
         return sum((p.amount_paid or 0) for p in self.payments)
 
-    @property
-    def balance(self):
-        # amount_due - amount_paid
-        return (self.amount_due or 0) - self.amount_paid
+    @ledger_paid.expression
+    def ledger_paid(cls):
+        return (
+            select(func.coalesce(func.sum(FeePayment.amount_paid), 0))
+            .where(FeePayment.fee_statement_id == cls.id)
+            .correlate_except(FeePayment)
+            .scalar_subquery()
+        )
 
-    @property
+    @hybrid_property
+    def ledger_credited(self):
+        """Bursary / scholarship credits recomputed from fee_credits."""
+        return sum((c.amount or 0) for c in self.credits)
+
+    @ledger_credited.expression
+    def ledger_credited(cls):
+        return (
+            select(func.coalesce(func.sum(FeeCredit.amount), 0))
+            .where(FeeCredit.fee_statement_id == cls.id)
+            .correlate_except(FeeCredit)
+            .scalar_subquery()
+        )
+
+    @hybrid_property
+    def ledger_balance(self):
+        return (self.amount_due or 0) - self.ledger_paid - self.ledger_credited
+
+    @ledger_balance.expression
+    def ledger_balance(cls):
+        return cls.amount_due - cls.ledger_paid - cls.ledger_credited
+
+    @hybrid_property
     def is_paid(self):
-        return self.balance <= 0
+        return (self.balance or 0) <= 0
 
-    @property
+    @is_paid.expression
+    def is_paid(cls):
+        return cls.status == "paid"
+
+    @hybrid_property
     def is_overdue(self):
         return bool(
-            self.due_date and self.due_date < datetime.utcnow() and self.balance > 0
+            self.due_date
+            and self.due_date < datetime.utcnow()
+            and (self.balance or 0) > 0
+        )
+
+    @is_overdue.expression
+    def is_overdue(cls):
+        # Evaluated per call so the cut-off is "now" at query build time
+        return and_(
+            cls.status != "paid",
+            cls.due_date.isnot(None),
+            cls.due_date < datetime.utcnow(),
         )
 
     def __repr__(self):
@@ -438,27 +585,62 @@ class FeePayment(db.Model):
 
     id = db.Column(db.Integer, primary_key=True)
     fee_statement_id = db.Column(
-        db.Integer, db.ForeignKey("fee_statements.id"), nullable=False
+        db.Integer, db.ForeignKey("fee_statements.id"), nullable=False, index=True
     )
     student_id = db.Column(db.Integer, db.ForeignKey("students.id"), nullable=False)
     amount_paid = db.Column(db.Float, nullable=False)
-    payment_date = db.Column(db.DateTime, default=datetime.utcnow)
+    payment_date = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     payment_method = db.Column(db.String(50), nullable=True)
-    receipt_no = db.Column(
-        db.String(100),
-        unique=True,
-        default=lambda: f"RCPT-{str(uuid.uuid4())[:8].upper()}",
-    )
+    # Assigned by the before_flush hook below from the receipts allocator
+    receipt_no = db.Column(db.String(100), unique=True)
+    # Bank / M-Pesa transaction code, set when matched against a statement file
+    reference = db.Column(db.String(100), nullable=True, index=True)
+    reconciled_at = db.Column(db.DateTime, nullable=True)
+    note = db.Column(db.String(255), nullable=True)
+    # Finance sign-off; only payments posted through the payments API start unapproved
+    approved = db.Column(db.Boolean, nullable=False, default=True, server_default=db.true())
+    approved_by = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=True)
+    approved_at = db.Column(db.DateTime, nullable=True)
 
     fee_statement = db.relationship(
         "FeeStatement", back_populates="payments", lazy="joined"
     )
     student = db.relationship("Student", back_populates="payments", lazy="joined")
+    approver = db.relationship("User", foreign_keys=[approved_by])
 
     def __repr__(self):
         return f"<FeePayment Student:{self.student_id} Amount:{self.amount_paid}>"
 
 
+# -------------------- Fee Credit --------------------
+class FeeCredit(db.Model):
+    """A bursary / scholarship amount applied against one fee statement."""
+
+    __tablename__ = "fee_credits"
+    __table_args__ = (
+        db.UniqueConstraint(
+            "source", "source_id", "fee_statement_id", name="uq_fee_credit_allocation"
+        ),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    fee_statement_id = db.Column(
+        db.Integer, db.ForeignKey("fee_statements.id"), nullable=False, index=True
+    )
+    student_id = db.Column(db.Integer, db.ForeignKey("students.id"), nullable=False)
+    source = db.Column(db.String(20), nullable=False)  # bursary / scholarship
+    source_id = db.Column(db.Integer, nullable=False)
+    amount = db.Column(db.Float, nullable=False)
+    created_by = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    fee_statement = db.relationship("FeeStatement", back_populates="credits")
+    student = db.relationship("Student")
+
+    def __repr__(self):
+        return f"<FeeCredit {self.source}:{self.source_id} Amount:{self.amount}>"
+
+
 # -------------------- Announcement --------------------
 class Announcement(db.Model):
     __tablename__ = "announcements"
@@ -673,6 +855,69 @@ class FinanceAuditLog(db.Model):
     entity_id = db.Column(db.Integer)
 
 
+class FinanceKPISnapshot(db.Model):
+    __tablename__ = "finance_kpi_snapshots"
+
+    id = db.Column(db.Integer, primary_key=True)
+    snapshot_date = db.Column(db.Date, unique=True, nullable=False)
+    total_billed = db.Column(db.Float, default=0)
+    total_collected = db.Column(db.Float, default=0)
+    total_outstanding = db.Column(db.Float, default=0)
+    overdue_count = db.Column(db.Integer, default=0)
+    total_salary_budget = db.Column(db.Float, default=0)
+    total_salary_paid = db.Column(db.Float, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            "date": self.snapshot_date.isoformat(),
+            "total_billed": self.total_billed,
+            "total_collected": self.total_collected,
+            "total_outstanding": self.total_outstanding,
+            "overdue_count": self.overdue_count,
+            "total_salary_budget": self.total_salary_budget,
+            "total_salary_paid": self.total_salary_paid,
+        }
+
+
+class ReceiptSequence(db.Model):
+    """High-water mark of reserved receipt numbers per calendar year."""
+
+    __tablename__ = "receipt_sequences"
+
+    year = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    next_value = db.Column(db.Integer, nullable=False, default=1)
+
+
+class FeeCollectionDaily(db.Model):
+    """Per-day fee collection rollup; payments are added to their bucket as they change."""
+
+    __tablename__ = "fee_collection_daily"
+    __table_args__ = (
+        # One row per bucket; add_fee_collections upserts additively on this key
+        db.UniqueConstraint(
+            "day",
+            "class_id",
+            "fee_type",
+            "payment_method",
+            "term",
+            "year",
+            name="uq_fee_collection_bucket",
+        ),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, nullable=False, index=True)
+    class_id = db.Column(db.Integer, db.ForeignKey("classes.id"), nullable=True)
+    fee_type = db.Column(db.String(50), nullable=True)
+    payment_method = db.Column(db.String(50), nullable=True)
+    # Term / year of the statement paid against, so termly series need no join
+    term = db.Column(db.String(20), nullable=True)
+    year = db.Column(db.Integer, nullable=True)
+    payment_count = db.Column(db.Integer, nullable=False, default=0)
+    amount_total = db.Column(db.Float, nullable=False, default=0)
+
+
 class SalaryApprovalLog(db.Model):
     __tablename__ = "salary_approval_logs"
 
@@ -767,3 +1012,438 @@ class Employee(db.Model):
 
     def __repr__(self):
         return f"{self.first_name} {self.last_name} ({self.role})"
+
+
+# -------------------- Fee Ledger --------------------
+def fee_status_case(balance, settled):
+    """SQL CASE giving unpaid / partial / paid from a balance and amount settled."""
+    return case((balance <= 0, "paid"), (settled > 0, "partial"), else_="unpaid")
+
+
+def refresh_fee_statement_totals(connection, statement_ids):
+    """
+    Recompute amount_paid/amount_credited/balance/status for the given
+    statements from fee_payments and fee_credits in a single UPDATE.
+    Safe to call with duplicate or None ids.
+    """
+    ids = {i for i in statement_ids if i is not None}
+    if not ids:
+        return 0
+
+    statements = FeeStatement.__table__
+    payments = FeePayment.__table__
+    credits = FeeCredit.__table__
+    paid = (
+        select(func.coalesce(func.sum(payments.c.amount_paid), 0))
+        .where(payments.c.fee_statement_id == statements.c.id)
+        .scalar_subquery()
+    )
+    credited = (
+        select(func.coalesce(func.sum(credits.c.amount), 0))
+        .where(credits.c.fee_statement_id == statements.c.id)
+        .scalar_subquery()
+    )
+    balance = statements.c.amount_due - paid - credited
+    result = connection.execute(
+        statements.update()
+        .where(statements.c.id.in_(ids))
+        .values(
+            amount_paid=paid,
+            amount_credited=credited,
+            balance=balance,
+            status=fee_status_case(balance, paid + credited),
+        )
+    )
+    return result.rowcount
+
+
+def _payment_day():
+    return type_coerce(func.date(FeePayment.payment_date), db.Date)
+
+
+def _day_ranges(days):
+    """Sorted dates -> half-open [start, end) datetime ranges of consecutive days."""
+    ranges = []
+    for d in days:
+        start = datetime.combine(d, datetime.min.time())
+        if ranges and ranges[-1][1] == start:
+            ranges[-1][1] = start + timedelta(days=1)
+        else:
+            ranges.append([start, start + timedelta(days=1)])
+    return ranges
+
+
+def refresh_fee_collection_daily(connection, days):
+    """
+    Rebuild the fee_collection_daily rows for the given dates from
+    fee_payments: one DELETE and one INSERT ... SELECT ... GROUP BY. Payments
+    are picked by payment_date ranges so the index on it is used and only
+    those days' payments are read. Used by backfill only: a rebuild racing a
+    concurrent payment on the same day can drop or duplicate it, so live
+    writes go through add_fee_collections.
+    """
+    days = sorted({d.date() if isinstance(d, datetime) else d for d in days if d})
+    if not days:
+        return 0
+
+    rollup = FeeCollectionDaily.__table__
+    day = _payment_day()
+    in_days = or_(
+        *(
+            and_(FeePayment.payment_date >= start, FeePayment.payment_date < end)
+            for start, end in _day_ranges(days)
+        )
+    )
+    grouped = (
+        select(
+            day,
+            Student.current_class_id,
+            FeeStatement.fee_type,
+            FeePayment.payment_method,
+            FeeStatement.term,
+            FeeStatement.year,
+            func.count(FeePayment.id),
+            func.coalesce(func.sum(FeePayment.amount_paid), 0),
+        )
+        .select_from(FeePayment)
+        .join(FeeStatement, FeeStatement.id == FeePayment.fee_statement_id)
+        .join(Student, Student.id == FeePayment.student_id)
+        .where(in_days)
+        .group_by(
+            day,
+            Student.current_class_id,
+            FeeStatement.fee_type,
+            FeePayment.payment_method,
+            FeeStatement.term,
+            FeeStatement.year,
+        )
+    )
+    connection.execute(rollup.delete().where(rollup.c.day.in_(days)))
+    result = connection.execute(
+        rollup.insert().from_select(
+            [
+                "day",
+                "class_id",
+                "fee_type",
+                "payment_method",
+                "term",
+                "year",
+                "payment_count",
+                "amount_total",
+            ],
+            grouped,
+        )
+    )
+    return result.rowcount
+
+
+FEE_COLLECTION_KEY = ("day", "class_id", "fee_type", "payment_method", "term", "year")
+# FeePayment columns a rollup bucket is built from, in add_fee_collections order
+FEE_COLLECTION_SOURCE = (
+    "payment_date",
+    "student_id",
+    "fee_statement_id",
+    "payment_method",
+    "amount_paid",
+)
+FEE_COLLECTION_CHUNK = 500  # ids / rows per statement
+_DIALECT_INSERTS = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+
+
+def add_fee_collections(connection, payments):
+    """
+    Add payments to the fee_collection_daily rollup without rescanning their
+    days. ``payments``: (sign, payment_date, student_id, fee_statement_id,
+    payment_method, amount) tuples, sign 1 to add a payment and -1 to take
+    it back out. Each bucket is one additive INSERT ... ON CONFLICT DO UPDATE,
+    so concurrent cashiers on the same day add to the same row instead of
+    rebuilding over each other.
+    """
+    payments = [p for p in payments if p[1] is not None and p[3] is not None]
+    if not payments:
+        return 0
+
+    statements, classes = {}, {}
+    statement_ids = sorted({p[3] for p in payments})
+    student_ids = sorted({p[2] for p in payments})
+    for start in range(0, len(statement_ids), FEE_COLLECTION_CHUNK):
+        rows = connection.execute(
+            select(
+                FeeStatement.id, FeeStatement.fee_type, FeeStatement.term, FeeStatement.year
+            ).where(FeeStatement.id.in_(statement_ids[start : start + FEE_COLLECTION_CHUNK]))
+        )
+        statements.update((row[0], tuple(row[1:])) for row in rows)
+    for start in range(0, len(student_ids), FEE_COLLECTION_CHUNK):
+        rows = connection.execute(
+            select(Student.id, Student.current_class_id).where(
+                Student.id.in_(student_ids[start : start + FEE_COLLECTION_CHUNK])
+            )
+        )
+        classes.update(tuple(row) for row in rows)
+
+    buckets = {}
+    for sign, paid_at, student_id, statement_id, method, amount in payments:
+        if statement_id not in statements:
+            continue
+        fee_type, term, year = statements[statement_id]
+        day = paid_at.date() if isinstance(paid_at, datetime) else paid_at
+        key = (day, classes.get(student_id), fee_type, method, term, year)
+        bucket = buckets.setdefault(key, [0, 0.0])
+        bucket[0] += sign
+        bucket[1] += sign * float(amount or 0)
+
+    rows = [
+        dict(zip(FEE_COLLECTION_KEY, key), payment_count=n, amount_total=round(total, 2))
+        for key, (n, total) in buckets.items()
+        if n or abs(total) >= 0.005
+    ]
+    rollup = FeeCollectionDaily.__table__
+    dialect_insert = _DIALECT_INSERTS.get(connection.dialect.name)
+    # NULLs never conflict on the unique key, so buckets with a NULL class or
+    # method (and every bucket on other dialects) update first, then insert
+    keyed, loose = [], []
+    for row in rows:
+        complete = None not in (row[c] for c in FEE_COLLECTION_KEY)
+        (keyed if dialect_insert and complete else loose).append(row)
+    for start in range(0, len(keyed), FEE_COLLECTION_CHUNK):
+        stmt = dialect_insert(rollup).values(keyed[start : start + FEE_COLLECTION_CHUNK])
+        stmt = stmt.on_conflict_do_update(
+            index_elements=list(FEE_COLLECTION_KEY),
+            set_={
+                "payment_count": rollup.c.payment_count + stmt.excluded.payment_count,
+                "amount_total": rollup.c.amount_total + stmt.excluded.amount_total,
+            },
+        )
+        connection.execute(stmt)
+    for row in loose:
+        match = and_(
+            *(
+                rollup.c[c].is_(None) if row[c] is None else rollup.c[c] == row[c]
+                for c in FEE_COLLECTION_KEY
+            )
+        )
+        updated = connection.execute(
+            rollup.update()
+            .where(match)
+            .values(
+                payment_count=rollup.c.payment_count + row["payment_count"],
+                amount_total=rollup.c.amount_total + row["amount_total"],
+            )
+        )
+        if not updated.rowcount:
+            connection.execute(rollup.insert().values(**row))
+
+    # Buckets whose last payment was taken back out
+    days = sorted({row["day"] for row in rows})
+    connection.execute(
+        rollup.delete().where(
+            rollup.c.day.in_(days),
+            rollup.c.payment_count == 0,
+            func.abs(rollup.c.amount_total) < 0.005,
+        )
+    )
+    return len(rows)
+
+
+def _fee_collection_values(payment):
+    values = [getattr(payment, a) for a in FEE_COLLECTION_SOURCE]
+    # payment_date may have come from the column default at INSERT
+    values[0] = values[0] or datetime.utcnow()
+    return tuple(values)
+
+
+def _touched_fee_statement_ids(session):
+    """Collect statement ids whose totals may change in the pending flush."""
+    ids = set()
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, (FeePayment, FeeCredit)):
+            history = inspect(obj).attrs.fee_statement_id.history
+            ids.update(history.added or ())
+            ids.update(history.deleted or ())
+            ids.update(history.unchanged or ())
+        elif isinstance(obj, FeeStatement) and obj not in session.deleted:
+            if inspect(obj).attrs.amount_due.history.has_changes():
+                ids.add(obj.id)
+    return ids
+
+
+# -------------------- Term Summary Hooks --------------------
+TERM_SUMMARY_KEY = ("student_id", "term", "year")
+# Columns recomputed from grades; rank belongs to the results engine
+TERM_SUMMARY_AGGREGATES = ("subject_count", "grade_count", "total", "mean", "rubric", "updated_at")
+TERM_SUMMARY_CHUNK = 200  # keys per statement; keeps SQLite under its bind-parameter limit
+
+
+def refresh_student_term_summary(connection, keys):
+    """
+    Recompute student_term_summary rows for the given (student_id, term, year)
+    keys from grades: one INSERT ... SELECT ... ON CONFLICT DO UPDATE of the
+    aggregate columns (rank is left to the results engine), and a DELETE of
+    keys with no grades left. Each subject counts once, at the average of
+    its exams.
+    """
+    keys = sorted({k for k in keys if None not in k})
+    written = 0
+    for start in range(0, len(keys), TERM_SUMMARY_CHUNK):
+        written += _refresh_term_summary_chunk(
+            connection, keys[start : start + TERM_SUMMARY_CHUNK]
+        )
+    return written
+
+
+def _refresh_term_summary_chunk(connection, keys):
+    summary = StudentTermSummary.__table__
+    grades = Grade.__table__
+    key = tuple_(grades.c.student_id, grades.c.term, grades.c.year)
+    per_subject = (
+        select(
+            grades.c.student_id,
+            grades.c.term,
+            grades.c.year,
+            func.avg(grades.c.marks).label("marks"),
+            func.count(grades.c.id).label("grade_count"),
+        )
+        .where(key.in_(keys), grades.c.marks.isnot(None))
+        .group_by(grades.c.student_id, grades.c.term, grades.c.year, grades.c.subject_id)
+        .subquery()
+    )
+    mean = func.avg(per_subject.c.marks)
+    grouped = select(
+        per_subject.c.student_id,
+        per_subject.c.term,
+        per_subject.c.year,
+        func.count(),
+        func.sum(per_subject.c.grade_count),
+        func.sum(per_subject.c.marks),
+        mean,
+        rubric().case(mean),
+        func.now(),
+    ).group_by(per_subject.c.student_id, per_subject.c.term, per_subject.c.year)
+
+    summary_key = tuple_(summary.c.student_id, summary.c.term, summary.c.year)
+    graded = (
+        select(grades.c.id)
+        .where(
+            grades.c.student_id == summary.c.student_id,
+            grades.c.term == summary.c.term,
+            grades.c.year == summary.c.year,
+            grades.c.marks.isnot(None),
+        )
+        .exists()
+    )
+    connection.execute(summary.delete().where(summary_key.in_(keys), ~graded))
+
+    columns = list(TERM_SUMMARY_KEY + TERM_SUMMARY_AGGREGATES)
+    dialect_insert = _DIALECT_INSERTS.get(connection.dialect.name)
+    if dialect_insert is None:
+        return _upsert_term_summary_generic(connection, columns, grouped)
+    stmt = dialect_insert(summary).from_select(columns, grouped)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=list(TERM_SUMMARY_KEY),
+        set_={c: stmt.excluded[c] for c in TERM_SUMMARY_AGGREGATES},
+    )
+    return connection.execute(stmt).rowcount
+
+
+def _upsert_term_summary_generic(connection, columns, grouped):
+    """Dialects without ON CONFLICT: update existing keys, insert the rest."""
+    summary = StudentTermSummary.__table__
+    rows = [dict(zip(columns, row)) for row in connection.execute(grouped)]
+    for row in rows:
+        updated = connection.execute(
+            summary.update()
+            .where(*(summary.c[c] == row[c] for c in TERM_SUMMARY_KEY))
+            .values({c: row[c] for c in TERM_SUMMARY_AGGREGATES})
+        )
+        if not updated.rowcount:
+            connection.execute(summary.insert().values(**row))
+    return len(rows)
+
+
+@event.listens_for(Grade, "after_insert")
+@event.listens_for(Grade, "after_update")
+@event.listens_for(Grade, "after_delete")
+def _mark_term_summary_stale(mapper, connection, target):
+    """Queue the summary keys a grade belonged to before and after this flush."""
+    state = inspect(target)
+    current = tuple(getattr(target, a) for a in TERM_SUMMARY_KEY)
+    previous = tuple(
+        (state.attrs[a].history.deleted or [getattr(target, a)])[0] for a in TERM_SUMMARY_KEY
+    )
+    state.session.info.setdefault("stale_term_summaries", set()).update({current, previous})
+
+
+@event.listens_for(Session, "before_flush")
+def _assign_receipt_numbers(session, flush_context, instances):
+    # Numbered before anything is written, on the session's own connection
+    for obj in session.new:
+        if isinstance(obj, FeePayment) and not obj.receipt_no:
+            year = (obj.payment_date or datetime.utcnow()).year
+            obj.receipt_no = receipt_allocator.next_receipt_no(year, session)
+
+
+@event.listens_for(Session, "after_flush")
+def _sync_student_term_summaries(session, flush_context):
+    keys = session.info.pop("stale_term_summaries", None)
+    if keys:
+        refresh_student_term_summary(session.connection(), keys)
+
+
+@event.listens_for(Session, "after_flush")
+def _sync_fee_statement_totals(session, flush_context):
+    ids = _touched_fee_statement_ids(session)
+    if ids:
+        refresh_fee_statement_totals(session.connection(), ids)
+        session.info.setdefault("stale_fee_statements", set()).update(ids)
+
+
+@event.listens_for(Session, "before_flush")
+def _stage_fee_collection_changes(session, flush_context, instances):
+    # Changed and deleted payments leave their old bucket: read the stored
+    # values before the flush overwrites them
+    changed = [
+        obj
+        for obj in session.dirty
+        if isinstance(obj, FeePayment)
+        and any(inspect(obj).attrs[a].history.has_changes() for a in FEE_COLLECTION_SOURCE)
+    ]
+    old_ids = [
+        obj.id
+        for obj in changed + [o for o in session.deleted if isinstance(o, FeePayment)]
+        if obj.id is not None
+    ]
+    removed = []
+    columns = [getattr(FeePayment, a) for a in FEE_COLLECTION_SOURCE]
+    for start in range(0, len(old_ids), FEE_COLLECTION_CHUNK):
+        rows = session.connection().execute(
+            select(*columns).where(
+                FeePayment.id.in_(old_ids[start : start + FEE_COLLECTION_CHUNK])
+            )
+        )
+        removed.extend((-1, *row) for row in rows)
+    if removed or changed:
+        session.info["fee_collection_changes"] = (removed, changed)
+
+
+@event.listens_for(Session, "after_flush")
+def _sync_fee_collection_daily(session, flush_context):
+    removed, changed = session.info.pop("fee_collection_changes", ([], []))
+    added = [
+        (1, *_fee_collection_values(obj))
+        for obj in list(session.new) + changed
+        if isinstance(obj, FeePayment)
+    ]
+    if removed or added:
+        add_fee_collections(session.connection(), removed + added)
+
+
+@event.listens_for(Session, "after_flush_postexec")
+def _expire_fee_statement_totals(session, flush_context):
+    ids = session.info.pop("stale_fee_statements", None)
+    if not ids:
+        return
+    for obj in list(session.identity_map.values()):
+        if isinstance(obj, FeeStatement) and obj.id in ids:
+            session.expire(
+                obj, ["amount_paid", "amount_credited", "balance", "status"]
+            )
@@ -3,8 +3,6 @@
 from flask import Blueprint, render_template, redirect, url_for, flash
 from flask_login import login_required, current_user
 
-from datetime import datetime, timedelta
-from sqlalchemy import and_
 from models import User, FeeStatement, StaffSalary, Notification, Student
 from extensions import db
 from notifications import notification_service
@@ -16,13 +14,13 @@ class NotificationService:
     @staticmethod
     def send_daily_reminders():
         """Send daily fee reminders for overdue payments"""
-        overdue_fees = FeeStatement.query.filter(
-            and_(
-                FeeStatement.due_date < datetime.now().date(), FeeStatement.balance > 0
-            )
-        ).all()
+        overdue_fees = (
+            FeeStatement.query.filter(FeeStatement.is_overdue)
+            .order_by(FeeStatement.student_id)
+            .all()
+        )
 
-        # Group by student
+        # Group by student (student is joined-loaded with the statement)
         student_fees = {}
         for fee in overdue_fees:
             if fee.student_id not in student_fees:
@@ -31,8 +29,8 @@ class NotificationService:
 
         # Send notifications
         for student_id, fees in student_fees.items():
-            student = Student.query.get(student_id)
-            if student and student.parent.email:
+            student = fees[0].student
+            if student and student.parent and student.parent.email:
                 # Send email
                 send_fee_reminder(student, fees)
 
@@ -68,9 +66,7 @@ def notifications_dashboard():
         return "Access Denied", 403
 
     # Fee alerts
-    overdue_fees = FeeStatement.query.filter(
-        FeeStatement.balance > 0, FeeStatement.due_date < datetime.utcnow()
-    ).all()
+    overdue_fees = FeeStatement.query.filter(FeeStatement.is_overdue).all()
 
     # Salary payment alerts
     pending_salaries = StaffSalary.query.filter_by(paid=False).all()
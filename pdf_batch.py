@@ -0,0 +1,124 @@
+# pdf_batch.py
+# Batch rendering shared by the fee statement and report card PDFs: students
+# are split into chunks for a process pool (or rendered in-process for small
+# batches), and the per-student PDFs are either streamed into a ZIP as they
+# are finished or merged in order into one file.
+import os
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+from pypdf import PdfReader, PdfWriter
+
+CHUNK_SIZE = 25  # students per worker task
+MIN_PARALLEL = 8  # below this many students, render in-process
+
+
+def chunked(items, size):
+    return [items[i : i + size] for i in range(0, len(items), size)]
+
+
+def filename_part(text):
+    """Admission numbers etc. made safe for a file name."""
+    return "".join(c if c.isalnum() or c in "-_" else "_" for c in text)
+
+
+def iter_pdfs(
+    items,
+    render_one,
+    render_chunk,
+    initializer=None,
+    initargs=(),
+    workers=None,
+    on_progress=None,
+):
+    """
+    Yield (item, pdf_bytes) in input order. ``render_chunk`` (a module-level
+    function, so the pool can pickle it) renders a list of items in a worker
+    started with ``initializer(*initargs)``; batches under MIN_PARALLEL, or
+    workers=1, use ``render_one`` in-process. ``on_progress(done, total)``
+    is called after every item.
+    """
+    total = len(items)
+    done = 0
+    if total < MIN_PARALLEL or workers == 1:
+        if initializer:
+            initializer(*initargs)
+        for item in items:
+            pdf = render_one(item)
+            done += 1
+            if on_progress:
+                on_progress(done, total)
+            yield item, pdf
+        return
+
+    chunks = chunked(items, CHUNK_SIZE)
+    workers = workers or min(os.cpu_count() or 1, len(chunks))
+    with ProcessPoolExecutor(
+        max_workers=workers, initializer=initializer, initargs=initargs
+    ) as pool:
+        for chunk, pdfs in zip(chunks, pool.map(render_chunk, chunks)):
+            for item, pdf in zip(chunk, pdfs):
+                done += 1
+                if on_progress:
+                    on_progress(done, total)
+                yield item, pdf
+
+
+class ZipStream:
+    """Write-only file object handing zipfile output to a generator."""
+
+    def __init__(self):
+        self.parts = []
+
+    def write(self, data):
+        self.parts.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data, self.parts = b"".join(self.parts), []
+        return data
+
+
+def stream_zip(members):
+    """Generator of ZIP bytes for (filename, data) pairs, flushed per member."""
+    out = ZipStream()
+    with zipfile.ZipFile(out, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for filename, data in members:
+            archive.writestr(filename, data)
+            yield out.drain()
+    yield out.drain()
+
+
+def merge_pdfs(pdfs, out):
+    """Append each PDF (bytes) to one document written into ``out``."""
+    writer = PdfWriter()
+    for pdf in pdfs:
+        writer.append(PdfReader(BytesIO(pdf)))
+    writer.write(out)
+    return out
+
+
+class PdfBatch:
+    """
+    Output for a batch renderer. Subclasses provide ``iter_pdfs(items,
+    **options)`` and ``filename(item)``; options (workers, on_progress, ...)
+    are passed through.
+    """
+
+    @classmethod
+    def stream_zip(cls, items, **options):
+        """Generator of ZIP bytes; each member is flushed as soon as it is rendered."""
+        yield from stream_zip(
+            (cls.filename(item), pdf) for item, pdf in cls.iter_pdfs(items, **options)
+        )
+
+    @classmethod
+    def write_merged(cls, items, out, **options):
+        """
+        Write all PDFs as one into ``out``: the per-student files rendered by
+        the pool, merged in order with pypdf.
+        """
+        return merge_pdfs((pdf for _item, pdf in cls.iter_pdfs(items, **options)), out)
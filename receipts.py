@@ -0,0 +1,138 @@
+# receipts.py
+# Sequential per-year receipt numbers handed out in blocks (hi/lo).
+# Each worker reserves RECEIPT_BLOCK_SIZE numbers with one short UPDATE, then
+# issues them from memory; a worker that exits early leaves at most one partly
+# used block as a gap in the sequence. Payments get their number before the
+# flush that inserts them, and a block needed then is reserved on the
+# session's own connection: it is shared with the rest of the process once
+# that transaction commits and dropped (with the UPDATE) if it rolls back.
+import os
+import threading
+from datetime import datetime
+from flask import current_app, has_app_context
+from sqlalchemy import event, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from extensions import db
+
+DEFAULT_BLOCK_SIZE = 20  # override with RECEIPT_BLOCK_SIZE
+RECEIPT_PREFIX = "RCPT"
+
+
+def format_receipt_no(year, number):
+    # Seven digits keeps these distinct from the legacy 6-hex receipt numbers
+    return f"{RECEIPT_PREFIX}/{year}/{number:07d}"
+
+
+def _take(blocks, year):
+    """Next number from ``blocks[year]``, or None when it is missing or used up."""
+    block = blocks.get(year)
+    if block is None or block[0] >= block[1]:
+        return None
+    number = block[0]
+    block[0] += 1
+    return number
+
+
+class ReceiptNumberAllocator:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._blocks = {}  # year -> [next, end)
+        self._pid = os.getpid()
+
+    @staticmethod
+    def block_size():
+        if has_app_context():
+            return int(current_app.config.get("RECEIPT_BLOCK_SIZE", DEFAULT_BLOCK_SIZE))
+        return DEFAULT_BLOCK_SIZE
+
+    @staticmethod
+    def reserve_block(year, size, connection=None):
+        """
+        Claim ``size`` numbers for ``year``. On ``connection`` the claim is
+        part of its current transaction; without one it commits in a
+        transaction of its own. Returns (first, end) with end exclusive.
+        """
+        if connection is None:
+            with db.engine.begin() as conn:
+                return ReceiptNumberAllocator.reserve_block(year, size, conn)
+
+        from models import ReceiptSequence
+
+        table = ReceiptSequence.__table__
+        for _attempt in range(3):
+            updated = connection.execute(
+                table.update()
+                .where(table.c.year == year)
+                .values(next_value=table.c.next_value + size)
+            ).rowcount
+            if updated:
+                end = connection.execute(
+                    select(table.c.next_value).where(table.c.year == year)
+                ).scalar_one()
+                return end - size, end
+            try:
+                with connection.begin_nested():
+                    connection.execute(table.insert().values(year=year, next_value=1 + size))
+                return 1, 1 + size
+            except IntegrityError:
+                # Another worker opened the year first; take a block from its row
+                continue
+        raise RuntimeError(f"Could not reserve receipt numbers for {year}")
+
+    def next_number(self, year=None, session=None):
+        """
+        Next receipt number for ``year``. Pass the ``session`` whenever the
+        caller is inside a write transaction: a new block is then reserved on
+        its connection instead of a second one, which would wait on the
+        caller's own locks (SQLite reports "database is locked").
+        """
+        year = year or datetime.utcnow().year
+        pending = session.info.setdefault("receipt_blocks", {}) if session else None
+        if pending:
+            number = _take(pending, year)
+            if number is not None:
+                return number
+        with self._lock:
+            if os.getpid() != self._pid:
+                # Forked worker: blocks cached by the parent belong to the parent
+                self._blocks.clear()
+                self._pid = os.getpid()
+            number = _take(self._blocks, year)
+            if number is not None:
+                return number
+            if session is None:
+                self._blocks[year] = list(self.reserve_block(year, self.block_size()))
+                return _take(self._blocks, year)
+        pending[year] = list(
+            self.reserve_block(year, self.block_size(), session.connection())
+        )
+        return _take(pending, year)
+
+    def next_receipt_no(self, year=None, session=None):
+        year = year or datetime.utcnow().year
+        return format_receipt_no(year, self.next_number(year, session))
+
+    def adopt(self, blocks):
+        """Share blocks reserved by a committed session with the whole process."""
+        with self._lock:
+            for year, block in blocks.items():
+                current = self._blocks.get(year)
+                if block[0] < block[1] and (current is None or current[0] >= current[1]):
+                    self._blocks[year] = block
+
+
+receipt_allocator = ReceiptNumberAllocator()
+
+
+@event.listens_for(Session, "after_commit")
+def _share_receipt_blocks(session):
+    blocks = session.info.pop("receipt_blocks", None)
+    if blocks:
+        receipt_allocator.adopt(blocks)
+
+
+@event.listens_for(Session, "after_rollback")
+def _drop_receipt_blocks(session):
+    # The reserving UPDATE was rolled back too; these numbers may be reissued
+    session.info.pop("receipt_blocks", None)
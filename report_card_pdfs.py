@@ -0,0 +1,336 @@
+# report_card_pdfs.py
+# Batch report cards for a class or the whole school.
+# Students, every grade for the term and their result positions are prefetched
+# with three queries into plain dicts. Workers in a process pool are started
+# with a shared render context (school header, logo bytes) and build their
+# styles once, so each card is pure reportlab work. Output is one merged PDF
+# or a ZIP streamed as each card is finished.
+import os
+from collections import defaultdict
+from datetime import datetime
+from io import BytesIO
+from flask import current_app, has_app_context
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.lib.units import inch
+from reportlab.platypus import (
+    SimpleDocTemplate,
+    Table,
+    TableStyle,
+    Paragraph,
+    Spacer,
+    Image,
+)
+from extensions import db
+from models import Grade, Subject, Student, Class, SchoolInfo, ResultSnapshot, ResultSnapshotEntry
+from fee_statement_pdfs import SCHOOL_NAME
+from pdf_batch import PdfBatch, filename_part, iter_pdfs
+from rubric import rubric
+
+EXAM_COLUMNS = ("Exam 1", "Exam 2", "Exam 3", "Summative")
+LOGO_SIZE = 0.9 * inch
+
+INFO_STYLE = TableStyle(
+    [
+        ("BACKGROUND", (0, 0), (0, -1), colors.lightgrey),
+        ("BACKGROUND", (2, 0), (2, -1), colors.lightgrey),
+        ("GRID", (0, 0), (-1, -1), 1, colors.black),
+        ("FONTNAME", (0, 0), (-1, -1), "Helvetica"),
+        ("FONTSIZE", (0, 0), (-1, -1), 10),
+        ("BOTTOMPADDING", (0, 0), (-1, -1), 8),
+    ]
+)
+GRADES_STYLE = TableStyle(
+    [
+        ("BACKGROUND", (0, 0), (-1, 0), colors.grey),
+        ("TEXTCOLOR", (0, 0), (-1, 0), colors.whitesmoke),
+        ("ALIGN", (1, 0), (-1, -1), "CENTER"),
+        ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
+        ("FONTSIZE", (0, 0), (-1, -1), 9),
+        ("BOTTOMPADDING", (0, 0), (-1, 0), 10),
+        ("BACKGROUND", (0, 1), (-1, -2), colors.beige),
+        ("BACKGROUND", (0, -1), (-1, -1), colors.lightblue),
+        ("FONTNAME", (0, -1), (-1, -1), "Helvetica-Bold"),
+        ("GRID", (0, 0), (-1, -1), 1, colors.black),
+    ]
+)
+HEADER_STYLE = TableStyle(
+    [
+        ("VALIGN", (0, 0), (-1, -1), "MIDDLE"),
+        ("ALIGN", (1, 0), (1, 0), "CENTER"),
+    ]
+)
+INFO_COLUMNS = [1.4 * inch, 2 * inch, 1.4 * inch, 2 * inch]
+GRADE_COLUMNS = [2.2 * inch] + [0.8 * inch] * len(EXAM_COLUMNS) + [0.8 * inch, 0.9 * inch]
+
+_styles = None
+_context = {"school_name": SCHOOL_NAME, "motto": None, "logo": None}
+
+
+def _get_styles():
+    global _styles
+    if _styles is None:
+        base = getSampleStyleSheet()
+        _styles = {
+            "title": ParagraphStyle(
+                "CardTitle",
+                parent=base["Heading1"],
+                fontSize=16,
+                spaceAfter=4,
+                alignment=1,
+            ),
+            "motto": ParagraphStyle(
+                "CardMotto", parent=base["Italic"], fontSize=9, alignment=1
+            ),
+            "heading": base["Heading2"],
+        }
+    return _styles
+
+
+def _init_worker(context):
+    """Process pool initializer: install the shared render context once."""
+    _context.update(context)
+
+
+def load_render_context():
+    """School header and logo bytes, read once per batch in the parent process."""
+    school = SchoolInfo.query.first()
+    context = {
+        "school_name": (school.school_name if school else None) or SCHOOL_NAME,
+        "motto": school.motto if school else None,
+        "logo": None,
+    }
+    logo_file = school.logo_file if school else None
+    if logo_file:
+        candidates = [logo_file]
+        if has_app_context():
+            candidates += [
+                os.path.join(current_app.static_folder, logo_file),
+                os.path.join(current_app.static_folder, "uploads", logo_file),
+            ]
+        for path in candidates:
+            if os.path.isfile(path):
+                with open(path, "rb") as f:
+                    context["logo"] = f.read()
+                break
+    return context
+
+
+def _fmt(value):
+    return "-" if value is None else f"{value:g}"
+
+
+def report_card_story(card):
+    """Flowables for one student's report card (no page break)."""
+    styles = _get_styles()
+    header = [
+        Paragraph(f"{_context['school_name'].upper()}<br/>STUDENT REPORT CARD", styles["title"])
+    ]
+    if _context["motto"]:
+        header.append(Paragraph(_context["motto"], styles["motto"]))
+    if _context["logo"]:
+        logo = Image(BytesIO(_context["logo"]), width=LOGO_SIZE, height=LOGO_SIZE)
+        banner = Table([[logo, header, ""]], colWidths=[LOGO_SIZE + 6, None, LOGO_SIZE + 6])
+        banner.setStyle(HEADER_STYLE)
+        story = [banner]
+    else:
+        story = list(header)
+    story.append(Spacer(1, 12))
+
+    student, result = card["student"], card["result"]
+    position = "-"
+    if result and result["position"]:
+        position = f"{result['position']} of {result['class_size']}"
+    info = Table(
+        [
+            ["Student Name:", student["full_name"], "Admission No:", student["admission_number"]],
+            ["Class:", student["class_name"] or "-", "Term:", f"{card['term']} {card['year']}"],
+            [
+                "Class Position:",
+                position,
+                "Level Position:",
+                str(result["level_position"]) if result and result["level_position"] else "-",
+            ],
+            ["Date Generated:", card["generated_on"], "", ""],
+        ],
+        colWidths=INFO_COLUMNS,
+    )
+    info.setStyle(INFO_STYLE)
+    story += [info, Spacer(1, 16)]
+
+    subjects = card["subjects"]
+    if subjects:
+        rows = [["Subject", *EXAM_COLUMNS, "Average", "Grade"]]
+        for subject in subjects:
+            rows.append(
+                [
+                    subject["name"],
+                    *(_fmt(subject["marks"].get(exam)) for exam in EXAM_COLUMNS),
+                    _fmt(subject["average"]),
+                    subject["grade"],
+                ]
+            )
+        mean = card["mean"]
+        rows.append(
+            ["MEAN", *([""] * len(EXAM_COLUMNS)), _fmt(mean), rubric().code(mean, default="-")]
+        )
+        table = Table(rows, colWidths=GRADE_COLUMNS, repeatRows=1)
+        table.setStyle(GRADES_STYLE)
+        story += [Paragraph("ACADEMIC PERFORMANCE", styles["heading"]), Spacer(1, 8), table]
+
+    if result and result["deviation"] is not None:
+        trend = "up" if result["deviation"] >= 0 else "down"
+        story += [
+            Spacer(1, 12),
+            Paragraph(
+                f"Mean {trend} {abs(result['deviation']):.1f} marks from last term "
+                f"({_fmt(result['previous_mean'])}).",
+                styles["motto"],
+            ),
+        ]
+    return story
+
+
+def render_report_card(card):
+    """One student's report card as PDF bytes."""
+    buffer = BytesIO()
+    SimpleDocTemplate(buffer, pagesize=A4).build(report_card_story(card))
+    return buffer.getvalue()
+
+
+def _render_chunk(cards):
+    return [render_report_card(c) for c in cards]
+
+
+class ReportCardBatch(PdfBatch):
+    @staticmethod
+    def load(term, year, class_id=None, student_ids=None):
+        """
+        Prefetch everything the cards need: students, every grade for the
+        term and their stored result positions - three queries in total.
+        """
+        students = (
+            db.session.query(
+                Student.id,
+                Student.full_name,
+                Student.admission_number,
+                Class.name.label("class_name"),
+            )
+            .outerjoin(Class, Class.id == Student.current_class_id)
+            .order_by(Class.name, Student.full_name)
+        )
+        scope = []
+        if class_id:
+            scope.append(Student.current_class_id == class_id)
+        if student_ids:
+            scope.append(Student.id.in_(student_ids))
+        students = students.filter(*scope).all()
+
+        marks = defaultdict(lambda: defaultdict(dict))  # student -> subject -> exam -> marks
+        grades = (
+            db.session.query(Grade.student_id, Subject.name, Grade.exam_type, Grade.marks)
+            .join(Subject, Subject.id == Grade.subject_id)
+            .join(Student, Student.id == Grade.student_id)
+            .filter(Grade.term == term, Grade.year == year, *scope)
+            .order_by(Subject.name)
+        )
+        for student_id, subject_name, exam_type, mark in grades:
+            if mark is not None:
+                marks[student_id][subject_name][exam_type] = float(mark)
+
+        results = {}
+        rows = (
+            db.session.query(
+                ResultSnapshotEntry.student_id,
+                ResultSnapshotEntry.position,
+                ResultSnapshotEntry.level_position,
+                ResultSnapshotEntry.previous_mean,
+                ResultSnapshotEntry.deviation,
+                ResultSnapshot.student_count,
+            )
+            .join(ResultSnapshot, ResultSnapshot.id == ResultSnapshotEntry.snapshot_id)
+            .join(Student, Student.id == ResultSnapshotEntry.student_id)
+            .filter(
+                ResultSnapshot.term == term,
+                ResultSnapshot.year == year,
+                ResultSnapshot.exam_type == "Summative",
+                *scope,
+            )
+        )
+        for row in rows:
+            results[row.student_id] = {
+                "position": row.position,
+                "level_position": row.level_position,
+                "class_size": row.student_count,
+                "previous_mean": row.previous_mean,
+                "deviation": row.deviation,
+            }
+
+        generated_on = datetime.utcnow().strftime("%Y-%m-%d")
+        cards = []
+        for s in students:
+            subjects = []
+            for name, by_exam in marks.get(s.id, {}).items():
+                average = round(sum(by_exam.values()) / len(by_exam), 1)
+                subjects.append(
+                    {
+                        "name": name,
+                        "marks": by_exam,
+                        "average": average,
+                        "grade": rubric().code(average),
+                    }
+                )
+            mean = (
+                round(sum(sub["average"] for sub in subjects) / len(subjects), 1)
+                if subjects
+                else None
+            )
+            cards.append(
+                {
+                    "student": {
+                        "id": s.id,
+                        "full_name": s.full_name,
+                        "admission_number": s.admission_number,
+                        "class_name": s.class_name,
+                    },
+                    "term": term,
+                    "year": year,
+                    "generated_on": generated_on,
+                    "subjects": subjects,
+                    "mean": mean,
+                    "result": results.get(s.id),
+                }
+            )
+        return cards
+
+    @staticmethod
+    def render(card, context=None):
+        """One card rendered in-process with the school header installed."""
+        _init_worker(context or load_render_context())
+        return render_report_card(card)
+
+    @staticmethod
+    def iter_pdfs(cards, context=None, workers=None, on_progress=None):
+        """
+        Yield (card, pdf_bytes) in input order, rendered by a process pool;
+        ``context`` (see load_render_context) is installed once per worker.
+        """
+        return iter_pdfs(
+            cards,
+            render_report_card,
+            _render_chunk,
+            initializer=_init_worker,
+            initargs=(context or load_render_context(),),
+            workers=workers,
+            on_progress=on_progress,
+        )
+
+    @staticmethod
+    def filename(card):
+        admission = filename_part(card["student"]["admission_number"])
+        term = card["term"].replace(" ", "")
+        return f"report_card_{admission}_{term}_{card['year']}.pdf"
+
+
+report_card_batch = ReportCardBatch()
@@ -0,0 +1,313 @@
+# results.py
+# Term results and positions. Marks for every class of a level are loaded in
+# one query into a students x subjects NumPy matrix; totals, means, class
+# (stream) and level positions and per-subject positions are computed with
+# array operations, then persisted as one ResultSnapshot per class/term/exam.
+import json
+from datetime import datetime
+import numpy as np
+from sqlalchemy import bindparam, delete, func, insert
+from extensions import db
+from models import Class, Grade, ResultSnapshot, ResultSnapshotEntry, Student, StudentTermSummary
+from rubric import rubric
+
+TERMS = ("Term 1", "Term 2", "Term 3")
+DEFAULT_EXAM = "Summative"
+
+
+def previous_term(term, year):
+    """("Term 1", 2025) -> ("Term 3", 2024); None for unknown terms."""
+    if term not in TERMS:
+        return None
+    i = TERMS.index(term)
+    return (TERMS[i - 1], year) if i else (TERMS[-1], year - 1)
+
+
+def rank(scores, groups=None, dense=False):
+    """
+    Rank ``scores`` (higher is better) within each group in one pass.
+    Competition ranks by default (1, 2, 2, 4); ``dense`` gives 1, 2, 2, 3.
+    NaN scores are not ranked and come back as 0.
+    """
+    scores = np.asarray(scores, dtype=float)
+    n = scores.size
+    ranks = np.zeros(n, dtype=int)
+    if not n:
+        return ranks
+    groups = np.zeros(n, dtype=int) if groups is None else np.asarray(groups)
+    valid = ~np.isnan(scores)
+    index = np.flatnonzero(valid)
+    if not index.size:
+        return ranks
+
+    order = index[np.lexsort((-scores[index], groups[index]))]
+    s, g = scores[order], groups[order]
+    positions = np.arange(order.size)
+    group_start = np.r_[True, g[1:] != g[:-1]]
+    new_value = group_start | np.r_[True, s[1:] != s[:-1]]
+    first_in_group = np.maximum.accumulate(np.where(group_start, positions, 0))
+    if dense:
+        steps = np.cumsum(new_value)
+        ranks[order] = steps - steps[first_in_group] + 1
+    else:
+        first_of_tie = np.maximum.accumulate(np.where(new_value, positions, 0))
+        ranks[order] = first_of_tie - first_in_group + 1
+    return ranks
+
+
+class ResultsEngine:
+    @staticmethod
+    def load(class_ids, term, year, exam_type=DEFAULT_EXAM):
+        """
+        Marks matrix for the students of ``class_ids``.
+        Returns (student_ids, student_class, subject_ids, marks[n_students, n_subjects])
+        with NaN where a student has no mark; repeated marks are averaged.
+        """
+        rows = (
+            db.session.query(
+                Grade.student_id, Student.current_class_id, Grade.subject_id, Grade.marks
+            )
+            .join(Student, Student.id == Grade.student_id)
+            .filter(
+                Student.current_class_id.in_(class_ids),
+                Grade.term == term,
+                Grade.year == year,
+                Grade.exam_type == exam_type,
+                Grade.marks.isnot(None),
+            )
+            .all()
+        )
+        if not rows:
+            return np.empty(0, int), np.empty(0, int), np.empty(0, int), np.empty((0, 0))
+
+        data = np.array(rows, dtype=float)
+        student_ids, s_idx = np.unique(data[:, 0].astype(int), return_inverse=True)
+        subject_ids, c_idx = np.unique(data[:, 2].astype(int), return_inverse=True)
+        student_class = np.zeros(student_ids.size, dtype=int)
+        student_class[s_idx] = data[:, 1].astype(int)
+
+        shape = (student_ids.size, subject_ids.size)
+        sums, counts = np.zeros(shape), np.zeros(shape)
+        np.add.at(sums, (s_idx, c_idx), data[:, 3])
+        np.add.at(counts, (s_idx, c_idx), 1)
+        with np.errstate(invalid="ignore"):
+            marks = sums / counts  # 0/0 -> NaN for missing subjects
+        return student_ids, student_class, subject_ids, marks
+
+    @staticmethod
+    def previous_means(class_ids, term, year, exam_type=DEFAULT_EXAM):
+        """student_id -> mean mark in the previous term for the same exam."""
+        previous = previous_term(term, year)
+        if previous is None:
+            return {}
+        rows = (
+            db.session.query(Grade.student_id, func.avg(Grade.marks))
+            .join(Student, Student.id == Grade.student_id)
+            .filter(
+                Student.current_class_id.in_(class_ids),
+                Grade.term == previous[0],
+                Grade.year == previous[1],
+                Grade.exam_type == exam_type,
+                Grade.marks.isnot(None),
+            )
+            .group_by(Grade.student_id)
+        )
+        return {student_id: float(mean) for student_id, mean in rows if mean is not None}
+
+    @staticmethod
+    def compute(class_ids, term, year, exam_type=DEFAULT_EXAM):
+        """
+        Vectorized results for ``class_ids`` (normally every stream of one
+        level): per-student totals, means, class/level positions and
+        per-subject positions within the class.
+        """
+        student_ids, student_class, subject_ids, marks = ResultsEngine.load(
+            class_ids, term, year, exam_type
+        )
+        taken = (~np.isnan(marks)).sum(axis=1)
+        totals = np.nansum(marks, axis=1)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            means = np.where(taken > 0, totals / np.maximum(taken, 1), np.nan)
+
+        # Positions use the mean so a missed paper is not a lower total
+        rounded = np.round(means, 2)
+        position = rank(rounded, student_class)
+        dense_position = rank(rounded, student_class, dense=True)
+        level_position = rank(rounded)
+
+        # Subject positions within the class: rank every (class, subject) cell group
+        rows, cols = np.nonzero(~np.isnan(marks))
+        subject_position = np.zeros(marks.shape, dtype=int)
+        subject_position[rows, cols] = rank(
+            marks[rows, cols], student_class[rows] * max(subject_ids.size, 1) + cols
+        )
+
+        previous = ResultsEngine.previous_means(class_ids, term, year, exam_type)
+        previous_mean = np.array([previous.get(int(s), np.nan) for s in student_ids])
+        deviation = means - previous_mean
+
+        return {
+            "student_ids": student_ids,
+            "student_class": student_class,
+            "subject_ids": subject_ids,
+            "marks": marks,
+            "taken": taken,
+            "totals": totals,
+            "means": means,
+            "position": position,
+            "dense_position": dense_position,
+            "level_position": level_position,
+            "subject_position": subject_position,
+            "previous_mean": previous_mean,
+            "deviation": deviation,
+        }
+
+    @staticmethod
+    def rank_level(level, term, year, exam_type=DEFAULT_EXAM):
+        """Rank every stream of ``level`` and replace their snapshots."""
+        class_ids = [
+            class_id
+            for (class_id,) in db.session.query(Class.id).filter(Class.level == level)
+        ]
+        if not class_ids:
+            return []
+        result = ResultsEngine.compute(class_ids, term, year, exam_type)
+        return ResultsEngine.persist(class_ids, term, year, exam_type, result)
+
+    @staticmethod
+    def rank_school(term, year, exam_type=DEFAULT_EXAM):
+        """Rank every level in the school; returns the snapshots written."""
+        levels = [level for (level,) in db.session.query(Class.level).distinct()]
+        snapshots = []
+        for level in levels:
+            snapshots.extend(ResultsEngine.rank_level(level, term, year, exam_type))
+        return snapshots
+
+    @staticmethod
+    def rank_class(class_id, term, year, exam_type=DEFAULT_EXAM):
+        """
+        Rank the class and its sibling streams (level positions need them all)
+        and return the class's snapshot.
+        """
+        cls = db.session.get(Class, class_id)
+        if cls is None:
+            return None
+        ResultsEngine.rank_level(cls.level, term, year, exam_type)
+        return ResultsEngine.snapshot(class_id, term, year, exam_type)
+
+    @staticmethod
+    def persist(class_ids, term, year, exam_type, result):
+        """Replace the snapshots of ``class_ids`` with ``result`` in one transaction."""
+
+        def rounded(value):
+            return None if np.isnan(value) else round(float(value), 2)
+
+        grades = rubric().lookup(result["means"])
+
+        try:
+            stale = db.session.query(ResultSnapshot.id).filter(
+                ResultSnapshot.class_id.in_(class_ids),
+                ResultSnapshot.term == term,
+                ResultSnapshot.year == year,
+                ResultSnapshot.exam_type == exam_type,
+            )
+            stale_ids = [snapshot_id for (snapshot_id,) in stale]
+            if stale_ids:
+                db.session.execute(
+                    delete(ResultSnapshotEntry).where(
+                        ResultSnapshotEntry.snapshot_id.in_(stale_ids)
+                    )
+                )
+                db.session.execute(
+                    delete(ResultSnapshot).where(ResultSnapshot.id.in_(stale_ids))
+                )
+
+            student_class = result["student_class"]
+            subject_ids = [int(s) for s in result["subject_ids"]]
+            marks = result["marks"]
+            snapshots = []
+            for class_id in class_ids:
+                members = np.flatnonzero(student_class == class_id)
+                class_mean = result["means"][members].mean() if members.size else np.nan
+                sat = (~np.isnan(marks[members])).sum(axis=0)
+                subject_means = np.where(
+                    sat > 0, np.nansum(marks[members], axis=0) / np.maximum(sat, 1), np.nan
+                )
+                snapshot = ResultSnapshot(
+                    class_id=class_id,
+                    term=term,
+                    year=year,
+                    exam_type=exam_type,
+                    student_count=int(members.size),
+                    class_mean=rounded(class_mean),
+                    mean_grade=rubric().code(class_mean),
+                    subject_means=json.dumps(
+                        {
+                            subject_id: rounded(mean)
+                            for subject_id, mean in zip(subject_ids, subject_means)
+                            if not np.isnan(mean)
+                        }
+                    ),
+                    computed_at=datetime.utcnow(),
+                )
+                db.session.add(snapshot)
+                snapshots.append((snapshot, members))
+            db.session.flush()
+
+            entries = []
+            for snapshot, members in snapshots:
+                for i in members:
+                    scored = np.flatnonzero(~np.isnan(marks[i]))
+                    entries.append(
+                        {
+                            "snapshot_id": snapshot.id,
+                            "student_id": int(result["student_ids"][i]),
+                            "subjects_taken": int(result["taken"][i]),
+                            "total": round(float(result["totals"][i]), 2),
+                            "mean": rounded(result["means"][i]),
+                            "mean_grade": grades[i],
+                            "position": int(result["position"][i]) or None,
+                            "dense_position": int(result["dense_position"][i]) or None,
+                            "level_position": int(result["level_position"][i]) or None,
+                            "previous_mean": rounded(result["previous_mean"][i]),
+                            "deviation": rounded(result["deviation"][i]),
+                            "subject_scores": json.dumps(
+                                {
+                                    subject_ids[j]: [
+                                        round(float(marks[i, j]), 2),
+                                        int(result["subject_position"][i, j]),
+                                    ]
+                                    for j in scored
+                                }
+                            ),
+                        }
+                    )
+            if entries:
+                db.session.execute(insert(ResultSnapshotEntry), entries)
+            if exam_type == DEFAULT_EXAM and entries:
+                # The term's standing uses the end-of-term (Summative) class position
+                summary = StudentTermSummary.__table__
+                db.session.execute(
+                    summary.update()
+                    .where(
+                        summary.c.student_id == bindparam("b_student"),
+                        summary.c.term == term,
+                        summary.c.year == year,
+                    )
+                    .values(rank=bindparam("b_rank")),
+                    [{"b_student": e["student_id"], "b_rank": e["position"]} for e in entries],
+                )
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        return [snapshot for snapshot, _members in snapshots]
+
+    @staticmethod
+    def snapshot(class_id, term, year, exam_type=DEFAULT_EXAM):
+        return ResultSnapshot.query.filter_by(
+            class_id=class_id, term=term, year=year, exam_type=exam_type
+        ).first()
+
+
+results_engine = ResultsEngine()
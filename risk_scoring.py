@@ -0,0 +1,198 @@
+# risk_scoring.py
+# Early-warning risk scores for every active student. Four features are
+# gathered in grouped queries (term mean and trend from student_term_summary,
+# attendance rate over a recent window, outstanding fee balance), turned into
+# 0-1 risk components with NumPy and combined with configurable weights.
+import math
+from datetime import date, timedelta
+import numpy as np
+from flask import current_app, has_app_context
+from sqlalchemy import case, func, tuple_
+from extensions import db
+from models import Attendance, Class, FeeStatement, Student, StudentTermSummary
+from results import previous_term
+from term_summaries import term_summary_service
+
+FEATURES = ("academic", "trend", "attendance", "financial")
+FACTOR_LABELS = {
+    "academic": "Academic",
+    "trend": "Declining",
+    "attendance": "Attendance",
+    "financial": "Financial",
+}
+DEFAULT_WEIGHTS = {"academic": 0.4, "trend": 0.2, "attendance": 0.2, "financial": 0.2}
+# feature -> (no risk at or better than, full risk at or worse than)
+THRESHOLDS = {
+    "academic": (50.0, 20.0),  # term mean mark
+    "trend": (-5.0, -25.0),  # change in mean since the previous term
+    "attendance": (0.9, 0.6),  # share of recorded days attended
+    "financial": (20000.0, 80000.0),  # outstanding fee balance
+}
+ATTENDED = ("Present", "Late")
+DEFAULT_ATTENDANCE_DAYS = 90  # override with RISK_ATTENDANCE_DAYS
+
+
+def _scatter(student_ids, rows, columns):
+    """
+    Place per-student query ``rows`` (student_id, value, ...) onto the sorted
+    ``student_ids``: one float array per value column, NaN where absent.
+    """
+    out = np.full((columns, student_ids.size), np.nan)
+    if not rows or not student_ids.size:
+        return out
+    data = np.array(rows, dtype=float)
+    ids = data[:, 0].astype(int)
+    pos = np.clip(np.searchsorted(student_ids, ids), 0, student_ids.size - 1)
+    found = student_ids[pos] == ids
+    out[:, pos[found]] = data[found, 1:].T
+    return out
+
+
+class RiskEngine:
+    @staticmethod
+    def weights(weights=None):
+        """Weights in FEATURES order, from the argument, RISK_WEIGHTS or the defaults."""
+        if weights is None and has_app_context():
+            weights = current_app.config.get("RISK_WEIGHTS")
+        weights = {**DEFAULT_WEIGHTS, **(weights or {})}
+        w = np.array([float(weights[f]) for f in FEATURES])
+        if (w < 0).any() or not w.sum():
+            raise ValueError("Risk weights must be non-negative and not all zero.")
+        return w
+
+    @staticmethod
+    def features(term, year, since=None):
+        """
+        Feature matrix for active students.
+        Returns (student_ids, names, class_names, features[n_students, 4]) in
+        FEATURES order; mean mark, change since last term, attendance rate
+        since ``since`` and outstanding balance, NaN where there is no data.
+        """
+        students = (
+            db.session.query(Student.id, Student.full_name, Class.name)
+            .outerjoin(Class, Class.id == Student.current_class_id)
+            .filter(Student.status == "active")
+            .order_by(Student.id)
+            .all()
+        )
+        if not students:
+            return np.empty(0, int), [], [], np.empty((0, len(FEATURES)))
+        student_ids = np.array([s[0] for s in students], dtype=int)
+        names = [s[1] for s in students]
+        class_names = [s[2] for s in students]
+
+        keys = [(term, year)]
+        previous = previous_term(term, year)
+        if previous:
+            keys.append(previous)
+        summaries = (
+            db.session.query(
+                StudentTermSummary.student_id,
+                func.max(case((StudentTermSummary.term == term, StudentTermSummary.mean))),
+                func.max(
+                    case((StudentTermSummary.term != term, StudentTermSummary.mean))
+                ),
+            )
+            .filter(tuple_(StudentTermSummary.term, StudentTermSummary.year).in_(keys))
+            .group_by(StudentTermSummary.student_id)
+            .all()
+        )
+        mean, previous_mean = _scatter(student_ids, summaries, 2)
+
+        if since is None:
+            days = DEFAULT_ATTENDANCE_DAYS
+            if has_app_context():
+                days = current_app.config.get("RISK_ATTENDANCE_DAYS", days)
+            since = date.today() - timedelta(days=days)
+        attendance = (
+            db.session.query(
+                Attendance.student_id,
+                func.count(case((Attendance.status.in_(ATTENDED), 1))),
+                func.count(case((Attendance.status != "Excused", 1))),
+            )
+            .filter(Attendance.date >= since)
+            .group_by(Attendance.student_id)
+            .all()
+        )
+        attended, recorded = _scatter(student_ids, attendance, 2)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            rate = np.where(recorded > 0, attended / recorded, np.nan)
+
+        # Statement balances are maintained on the row: no payment join, no fan-out
+        balances = (
+            db.session.query(FeeStatement.student_id, func.sum(FeeStatement.balance))
+            .group_by(FeeStatement.student_id)
+            .all()
+        )
+        (balance,) = _scatter(student_ids, balances, 1)
+
+        features = np.column_stack([mean, mean - previous_mean, rate, balance])
+        return student_ids, names, class_names, features
+
+    @staticmethod
+    def score(features, weights=None):
+        """
+        Risk components (0 = fine, 1 = full risk; NaN features count as 0)
+        and weighted scores from 0 to 100 for a features matrix.
+        """
+        ok = np.array([THRESHOLDS[f][0] for f in FEATURES])
+        bad = np.array([THRESHOLDS[f][1] for f in FEATURES])
+        components = np.nan_to_num(np.clip((features - ok) / (bad - ok), 0, 1))
+        w = RiskEngine.weights(weights)
+        return components, components @ w / w.sum() * 100
+
+    @staticmethod
+    def assess(term=None, year=None, page=1, per_page=50, weights=None, min_score=0):
+        """
+        At-risk students ranked by score, one page at a time. Without a term,
+        the latest summarised term (of ``year``, if given) is used; a term
+        without a year means the current year. Students scoring ``min_score``
+        or less are left out.
+        """
+        if term is None:
+            term, year = term_summary_service.latest_term(year) or (
+                "Term 1",
+                year or date.today().year,
+            )
+        elif year is None:
+            year = date.today().year
+        student_ids, names, class_names, features = RiskEngine.features(term, year)
+        components, scores = RiskEngine.score(features, weights)
+
+        at_risk = np.flatnonzero(scores > min_score)
+        order = at_risk[np.lexsort((student_ids[at_risk], -scores[at_risk]))]
+        page, per_page = max(int(page), 1), max(int(per_page), 1)
+        start = (page - 1) * per_page
+
+        students = []
+        for i in order[start : start + per_page]:
+            mean, trend, rate, balance = (
+                None if np.isnan(v) else round(float(v), 2) for v in features[i]
+            )
+            students.append(
+                {
+                    "student_id": int(student_ids[i]),
+                    "name": names[i],
+                    "class": class_names[i] or "N/A",
+                    "risk_score": round(float(scores[i]), 1),
+                    "risk_factors": [
+                        FACTOR_LABELS[f] for f, c in zip(FEATURES, components[i]) if c > 0
+                    ],
+                    "academic_avg": mean,
+                    "trend": trend,
+                    "attendance_rate": rate,
+                    "outstanding_balance": balance or 0,
+                }
+            )
+        return {
+            "term": term,
+            "year": year,
+            "page": page,
+            "per_page": per_page,
+            "total": int(order.size),
+            "pages": math.ceil(order.size / per_page),
+            "risk_students": students,
+        }
+
+
+risk_engine = RiskEngine()
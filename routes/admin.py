@@ -17,9 +17,9 @@ from models import (
     Event,
     Subject,
 )
-from sqlalchemy import func
 from functools import wraps
 from decorators import roles_required
+from fee_balances import fee_balance_service
 from forms import (
     EditStudentForm,
     PromoteStudentsForm,
@@ -43,8 +43,9 @@ def admin_dashboard():
     school = SchoolInfo.query.all()
     total_students = Student.query.count()
     total_users = User.query.count()
-    total_fees_due = Student.get_school_fees_balance()
-    total_payments = db.session.query(func.sum(FeePayment.amount_paid)).scalar() or 0
+    fee_totals = fee_balance_service.school_totals()
+    total_fees_due = fee_totals["balance"]
+    total_payments = fee_totals["total_paid"]
     recent_students = Student.query.order_by(Student.id.desc()).limit(5).all()
     recent_payments = (
         FeePayment.query.order_by(FeePayment.payment_date.desc()).limit(5).all()
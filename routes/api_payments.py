@@ -1,4 +1,12 @@
-from flask import Blueprint, request, jsonify, send_file, current_app
+from flask import (
+    Blueprint,
+    request,
+    jsonify,
+    send_file,
+    current_app,
+    Response,
+    stream_with_context,
+)
 from flask_login import login_required, current_user
 from extensions import db, mail
 from models import (
@@ -9,13 +17,17 @@ from models import (
     FinanceAuditLog,
 )
 from decorators import api_roles_required
-from io import BytesIO, StringIO
-from datetime import datetime
-import csv
-import uuid
+from io import BytesIO
+from datetime import datetime, timedelta
 from flask import flash, redirect, url_for, render_template
 from flask_mail import Message
-from utils import generate_receipt_pdf, SchoolPDF
+from utils import generate_receipt_pdf, SchoolPDF, write_table_pdf
+from fee_aging import fee_aging_engine, BUCKETS, GROUPINGS
+from fee_reconciliation import fee_reconciliation_service
+from fee_exports import ledger_exporter, DATASETS, FORMATS as EXPORT_FORMATS
+from fee_collections import fee_collection_service, RESOLUTIONS
+
+AMOUNT_KEYS = {b[0] for b in BUCKETS} | {"total"}
 
 api_payments_bp = Blueprint("api_payments_bp", __name__, url_prefix="/api/payments")
 
@@ -24,17 +36,12 @@ api_payments_bp = Blueprint("api_payments_bp", __name__, url_prefix="/api/paymen
 # -------------------------------------------------
 
 
-def generate_receipt_no():
-    year = datetime.utcnow().year
-    return f"RCPT/{year}/{uuid.uuid4().hex[:6].upper()}"
-
-
 def log_audit(action):
     db.session.add(
-        AuditLog(
+        FinanceAuditLog(
             user_id=current_user.id,
-            action=action,
-            ip_address=request.remote_addr,
+            action=action[:100],
+            entity="fee_payments",
         )
     )
     db.session.commit()
@@ -73,7 +80,6 @@ def create_payment():
         fee_statement_id=data["fee_statement_id"],
         amount_paid=data["amount_paid"],
         payment_method=data["payment_method"],
-        receipt_no=generate_receipt_no(),
         approved=False,
     )
 
@@ -125,6 +131,7 @@ def approve_payment(payment_id):
 
 
 def generate_receipt_pdf(payment):
+    approver = payment.approver.full_name if payment.approver else "Finance Office"
     pdf = SchoolPDF()
     pdf.add_page()
     pdf.watermark("PAID")
@@ -141,8 +148,8 @@ def generate_receipt_pdf(payment):
         ("Amount Paid", f"KES {payment.amount_paid}"),
         ("Balance", f"KES {payment.fee_statement.balance}"),
         ("Method", payment.payment_method),
-        ("Approved By", payment.approver.full_name),
-        ("Approval Date", payment.approved_at),
+        ("Approved By", approver),
+        ("Approval Date", payment.approved_at or payment.payment_date),
     ]
 
     for label, value in fields:
@@ -154,7 +161,7 @@ def generate_receipt_pdf(payment):
     pdf.cell(
         0,
         10,
-        f"Digitally signed by {payment.approver.full_name}",
+        f"Digitally signed by {approver}",
         ln=True,
     )
 
@@ -183,126 +190,258 @@ def download_receipt(payment_id):
 # -------------------------------------------------
 
 
-@api_payments_bp.route("/aging/pdf", methods=["GET"])
-@login_required
-@api_roles_required("finance")
-def fee_aging_report():
-    pdf = SchoolPDF(orientation="L")
-    pdf.add_page()
-    pdf.watermark("OFFICIAL")
-    pdf.set_font("Arial", size=10)
+def _aging_filters():
+    group_by = request.args.get("group_by", "student")
+    if group_by not in GROUPINGS:
+        group_by = "student"
+    filters = {
+        "class_id": request.args.get("class_id", type=int),
+        "year": request.args.get("year", type=int),
+        "term": request.args.get("term"),
+    }
+    return group_by, filters
 
-    headers = ["Student", "Fee Type", "Balance", "Days Overdue"]
-    for h in headers:
-        pdf.cell(60, 8, h, border=1)
-    pdf.ln()
 
-    statements = FeeStatement.query.filter(FeeStatement.balance > 0).all()
+@api_payments_bp.route("/aging", methods=["GET"])
+@login_required
+@api_roles_required("finance")
+def fee_aging_summary():
+    group_by, filters = _aging_filters()
+    limit = min(request.args.get("limit", 100, type=int), 1000)
+    rows = []
+    for row in fee_aging_engine.iter_rows(group_by=group_by, **filters):
+        rows.append({k: float(v) if k in AMOUNT_KEYS else v for k, v in row.items()})
+        if len(rows) >= limit:
+            break
+    return jsonify(
+        {
+            "group_by": group_by,
+            "buckets": [b[1] for b in BUCKETS],
+            "totals": fee_aging_engine.summary(**filters),
+            "rows": rows,
+        }
+    )
 
-    for fs in statements:
-        days = (datetime.utcnow().date() - fs.due_date).days
-        pdf.cell(60, 8, fs.student.full_name, border=1)
-        pdf.cell(60, 8, fs.fee_type, border=1)
-        pdf.cell(60, 8, str(fs.balance), border=1)
-        pdf.cell(60, 8, str(max(days, 0)), border=1)
-        pdf.ln()
 
-    file = BytesIO()
-    pdf.output(file)
-    file.seek(0)
+@api_payments_bp.route("/aging/pdf", methods=["GET"])
+@login_required
+@api_roles_required("finance")
+def fee_aging_report():
+    group_by, filters = _aging_filters()
+    rows = fee_aging_engine.iter_rows(group_by=group_by, **filters)
+    file = fee_aging_engine.render_pdf(rows, group_by=group_by)
 
     log_audit("Generated fee aging report")
 
     return send_file(
         file,
         download_name="fee_aging_report.pdf",
+        mimetype="application/pdf",
         as_attachment=True,
     )
 
 
+@api_payments_bp.route("/aging/csv", methods=["GET"])
+@login_required
+@api_roles_required("finance")
+def fee_aging_csv():
+    group_by, filters = _aging_filters()
+    log_audit("Exported fee aging CSV")
+
+    rows = fee_aging_engine.iter_rows(group_by=group_by, **filters)
+    return Response(
+        stream_with_context(fee_aging_engine.stream_csv(rows, group_by=group_by)),
+        mimetype="text/csv",
+        headers={"Content-Disposition": "attachment; filename=fee_aging_report.csv"},
+    )
+
+
 # -------------------------------------------------
-# PAYMENTS REPORT (PDF)
+# COLLECTION TIME SERIES
 # -------------------------------------------------
 
 
-@api_payments_bp.route("/report/pdf", methods=["GET"])
+@api_payments_bp.route("/collections/timeseries", methods=["GET"])
 @login_required
 @api_roles_required("finance")
-def payments_report():
-    payments = FeePayment.query.all()
-    pdf = SchoolPDF(orientation="L")
-    pdf.add_page()
-    pdf.watermark("OFFICIAL")
-
-    pdf.set_font("Arial", size=9)
-    headers = [
-        "Receipt",
-        "Student",
-        "Paid",
-        "Balance",
-        "Method",
-        "Approved",
-    ]
+def collections_timeseries():
+    resolution = request.args.get("resolution", "daily")
+    if resolution not in RESOLUTIONS:
+        return jsonify({"error": f"resolution must be one of {', '.join(RESOLUTIONS)}"}), 400
+
+    try:
+        date_to = (
+            datetime.strptime(request.args["to"], "%Y-%m-%d").date()
+            if request.args.get("to")
+            else datetime.utcnow().date()
+        )
+        date_from = (
+            datetime.strptime(request.args["from"], "%Y-%m-%d").date()
+            if request.args.get("from")
+            else date_to - timedelta(days=90)
+        )
+    except ValueError:
+        return jsonify({"error": "Dates must be YYYY-MM-DD"}), 400
+
+    series = fee_collection_service.series(
+        resolution,
+        date_from,
+        date_to,
+        class_id=request.args.get("class_id", type=int),
+        fee_type=request.args.get("fee_type"),
+        payment_method=request.args.get("method"),
+        term=request.args.get("term"),
+        year=request.args.get("year", type=int),
+    )
+    return jsonify(
+        {
+            "resolution": resolution,
+            "from": date_from.isoformat(),
+            "to": date_to.isoformat(),
+            "total": round(sum(p["amount"] for p in series), 2),
+            "series": series,
+        }
+    )
 
-    for h in headers:
-        pdf.cell(45, 8, h, border=1)
-    pdf.ln()
 
-    for p in payments:
-        pdf.cell(45, 8, p.receipt_no, border=1)
-        pdf.cell(45, 8, p.student.full_name[:15], border=1)
-        pdf.cell(45, 8, str(p.amount_paid), border=1)
-        pdf.cell(45, 8, str(p.fee_statement.balance), border=1)
-        pdf.cell(45, 8, p.payment_method, border=1)
-        pdf.cell(45, 8, "Yes" if p.approved else "No", border=1)
-        pdf.ln()
+# -------------------------------------------------
+# BANK / M-PESA RECONCILIATION
+# -------------------------------------------------
 
-    buffer = BytesIO()
-    pdf.output(buffer)
-    buffer.seek(0)
+
+@api_payments_bp.route("/reconcile", methods=["POST"])
+@login_required
+@api_roles_required("finance")
+def reconcile_statement():
+    """
+    Upload a bank or M-Pesa statement CSV (field "file"). Returns the matched,
+    already-posted, ambiguous and unmatched lines; with post=true the matched
+    lines are posted as payments in one transaction.
+    """
+    upload = request.files.get("file")
+    if not upload or not upload.filename.lower().endswith(".csv"):
+        return jsonify({"error": "Upload a .csv statement file"}), 400
+
+    source = request.form.get("source", "M-Pesa")
+    result = fee_reconciliation_service.reconcile(upload.stream, source=source)
+
+    posted = None
+    if request.form.get("post", "").lower() in ("1", "true", "yes"):
+        posted = fee_reconciliation_service.post_matches(result)
+        log_audit(
+            f"Reconciled {source} statement: {posted['payments_created']} posted"
+        )
+
+    return jsonify(
+        {
+            "summary": {
+                key: len(result[key])
+                for key in ("matched", "already_posted", "ambiguous", "unmatched")
+            },
+            "posted": posted,
+            **result,
+        }
+    )
+
+
+# -------------------------------------------------
+# PAYMENTS REPORT (PDF)
+# -------------------------------------------------
+
+
+@api_payments_bp.route("/report/pdf", methods=["GET"])
+@login_required
+@api_roles_required("finance")
+def payments_report():
+    filters = _export_filters()
+    keys = ["receipt_no", "student_name", "amount_paid", "balance", "payment_method"]
+    labels = ["Receipt", "Student", "Paid", "Balance", "Method"]
+    rows = ledger_exporter.iter_rows("payments", **filters)
+    buffer = write_table_pdf(
+        rows, keys, labels, "Payments Report", amount_keys=["amount_paid"]
+    )
 
     log_audit("Generated payments report")
 
     return send_file(
         buffer,
         download_name="payments_report.pdf",
+        mimetype="application/pdf",
         as_attachment=True,
     )
 
 
 # -------------------------------------------------
-# CSV EXPORT (COMPLIANCE SAFE)
+# STREAMING LEDGER EXPORTS (CSV / XLSX / NDJSON)
 # -------------------------------------------------
 
 
+def _parse_date_arg(name):
+    value = request.args.get(name)
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, "%Y-%m-%d")
+    except ValueError:
+        return None
+
+
+def _export_filters():
+    date_to = _parse_date_arg("to")
+    return {
+        "date_from": _parse_date_arg("from"),
+        # "to" is inclusive of the whole day
+        "date_to": date_to + timedelta(days=1) if date_to else None,
+        "class_id": request.args.get("class_id", type=int),
+        "term": request.args.get("term"),
+        "year": request.args.get("year", type=int),
+        "student_id": request.args.get("student_id", type=int),
+    }
+
+
+def _export_response(dataset, fmt):
+    if dataset not in DATASETS or fmt not in EXPORT_FORMATS:
+        return jsonify({"error": "Unknown dataset or format"}), 400
+
+    filters = _export_filters()
+    rows = ledger_exporter.iter_rows(dataset, **filters)
+    filename = f"{dataset}_{datetime.utcnow().strftime('%Y%m%d%H%M%S')}.{fmt}"
+    log_audit(f"Exported {dataset} {fmt.upper()}")
+
+    if fmt == "xlsx":
+        file = ledger_exporter.write_xlsx(dataset, rows)
+        return send_file(
+            file,
+            download_name=filename,
+            mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+            as_attachment=True,
+        )
+
+    if fmt == "ndjson":
+        body = ledger_exporter.stream_ndjson(dataset, rows)
+        mimetype = "application/x-ndjson"
+    else:
+        body = ledger_exporter.stream_csv(dataset, rows)
+        mimetype = "text/csv"
+    return Response(
+        stream_with_context(body),
+        mimetype=mimetype,
+        headers={"Content-Disposition": f"attachment; filename={filename}"},
+    )
+
+
 @api_payments_bp.route("/export/csv", methods=["GET"])
 @login_required
 @api_roles_required("finance")
 def export_csv():
-    output = StringIO()
-    writer = csv.writer(output)
+    return _export_response("payments", "csv")
 
-    writer.writerow(["Receipt", "Student", "Paid", "Balance", "Approved"])
 
-    for p in FeePayment.query.all():
-        writer.writerow(
-            [
-                p.receipt_no,
-                p.student.full_name,
-                p.amount_paid,
-                p.fee_statement.balance,
-                "Yes" if p.approved else "No",
-            ]
-        )
-
-    log_audit("Exported payments CSV")
-
-    output.seek(0)
-    return send_file(
-        BytesIO(output.getvalue().encode()),
-        download_name="payments.csv",
-        as_attachment=True,
-    )
+@api_payments_bp.route("/export/<dataset>.<fmt>", methods=["GET"])
+@login_required
+@api_roles_required("finance")
+def export_ledger(dataset, fmt):
+    return _export_response(dataset, fmt)
 
 
 @api_payments_bp.route("/export/pdf", methods=["GET"])
@@ -9,20 +9,14 @@ from datetime import datetime
 from collections import defaultdict
 
 from extensions import db
-from models import User, Student, Class, Grade, Subject
+from models import User, Student, Class, Subject
 from forms import BulkUploadForm
+from grade_import import grade_import_engine
+from subject_resolver import subject_resolver
+from rubric import rubric
 
 bulk_bp = Blueprint("bulk_bp", __name__, url_prefix="/admin/bulk")
 
-# ----------------- Constants -----------------
-# KICD CBC achievement level thresholds (marks percentage)
-CBC_LEVELS = {
-    'Exceeding Expectations': (80, 100),
-    'Meeting Expectations': (60, 79),
-    'Approaching Expectations': (40, 59),
-    'Below Expectations': (0, 39)
-}
-
 # ----------------- Utilities -----------------
 def normalise_headers(headers_row):
     """Normalize header strings: strip, lower, replace spaces with underscore."""
@@ -35,67 +29,18 @@ def parse_csv_content(file_stream_bytes):
     rows = [r for r in reader if any(cell.strip() for cell in r)]  # drop empty rows
     return rows
 
-def parse_class_grade_from_name(class_name):
-    """
-    Try to extract grade number from class name.
-    e.g. "Grade 7 Blue" -> 7, "Grade 6" -> 6.
-    Returns int grade if found, else None.
-    """
-    if not class_name:
-        return None
-    parts = class_name.split()
-    for p in parts:
-        try:
-            v = int(p)
-            return v
-        except Exception:
-            # remove non-digit suffixes like "7A"
-            digits = ''.join(ch for ch in p if ch.isdigit())
-            if digits:
-                try:
-                    return int(digits)
-                except Exception:
-                    continue
-    return None
-
 def find_subject_for_student(subject_name, class_grade):
     """
     Find a Subject object based on subject_name and class_grade.
-    - If class_grade < 7 -> prefer subjects whose Subject.level indicates 'primary' or 'lower'
-    - If class_grade >=7 -> prefer subjects whose Subject.level indicates 'secondary' or 'upper'
-    - If Subject.level is not set or no match, fall back to matching by name only.
+    Names, acronyms ("CRE"), abbreviations ("Int. Science") and near-misses are
+    resolved in memory by subject_resolver, preferring the class's CBC level.
     """
-    name_norm = subject_name.strip().lower()
-
-    # First, exact name match (case‑insensitive)
-    sub = Subject.query.filter(Subject.name.ilike(subject_name)).first()
-    if sub:
-        return sub
-
-    # Then try level-based search if class_grade known
-    if class_grade is not None:
-        try:
-            if class_grade < 7:
-                sub = Subject.query.filter(Subject.level.ilike("%primary%")).filter(
-                    Subject.name.ilike(f"%{name_norm}%")).first()
-            else:
-                sub = Subject.query.filter(Subject.level.ilike("%secondary%")).filter(
-                    Subject.name.ilike(f"%{name_norm}%")).first()
-            if sub:
-                return sub
-        except Exception:
-            pass
-
-    # Fallback: loose name match
-    sub = Subject.query.filter(Subject.name.ilike(f"%{name_norm}%")).first()
-    return sub
+    subject_id = subject_resolver.resolve(subject_name, class_grade=class_grade)
+    return db.session.get(Subject, subject_id) if subject_id else None
 
 def derive_cbc_level(marks):
     """Return CBC achievement level for given marks (0-100)."""
-    for level, (low, high) in CBC_LEVELS.items():
-        if low <= marks <= high:
-            return level
-    return "Below Expectations"  # fallback
+    return rubric().level(marks)
 
 # ----------------- Row processors -----------------
 def process_parents(rows):
@@ -216,201 +161,10 @@ def process_grades(rows):
     Supports both:
     - Long format: headers = admission_number, subject_name, exam_type, marks, term, year
     - Wide format: headers = admission_number, term, year, exam_type, [subject1, subject2, ...]
+    Lookups are preloaded and grades inserted in one transaction (see grade_import).
     Returns dict: {"success": int, "errors": [str,...]}
     """
-    results = {"success": 0, "errors": []}
-    if not rows or len(rows) < 2:
-        results["errors"].append("Empty CSV or missing header/rows.")
-        return results
-
-    headers = normalise_headers(rows[0])
-    idx = {h: i for i, h in enumerate(headers)}
-
-    # ----- Long format check -----
-    long_required = ["admission_number", "subject_name", "exam_type", "marks", "term", "year"]
-    if all(h in headers for h in long_required):
-        # Process long format (existing logic, updated to use derive_cbc_level)
-        for i, row in enumerate(rows[1:], start=2):
-            try:
-                def val(h):
-                    return row[idx[h]].strip() if idx[h] < len(row) and row[idx[h]] is not None else ""
-
-                admission = val("admission_number")
-                subject_name = val("subject_name")
-                exam_type = val("exam_type")
-                marks_raw = val("marks")
-                term = val("term")
-                year_raw = val("year")
-
-                if not admission or not subject_name or not exam_type or not marks_raw or not term or not year_raw:
-                    raise ValueError("Missing required grade fields.")
-
-                if exam_type not in ["Exam 1", "Exam 2", "Exam 3", "Summative"]:
-                    raise ValueError(f"exam_type must be one of: Exam 1, Exam 2, Exam 3, Summative (got '{exam_type}').")
-
-                student = Student.query.filter_by(admission_number=admission).first()
-                if not student:
-                    raise ValueError(f"Student with admission number {admission} not found.")
-
-                class_grade = None
-                if student.current_class:
-                    class_grade = parse_class_grade_from_name(student.current_class.name)
-
-                subject = find_subject_for_student(subject_name, class_grade)
-                if not subject:
-                    raise ValueError(f"Subject '{subject_name}' not found for class '{student.current_class.name if student.current_class else '?'}'.")
-
-                try:
-                    marks = float(marks_raw)
-                except:
-                    raise ValueError("Marks must be a number.")
-                if not (0 <= marks <= 100):
-                    raise ValueError("Marks must be between 0 and 100.")
-
-                try:
-                    year = int(year_raw)
-                except:
-                    raise ValueError("Year must be an integer.")
-
-                existing = Grade.query.filter_by(
-                    student_id=student.id,
-                    subject_id=subject.id,
-                    exam_type=exam_type,
-                    term=term,
-                    year=year
-                ).first()
-                if existing:
-                    raise ValueError("A grade for this student, subject, exam_type, term, year already exists.")
-
-                cbc_level = derive_cbc_level(marks)
-
-                grade = Grade(
-                    student_id=student.id,
-                    subject_id=subject.id,
-                    exam_type=exam_type,
-                    term=term,
-                    year=year,
-                    marks=marks,
-                    percentage=marks,
-                    numeric_marks=marks,
-                    cbc_level=cbc_level
-                )
-                db.session.add(grade)
-                db.session.commit()
-                results["success"] += 1
-
-            except Exception as e:
-                db.session.rollback()
-                results["errors"].append(f"Row {i}: {e}")
-        return results
-
-    # ----- Wide format check -----
-    wide_required = ["admission_number", "term", "year", "exam_type"]
-    if all(h in headers for h in wide_required):
-        # Identify subject columns (everything except wide_required)
-        subject_cols = [h for h in headers if h not in wide_required]
-        if not subject_cols:
-            results["errors"].append("No subject columns found in wide format CSV.")
-            return results
-
-        for i, row in enumerate(rows[1:], start=2):
-            row_success = True  # flag to track if at least one grade inserted for this row
-            try:
-                def val(h):
-                    return row[idx[h]].strip() if idx[h] < len(row) and row[idx[h]] is not None else ""
-
-                admission = val("admission_number")
-                term = val("term")
-                year_raw = val("year")
-                exam_type = val("exam_type")
-
-                if not admission or not term or not year_raw or not exam_type:
-                    raise ValueError("Missing admission_number, term, year, or exam_type.")
-
-                if exam_type not in ["Exam 1", "Exam 2", "Exam 3", "Summative"]:
-                    raise ValueError(f"Invalid exam_type: {exam_type}")
-
-                try:
-                    year = int(year_raw)
-                except:
-                    raise ValueError("Year must be an integer.")
-
-                student = Student.query.filter_by(admission_number=admission).first()
-                if not student:
-                    raise ValueError(f"Student with admission number {admission} not found.")
-
-                class_grade = None
-                if student.current_class:
-                    class_grade = parse_class_grade_from_name(student.current_class.name)
-
-                # Process each subject column
-                for subject_name in subject_cols:
-                    marks_raw = val(subject_name)
-                    if marks_raw == "":
-                        continue  # skip empty cells
-
-                    subject = find_subject_for_student(subject_name, class_grade)
-                    if not subject:
-                        results["errors"].append(f"Row {i}, subject '{subject_name}': Subject not found.")
-                        row_success = False
-                        continue
-
-                    try:
-                        marks = float(marks_raw)
-                    except:
-                        results["errors"].append(f"Row {i}, subject '{subject_name}': Marks must be a number.")
-                        row_success = False
-                        continue
-
-                    if not (0 <= marks <= 100):
-                        results["errors"].append(f"Row {i}, subject '{subject_name}': Marks must be 0-100.")
-                        row_success = False
-                        continue
-
-                    # Check duplicate
-                    existing = Grade.query.filter_by(
-                        student_id=student.id,
-                        subject_id=subject.id,
-                        exam_type=exam_type,
-                        term=term,
-                        year=year
-                    ).first()
-                    if existing:
-                        results["errors"].append(f"Row {i}, subject '{subject_name}': Duplicate grade exists.")
-                        row_success = False
-                        continue
-
-                    cbc_level = derive_cbc_level(marks)
-
-                    grade = Grade(
-                        student_id=student.id,
-                        subject_id=subject.id,
-                        exam_type=exam_type,
-                        term=term,
-                        year=year,
-                        marks=marks,
-                        percentage=marks,
-                        numeric_marks=marks,
-                        cbc_level=cbc_level
-                    )
-                    db.session.add(grade)
-
-                # After processing all subjects, commit if at least one grade was added successfully
-                if row_success:
-                    db.session.commit()
-                    results["success"] += 1
-                else:
-                    db.session.rollback()
-
-            except Exception as e:
-                db.session.rollback()
-                results["errors"].append(f"Row {i}: {e}")
-
-        return results
-
-    # If neither format matched
-    results["errors"].append("CSV headers do not match long format (admission_number,subject_name,exam_type,marks,term,year) or wide format (admission_number,term,year,exam_type + subject columns).")
-    return results
+    return grade_import_engine.run(rows, normalise_headers, derive_cbc_level)
 
 # ----------------- Blueprint Route -----------------
 @bulk_bp.route("/", methods=["GET", "POST"])
@@ -1,8 +1,11 @@
 # bursary_bp.py
 from flask import Blueprint, render_template, request, redirect, url_for, flash
 from flask_login import login_required, current_user
-from models import Student, User, Bursary, Scholarship, FeeStatement
+from sqlalchemy import func
+from sqlalchemy.orm import joinedload
+from models import Student, User, Bursary, Scholarship, FeeStatement, FeeCredit
 from extensions import db
+from fee_credits import sponsorship_allocator
 from datetime import datetime
 
 bursary_bp = Blueprint("bursary_bp", __name__, url_prefix="/bursary")
@@ -15,9 +18,69 @@ def list_bursaries():
     if not current_user.is_finance() and not current_user.is_admin():
         return "Access Denied", 403
 
-    bursaries = Bursary.query.order_by(Bursary.id.desc()).all()
-    scholarships = Scholarship.query.order_by(Scholarship.id.desc()).all()
-    return render_template("bursary/list.html", bursaries=bursaries, scholarships=scholarships)
+    per_page = 25
+    bursaries = (
+        Bursary.query.options(joinedload(Bursary.student))
+        .order_by(Bursary.id.desc())
+        .paginate(page=request.args.get("bpage", 1, type=int), per_page=per_page, error_out=False)
+    )
+    scholarships = (
+        Scholarship.query.options(joinedload(Scholarship.student))
+        .order_by(Scholarship.id.desc())
+        .paginate(page=request.args.get("spage", 1, type=int), per_page=per_page, error_out=False)
+    )
+
+    totals = {
+        "bursaries": db.session.query(func.coalesce(func.sum(Bursary.amount), 0)).scalar(),
+        "scholarships": db.session.query(func.coalesce(func.sum(Scholarship.amount), 0)).scalar(),
+        "applied": db.session.query(func.coalesce(func.sum(FeeCredit.amount), 0)).scalar(),
+    }
+    return render_template(
+        "bursary/list.html",
+        bursaries=bursaries,
+        scholarships=scholarships,
+        totals=totals,
+        current_year=datetime.utcnow().year,
+    )
+
+
+# -------------------- Apply Awards to Fee Statements --------------------
+@bursary_bp.route("/allocate", methods=["POST"])
+@login_required
+def allocate_awards():
+    if not current_user.is_finance() and not current_user.is_admin():
+        return "Access Denied", 403
+
+    term = request.form.get("term")
+    year = request.form.get("year", type=int)
+    if not term or not year:
+        flash("Term and year are required to apply awards.", "warning")
+        return redirect(url_for("bursary_bp.list_bursaries"))
+
+    try:
+        result = sponsorship_allocator.allocate(
+            term,
+            year,
+            user_id=current_user.id,
+            dry_run=bool(request.form.get("dry_run")),
+        )
+    except Exception as e:
+        flash(f"Allocation failed: {e}", "danger")
+        return redirect(url_for("bursary_bp.list_bursaries"))
+
+    prefix = "Dry run: would apply" if result["dry_run"] else "Applied"
+    flash(
+        f"{prefix} KES {result['amount_applied']:,.2f} across {result['statements']} "
+        f"statement(s) from {result['awards']} award(s); "
+        f"KES {result['amount_unapplied']:,.2f} left unapplied"
+        + (
+            f"; KES {result['amount_reversed']:,.2f} returned from reduced awards."
+            if result["amount_reversed"]
+            else "."
+        ),
+        "info" if result["dry_run"] else "success",
+    )
+    return redirect(url_for("bursary_bp.list_bursaries"))
 
 
 # -------------------- Add Bursary --------------------
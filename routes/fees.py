@@ -8,11 +8,19 @@ from flask import (
     flash,
     jsonify,
     abort,
+    Response,
+    send_file,
+    stream_with_context,
+    current_app,
 )
 from flask_login import login_required, current_user
 from datetime import datetime, date
+import tempfile
+from sqlalchemy import func, or_
 from extensions import db
 from decorators import roles_required
+from fee_billing import fee_billing_service
+from fee_statement_pdfs import fee_statement_batch
 from models import FeeStatement, FeePayment, Student, Notification, User, Class
 from forms import (
     FeeStatementForm,
@@ -49,16 +57,8 @@ def _render_student_fees(student):
 
     # aggregate calculations
     total_due = sum(s.amount_due for s in statements)
-    # we assume FeeStatement has a property total_paid (or we sum payments)
-    # but to be safe we'll compute from FeeStatement.payments if available else FeePayment records
-    total_paid = 0.0
-    # try to use each statement.total_paid if present; otherwise sum FeePayment entries
-    statement_ids = [s.id for s in statements]
-    if hasattr(FeeStatement, "payments"):
-        total_paid = sum(getattr(s, "total_paid", 0.0) for s in statements)
-    else:
-        # fallback: sum FeePayment entries that are linked to student
-        total_paid = sum(p.amount_paid for p in payments)
+    # amount_paid is maintained on each statement by the fee ledger
+    total_paid = sum(s.amount_paid or 0.0 for s in statements)
 
     total_balance = total_due - total_paid
     overdue_count = sum(1 for s in statements if getattr(s, "is_overdue", False))
@@ -108,6 +108,47 @@ def _render_student_fees(student):
     )
 
 
+# -----------------------
+# Helper: Bulk-generate statements from a FeeStatementForm
+# -----------------------
+def _generate_statements_from_form(form):
+    """
+    Runs the set-based generator for the submitted class (0 = all classes).
+    Returns a redirect on success, or None to re-render the form (dry run / error).
+    """
+    due_date = form.due_date.data
+    if due_date:
+        due_date = datetime.combine(due_date, datetime.min.time())
+    try:
+        result = fee_billing_service.generate(
+            term=form.term.data,
+            year=int(form.year.data),
+            fee_type=form.fee_type.data,
+            amount_due=float(form.amount_due.data),
+            class_id=int(form.class_id.data) or None,
+            due_date=due_date,
+            dry_run=form.dry_run.data,
+        )
+    except Exception as e:
+        flash(f"Database error: {e}", "danger")
+        return None
+
+    if result["dry_run"]:
+        flash(
+            f"Preview: {result['created']} statement(s) would be created, "
+            f"{result['skipped']} student(s) already billed.",
+            "info",
+        )
+        return None
+
+    flash(
+        f"✅ Fee statements added for {result['created']} student(s) "
+        f"({result['skipped']} already billed).",
+        "success",
+    )
+    return redirect(url_for("fee_bp.admin_view_all_statements"))
+
+
 # -----------------------
 # Admin: Dashboard listing students and balances
 # GET /fees/admin
@@ -116,30 +157,68 @@ def _render_student_fees(student):
 @login_required
 @roles_required("admin", "finance")
 def admin_fees_dashboard():
-    
-    students = Student.query.order_by(Student.full_name).all()
-    student_fees = []
-    for s in students:
-        statements = FeeStatement.query.filter_by(student_id=s.id).all()
-        total_due = sum(st.amount_due for st in statements)
-        # use statement.total_paid if present else compute from FeePayment
-        if statements and hasattr(statements[0], "total_paid"):
-            total_paid = sum(getattr(st, "total_paid", 0.0) for st in statements)
-        else:
-            total_paid = sum(
-                p.amount_paid for p in FeePayment.query.filter_by(student_id=s.id).all()
+    page = request.args.get("page", 1, type=int)
+    per_page = request.args.get("per_page", 25, type=int)
+    class_id = request.args.get("class_id", type=int)
+    search = request.args.get("q", "").strip()
+    sort_option = request.args.get("sort", "balance")
+
+    total_due = func.coalesce(func.sum(FeeStatement.amount_due), 0)
+    total_paid = func.coalesce(func.sum(FeeStatement.amount_paid), 0)
+    balance = func.coalesce(func.sum(FeeStatement.balance), 0)
+
+    # One grouped query per page: due/paid/balance per student
+    query = (
+        db.session.query(
+            Student,
+            Class.name.label("class_name"),
+            total_due.label("total_due"),
+            total_paid.label("total_paid"),
+            balance.label("balance"),
+        )
+        .outerjoin(Class, Student.current_class_id == Class.id)
+        .outerjoin(FeeStatement, FeeStatement.student_id == Student.id)
+        .group_by(Student.id, Class.name)
+    )
+    if class_id:
+        query = query.filter(Student.current_class_id == class_id)
+    if search:
+        query = query.filter(
+            or_(
+                Student.full_name.ilike(f"%{search}%"),
+                Student.admission_number.ilike(f"%{search}%"),
             )
-        balance = total_due - total_paid
-        student_fees.append(
-            {
-                "student": s,
-                "total_due": total_due,
-                "total_paid": total_paid,
-                "balance": balance,
-            }
         )
 
-    return render_template("admin_fees_dashboard.html", student_fees=student_fees)
+    if sort_option == "name":
+        query = query.order_by(Student.full_name.asc())
+    elif sort_option == "due":
+        query = query.order_by(total_due.desc(), Student.full_name.asc())
+    else:
+        sort_option = "balance"
+        query = query.order_by(balance.desc(), Student.full_name.asc())
+
+    pagination = query.paginate(page=page, per_page=min(per_page, 100), error_out=False)
+    student_fees = [
+        {
+            "student": row.Student,
+            "class_name": row.class_name,
+            "total_due": row.total_due,
+            "total_paid": row.total_paid,
+            "balance": row.balance,
+        }
+        for row in pagination.items
+    ]
+
+    return render_template(
+        "admin_fees_dashboard.html",
+        student_fees=student_fees,
+        pagination=pagination,
+        classes=Class.query.order_by(Class.name).all(),
+        class_id=class_id,
+        search=search,
+        sort_option=sort_option,
+    )
 
 
 # -----------------------
@@ -198,26 +277,9 @@ def admin_view_all_statements():
     ]
 
     if form.validate_on_submit():
-        selected_class = Class.query.get(form.class_id.data)
-        students = Student.query.filter_by(current_class=selected_class.name).all()
-        try:
-            for student in students:
-                new_statement = FeeStatement(
-                    student_id=student.id,
-                    term=form.term.data,
-                    year=form.year.data,
-                    fee_type=form.fee_type.data,
-                    amount_due=form.amount_due.data,
-                )
-                db.session.add(new_statement)
-            db.session.commit()
-            flash(
-                "✅ Fee statements generated for all students in the class!", "success"
-            )
-            return redirect(url_for("fee_bp.admin_view_all_statements"))
-        except Exception as e:
-            db.session.rollback()
-            flash(f"Database error: {e}", "danger")
+        response = _generate_statements_from_form(form)
+        if response:
+            return response
 
     return render_template(
         "fee_statement.html",
@@ -242,45 +304,9 @@ def admin_add_statements():
     form.class_id.choices = [(0, "All Classes")] + [(c.id, c.name) for c in classes]
 
     if form.validate_on_submit():
-        term = form.term.data
-        year = int(form.year.data)
-        fee_type = form.fee_type.data
-        amount_due = float(form.amount_due.data)
-        class_id = int(form.class_id.data)
-
-        # Get target students
-        if class_id == 0:
-            target_students = Student.query.all()
-        else:
-            target_students = Student.query.filter_by(current_class_id=class_id).all()
-
-        added_count = 0
-        for student in target_students:
-            # Skip if statement exists
-            existing = FeeStatement.query.filter_by(
-                student_id=student.id, term=term, year=year, fee_type=fee_type
-            ).first()
-            if existing:
-                continue
-
-            new_statement = FeeStatement(
-                student_id=student.id,
-                term=term,
-                year=year,
-                fee_type=fee_type,
-                amount_due=amount_due,
-            )
-            db.session.add(new_statement)
-            added_count += 1
-
-        try:
-            db.session.commit()
-            flash(f"✅ Fee statements added for {added_count} student(s).", "success")
-        except Exception as e:
-            db.session.rollback()
-            flash(f"Database error: {e}", "danger")
-
-        return redirect(url_for("fee_bp.admin_view_all_statements"))
+        response = _generate_statements_from_form(form)
+        if response:
+            return response
 
     return render_template(
         "Add_fee_statement.html",
@@ -290,6 +316,53 @@ def admin_add_statements():
     )
 
 
+# -----------------------
+# Admin: batch fee statements for a class / the school
+# GET /fees/admin/statements/batch?year=2026&class_id=3&format=zip|pdf
+# -----------------------
+@fee_bp.route("/admin/statements/batch", endpoint="admin_batch_statements")
+@login_required
+@roles_required("admin", "finance")
+def admin_batch_statements():
+    year = request.args.get("year", datetime.utcnow().year, type=int)
+    class_id = request.args.get("class_id", type=int)
+    output = request.args.get("format", "zip")
+
+    documents = fee_statement_batch.load(year, class_id=class_id)
+    if not documents:
+        flash("No students found for the selected class.", "warning")
+        return redirect(url_for("fee_bp.admin_fees_dashboard"))
+
+    scope = f"class_{class_id}" if class_id else "school"
+    logger = current_app.logger
+
+    def progress(done, total):
+        if done == total or done % 50 == 0:
+            logger.info("Fee statements %s/%s rendered (%s, %s)", done, total, scope, year)
+
+    if output == "pdf":
+        out = tempfile.SpooledTemporaryFile(max_size=10 * 1024 * 1024)
+        fee_statement_batch.write_merged(documents, out, on_progress=progress)
+        out.seek(0)
+        return send_file(
+            out,
+            mimetype="application/pdf",
+            as_attachment=True,
+            download_name=f"fee_statements_{scope}_{year}.pdf",
+        )
+
+    return Response(
+        stream_with_context(
+            fee_statement_batch.stream_zip(documents, on_progress=progress)
+        ),
+        mimetype="application/zip",
+        headers={
+            "Content-Disposition": f"attachment; filename=fee_statements_{scope}_{year}.zip",
+            "X-Statement-Count": str(len(documents)),
+        },
+    )
+
+
 # -----------------------
 # Admin: Add payment (manual admin entry)
 # POST /fees/admin/add-payment
@@ -445,6 +518,10 @@ def student_fees_data(student_id):
 @roles_required("admin")
 def make_payment():
     # find fee statement
+    if request.is_json:
+        fee_statement_id = (request.get_json() or {}).get("fee_statement_id")
+    else:
+        fee_statement_id = request.form.get("fee_statement_id", type=int)
     statement = FeeStatement.query.get_or_404(fee_statement_id)
 
     # permission checks:
@@ -480,13 +557,12 @@ def make_payment():
             url_for("fee_bp.manage_fees_for_student", student_id=statement.student_id)
         )
 
-    # Create payment record
+    # Create payment record; the fee ledger updates the statement totals on flush
     payment = FeePayment(
         student_id=statement.student_id,
-        fee_statement_id=fee_statement_id,
+        fee_statement_id=statement.id,
         amount_paid=amount,
         payment_method=method,
-        statement=statement,
         payment_date=datetime.utcnow(),
         note=note,
     )
@@ -511,21 +587,12 @@ def make_payment():
 
     # Return JSON for AJAX or redirect for form
     if request.is_json:
-        # recompute balance for this statement if you have property
-        stmt_balance = getattr(statement, "balance", None)
-        if stmt_balance is None:
-            # compute: amount_due - sum(payments)
-            related_payments = FeePayment.query.filter_by(
-                fee_statement_id=statement.id
-            ).all()
-            stmt_balance = statement.amount_due - sum(
-                p.amount_paid for p in related_payments
-            )
         return jsonify(
             {
                 "success": True,
                 "message": "Payment recorded",
-                "fee_balance": float(stmt_balance),
+                "fee_balance": float(statement.balance),
+                "status": statement.status,
             }
         )
     flash("Payment recorded", "success")
@@ -570,7 +637,8 @@ def admin_delete_payment(payment_id):
     if current_user.role != "admin":
         abort(403)
     p = FeePayment.query.get_or_404(payment_id)
+    student_id = p.student_id
     db.session.delete(p)
     db.session.commit()
     flash("Payment deleted.", "success")
-    return redirect(url_for("fee_bp.admin_view_student_fees", student_id=p.student_id))
+    return redirect(url_for("fee_bp.admin_view_student_fees", student_id=student_id))
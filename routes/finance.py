@@ -1,20 +1,18 @@
-from flask import Blueprint, render_template
-from flask import Blueprint, render_template
-from flask import Blueprint, render_template
+from flask import Blueprint, render_template, request, jsonify
 from flask_login import login_required, current_user
 from decorators import roles_required
 from models import (
     FeeStatement,
     FeePayment,
     Student,
-    User,
     StaffSalary,
     FinanceAuditLog,
     SalaryPaymentExecution,
     SalaryApprovalLog,
 )
 from forms import StaffSalaryForm
-from sqlalchemy import func
+from finance_kpis import finance_kpi_service
+from fee_forecast import fee_forecast_service
 from datetime import datetime
 from extensions import db
 
@@ -27,25 +25,15 @@ def finance_dashboard():
     if not current_user.is_finance() and not current_user.is_admin():
         return "Access Denied", 403
 
-    # KPI calculations
-    total_billed = sum(f.amount_due for f in FeeStatement.query.all())
-    total_collected = sum(p.amount_paid for p in FeePayment.query.all())
-    total_outstanding = total_billed - total_collected
+    kpis = finance_kpi_service.compute()
     pending_approvals = StaffSalary.query.filter_by(approved=False).count()
     total_students = Student.query.count()
 
-    # Outstanding statements
+    # Outstanding statements (largest balances first), 50 per page
     outstanding_statements = (
-        FeeStatement.query.outerjoin(FeePayment)
-        .group_by(FeeStatement.id)
-        .having(
-            (
-                FeeStatement.amount_due
-                - func.coalesce(func.sum(FeePayment.amount_paid), 0)
-            )
-            > 0
-        )
-        .all()
+        FeeStatement.query.filter(FeeStatement.balance > 0)
+        .order_by(FeeStatement.balance.desc(), FeeStatement.id)
+        .paginate(page=request.args.get("opage", 1, type=int), per_page=50, error_out=False)
     )
 
     # Recent payments
@@ -53,23 +41,13 @@ def finance_dashboard():
         FeePayment.query.order_by(FeePayment.payment_date.desc()).limit(10).all()
     )
 
-    # Overdue count
-    overdue_count = sum(
-        1
-        for fs in outstanding_statements
-        if fs.due_date and fs.due_date < datetime.utcnow()
-    )
-
     return render_template(
         "finance/dashboard.html",
-        total_billed=total_billed,
-        total_collected=total_collected,
-        total_outstanding=total_outstanding,
         pending_approvals=pending_approvals,
         total_students=total_students,
         outstanding_statements=outstanding_statements,
         recent_payments=recent_payments,
-        overdue_count=overdue_count,
+        **kpis,
     )
 
 
@@ -114,55 +92,19 @@ def budgeting_dashboard():
     # Annual and term totals
     current_year = datetime.utcnow().year
     current_term = "Term 1"  # can be dynamic
-    # Projected income = total billed
-    projected_income = sum(
-        f.amount_due for f in FeeStatement.query.filter_by(year=current_year).all()
-    )
-    actual_income = sum(
-        p.amount_paid
-        for p in FeePayment.query.join(FeeStatement)
-        .filter(FeeStatement.year == current_year)
-        .all()
-    )
-
-    # Total salaries paid this year
-    total_salary_budget = sum(
-        s.total_pay for s in StaffSalary.query.filter_by(year=current_year).all()
-    )
-    total_salary_paid = sum(
-        s.total_pay
-        for s in StaffSalary.query.filter_by(year=current_year, paid=True).all()
-    )
-
-    # Department-wise expenditure (use class or staff roles as proxy)
-    # Example: Academic Dept = teachers' salaries, Admin Dept = finance/admin salaries
-    academic_salaries = sum(
-        s.total_pay
-        for s in StaffSalary.query.join(
-            StaffSalary.staff
-        )  # explicitly join the 'staff' relationship
-        .filter(User.role == "teacher", StaffSalary.year == current_year)
-        .all()
-    )
-
-    # Admin/Finance salaries
-    admin_salaries = sum(
-        s.total_pay
-        for s in StaffSalary.query.join(
-            StaffSalary.staff
-        )  # still join the staff member
-        .filter(User.role.in_(["admin", "finance"]), StaffSalary.year == current_year)
-        .all()
-    )
+    kpis = finance_kpi_service.compute(year=current_year)
+    # Fixed seed keeps the scenario bands stable between page loads
+    forecast = fee_forecast_service.project(current_year, seed=current_year)
 
     return render_template(
         "finance/budgeting.html",
-        projected_income=projected_income,
-        actual_income=actual_income,
-        total_salary_budget=total_salary_budget,
-        total_salary_paid=total_salary_paid,
-        academic_salaries=academic_salaries,
-        admin_salaries=admin_salaries,
+        forecast=forecast,
+        projected_income=kpis["total_billed"],
+        actual_income=kpis["total_collected"],
+        total_salary_budget=kpis["total_salary_budget"],
+        total_salary_paid=kpis["total_salary_paid"],
+        academic_salaries=kpis["academic_salaries"],
+        admin_salaries=kpis["admin_salaries"],
         current_year=current_year,
         current_term=current_term,
     )
@@ -174,61 +116,14 @@ def budgeting_dashboard():
 def financial_report():
     current_year = datetime.utcnow().year
 
-    # Total fees billed and collected
-    total_billed = sum(
-        f.amount_due for f in FeeStatement.query.filter_by(year=current_year).all()
-    )
-    total_collected = sum(
-        p.amount_paid
-        for p in FeePayment.query.join(FeeStatement)
-        .filter(FeeStatement.year == current_year)
-        .all()
-    )
-    total_outstanding = total_billed - total_collected
-
-    # Overdue feesfrom sqlalchemy import func, select
-
-    # Subquery to calculate total paid per fee statement
-    subquery = (
-        db.session.query(
-            FeeStatement.id.label("fs_id"),
-            FeeStatement.amount_due,
-            FeeStatement.due_date,
-            func.coalesce(func.sum(FeePayment.amount_paid), 0).label("total_paid"),
-        )
-        .outerjoin(FeePayment, FeeStatement.id == FeePayment.fee_statement_id)
-        .group_by(FeeStatement.id)
-        .subquery()
-    )
+    kpis = finance_kpi_service.compute(year=current_year)
 
-    # Main query: only overdue balances
+    # Overdue balances for the year, largest first
     overdue_fees = (
-        db.session.query(subquery)
-        .filter(subquery.c.due_date < datetime.utcnow())
-        .filter(subquery.c.amount_due > subquery.c.total_paid)
-        .all()
-    )
-
-    # Salaries
-    total_salary_budget = sum(
-        s.total_pay for s in StaffSalary.query.filter_by(year=current_year).all()
-    )
-    total_salary_paid = sum(
-        s.total_pay
-        for s in StaffSalary.query.filter_by(year=current_year, paid=True).all()
-    )
-
-    # Department-wise salary
-    academic_salaries = sum(
-        s.total_pay
-        for s in StaffSalary.query.join(StaffSalary.staff)
-        .filter(User.role == "teacher", StaffSalary.year == current_year)
-        .all()
-    )
-    admin_salaries = sum(
-        s.total_pay
-        for s in StaffSalary.query.join(StaffSalary.staff)
-        .filter(User.role.in_(["admin", "finance"]), StaffSalary.year == current_year)
+        FeeStatement.query.filter(
+            FeeStatement.year == current_year, FeeStatement.is_overdue
+        )
+        .order_by(FeeStatement.balance.desc())
         .all()
     )
 
@@ -236,14 +131,34 @@ def financial_report():
 
     return render_template(
         "finance/financial_report.html",
-        total_billed=total_billed,
-        total_collected=total_collected,
-        total_outstanding=total_outstanding,
         overdue_fees=overdue_fees,
-        total_salary_budget=total_salary_budget,
-        total_salary_paid=total_salary_paid,
-        academic_salaries=academic_salaries,
-        admin_salaries=admin_salaries,
         total_students=total_students,
         current_year=current_year,
+        **kpis,
     )
+
+
+@finance_bp.route("/forecast")
+@login_required
+def collection_forecast():
+    if not current_user.is_finance() and not current_user.is_admin():
+        return "Access Denied", 403
+
+    year = request.args.get("year", datetime.utcnow().year, type=int)
+    simulations = min(request.args.get("simulations", 2000, type=int), 20000)
+    return jsonify(
+        fee_forecast_service.project(
+            year, simulations=max(simulations, 100), seed=request.args.get("seed", type=int)
+        )
+    )
+
+
+@finance_bp.route("/kpi-history")
+@login_required
+def kpi_history():
+    if not current_user.is_finance() and not current_user.is_admin():
+        return "Access Denied", 403
+
+    days = request.args.get("days", 90, type=int)
+    snapshots = finance_kpi_service.history(days=min(days, 730))
+    return jsonify([s.to_dict() for s in snapshots])
@@ -1,11 +1,17 @@
 # routes/grades.py
 import logging
 from datetime import datetime
-from flask import Blueprint, render_template, flash, request, redirect, url_for, abort
+import json
+from flask import Blueprint, render_template, flash, request, redirect, url_for, abort, jsonify
 from flask_login import login_required, current_user
-from extensions import db
 from decorators import roles_required
 from models import Grade, Student, Subject, Class
+from gradebook_stats import gradebook_stats, LEVELS, LEVEL_KEYS
+from results import results_engine, DEFAULT_EXAM
+from rubric import rubric
+from utils import rubric_color
+from grade_entry import grade_entry_service
+from grade_import import EXAM_TYPES
 from forms import GradeForm, SubjectForm, StudentForm, ClassForm
 from sqlalchemy.exc import SQLAlchemyError
 from wtforms.validators import DataRequired, Email, Length, NumberRange, Optional
@@ -78,44 +84,24 @@ def manage_grades():
     for s in students:
         class_students[s.current_class_id].append(s)
 
-    # Compute achievement level counts (based on all grades in the filtered set)
-    # Compute counts for achievement levels (short keys)
-    counts = {
-    "exceeding": 0,
-    "meeting": 0,
-    "approaching": 0,
-    "below": 0
-}
-    for g in grades:
-      if g.cbc_level == "Exceeding Expectations":
-        counts["exceeding"] += 1
-      elif g.cbc_level == "Meeting Expectations":
-        counts["meeting"] += 1
-      elif g.cbc_level == "Approaching Expectations":
-        counts["approaching"] += 1
-      else:
-        counts["below"] += 1
-
-    level_counts = {
-        "Exceeding Expectations": 0,
-        "Meeting Expectations": 0,
-        "Approaching Expectations": 0,
-        "Below Expectations": 0
-    }
-    for g in grades:
-        level_counts[g.cbc_level] += 1   # assuming Grade model has cbc_level field
-
-    # Compute average score per subject for the bar chart (across all grades, not just filtered)
-    # If you want the chart to reflect only the filtered term, adjust accordingly.
-    subject_avgs = {}
-    all_subjects = Subject.query.all()
-    for subj in all_subjects:
-        subj_grades = Grade.query.filter_by(subject_id=subj.id).all()
-        if subj_grades:
-            avg = sum(g.marks for g in subj_grades) / len(subj_grades)
-        else:
-            avg = 0
-        subject_avgs[subj.id] = round(avg, 1)
+    # Level counts and per-subject averages come from one grouped, cached
+    # query for the class/term filter; a name search narrows the counts to
+    # the grades already loaded above.
+    stats = gradebook_stats.stats(class_name=selected_class or None, term=selected_term or None)
+    counts = {key: 0 for key, _name in LEVELS}
+    if search:
+        for g in grades:
+            level = rubric().level(g.marks, default=g.cbc_level)
+            counts[LEVEL_KEYS.get(level, "below")] += 1
+    else:
+        subject_id = next((s.id for s in subjects if s.name == selected_subject), None)
+        if subject_id in stats["subjects"]:
+            counts.update(stats["subjects"][subject_id]["levels"])
+    level_counts = {name: counts[key] for key, name in LEVELS}
+
+    subject_avgs = gradebook_stats.subject_averages(
+        [s.id for s in subjects], class_name=selected_class or None, term=selected_term or None
+    )
 
     # Placeholder for competencies and values (you'll need to implement these models)
     competencies = defaultdict(list)   # e.g., {student_id: [{'name':'Communication','level':'Exceeding','evidence':'...'}]}
@@ -156,43 +142,6 @@ def student_grades_data(student_id):
     )
 
 
-def numeric_to_cbc(mark):
-    mark = float(mark)
-    if mark >= 63:
-        return "EE1"
-    elif mark >= 54:
-        return "EE2"
-    elif mark >= 45:
-        return "ME1"
-    elif mark >= 36:
-        return "ME2"
-    elif mark >= 27:
-        return "AA1"
-    elif mark >= 18:
-        return "AA2"
-    elif mark >= 9:
-        return "BE1"
-    else:
-        return "BE2"
-
-
-def rubric_color(rubric):
-    colors = {
-        "EE1": "green",
-        "EE2": "limegreen",
-        "ME1": "yellowgreen",
-        "ME2": "yellow",
-        "AE1": "orange",
-        "AE2": "darkorange",
-        "BE1": "red",
-        "BE2": "darkred",
-    }
-    return colors.get(rubric, "black")
-
-
-from utils import numeric_to_cbc, rubric_color
-
-
 @grade_bp.route("/add", methods=["GET", "POST"])
 @login_required
 @roles_required("admin")
@@ -210,73 +159,64 @@ def add_grade():
     if class_id:
         selected_class = Class.query.get(class_id)
 
-    # --- Subjects taught by this teacher in the selected class ---
+    # --- Subjects of the selected class ---
     subjects = []
     if selected_class:
-        subjects = Subject.query.filter_by(
-            teacher_id=user.id, class_id=selected_class.id
-        ).all()
+        subjects = Subject.query.filter_by(class_id=selected_class.id).all()
 
     # --- Students in the selected class ---
     students = []
     if selected_class:
         students = Student.query.filter_by(current_class_id=selected_class.id).all()
 
-    # --- Existing grades ---
-    existing_grades = {}
-    if students:
-        for student in students:
-            # Fetch grades for this student, teacher, and class
-            grade = Grade.query.filter_by(
-                student_id=student.id,
-                teacher_id=current_user.id,
-                class_id=selected_class.id,
-            ).first()
-            if grade:
-                existing_grades[student.id] = grade
-
-    # --- Handle form submission ---
-    if request.method == "POST" and selected_class:
-        subject_id = int(request.form.get("subject_id"))
-        term = request.form.get("term")
-        year = int(request.form.get("year", datetime.now().year))
+    subject_id = request.values.get("subject_id", type=int)
+    term = request.values.get("term")
+    year = request.values.get("year", datetime.now().year, type=int)
+    exam_type = request.values.get("exam_type") or "Summative"
 
+    # --- Existing grades for the chosen sheet, in one query ---
+    existing_grades = {}
+    if students and subject_id and term:
+        for grade in Grade.query.filter(
+            Grade.student_id.in_([s.id for s in students]),
+            Grade.subject_id == subject_id,
+            Grade.exam_type == exam_type,
+            Grade.term == term,
+            Grade.year == year,
+        ):
+            existing_grades[grade.student_id] = grade
+
+    # --- Handle form submission: one upsert for the whole sheet ---
+    if request.method == "POST" and selected_class and subject_id:
+        if not term or not year:
+            flash("Term and year are required.", "warning")
+            return redirect(
+                url_for("grade_bp.add_grade", class_id=selected_class.id, subject_id=subject_id)
+            )
+        rows = []
         for student in students:
             mark_input = request.form.get(f"mark_{student.id}")
             if mark_input:
                 try:
-                    mark = float(mark_input)
-                    rubrics = numeric_to_cbc(mark)
-                    # Check if grade exists
-                    grade = Grade.query.filter_by(
-                        student_id=student.id,
-                        teacher_id=current_user.id,
-                        class_id=selected_class.id,
-                        subject_id=subject_id,
-                        term=term,
-                        year=year,
-                    ).first()
-                    if grade:
-                        grade.marks = mark
-                        grade.rubrics = rubrics
-                    else:
-                        grade = Grade(
-                            student_id=student.id,
-                            teacher_id=current_user.id,
-                            class_id=selected_class.id,
-                            subject_id=subject_id,
-                            year=year,
-                            term=term,
-                            marks=mark,
-                            rubrics=rubrics,
-                            created_at=datetime.utcnow(),
+                    rows.append(
+                        grade_entry_service.row(
+                            student.id, subject_id, mark_input, term, year, exam_type
                         )
-                        db.session.add(grade)
+                    )
                 except ValueError:
                     flash(f"Invalid mark for {student.full_name}", "warning")
-        db.session.commit()
+        grade_entry_service.upsert(rows)
         flash("Grades submitted successfully!", "success")
-        return redirect(url_for("grade_bp.add_grade", class_id=selected_class.id))
+        return redirect(
+            url_for(
+                "grade_bp.add_grade",
+                class_id=selected_class.id,
+                subject_id=subject_id,
+                term=term,
+                year=year,
+                exam_type=exam_type,
+            )
+        )
 
     return render_template(
         "grades/add_grade.html",
@@ -285,7 +225,71 @@ def add_grade():
         selected_class=selected_class,
         students=students,
         terms=["Term 1", "Term 2", "Term 3"],
-        year=datetime.now().year,
+        exam_types=EXAM_TYPES,
+        year=year,
+        selected_subject_id=subject_id,
+        selected_term=term,
+        selected_exam_type=exam_type,
         existing_grades=existing_grades,
         rubric_color=rubric_color,
+        rubric_bands=[band._asdict() for band in reversed(rubric().bands)],
     )
+
+
+@grade_bp.route("/results/<int:class_id>")
+@login_required
+@roles_required("admin", "teacher")
+def class_results(class_id):
+    """Ranked results for a class; ?refresh=1 recomputes the whole level first."""
+    term = request.args.get("term", "Term 1")
+    year = request.args.get("year", datetime.utcnow().year, type=int)
+    exam_type = request.args.get("exam_type", DEFAULT_EXAM)
+
+    snapshot = None
+    if not request.args.get("refresh"):
+        snapshot = results_engine.snapshot(class_id, term, year, exam_type)
+    if snapshot is None:
+        snapshot = results_engine.rank_class(class_id, term, year, exam_type)
+    if snapshot is None:
+        abort(404)
+
+    return jsonify(
+        {
+            "class_id": snapshot.class_id,
+            "term": snapshot.term,
+            "year": snapshot.year,
+            "exam_type": snapshot.exam_type,
+            "computed_at": snapshot.computed_at.isoformat() if snapshot.computed_at else None,
+            "student_count": snapshot.student_count,
+            "class_mean": snapshot.class_mean,
+            "mean_grade": snapshot.mean_grade,
+            "subject_means": json.loads(snapshot.subject_means or "{}"),
+            "students": [
+                {
+                    "student_id": e.student_id,
+                    "name": e.student.full_name if e.student else None,
+                    "total": e.total,
+                    "mean": e.mean,
+                    "mean_grade": e.mean_grade,
+                    "position": e.position,
+                    "dense_position": e.dense_position,
+                    "level_position": e.level_position,
+                    "subjects_taken": e.subjects_taken,
+                    "previous_mean": e.previous_mean,
+                    "deviation": e.deviation,
+                    "subjects": json.loads(e.subject_scores or "{}"),
+                }
+                for e in snapshot.entries
+            ],
+        }
+    )
+
+
+@grade_bp.route("/subject-matrix")
+@login_required
+@roles_required("admin", "teacher")
+def subject_matrix():
+    """Subject x class average heat map for a term (Chart.js matrix data)."""
+    term = request.args.get("term", "Term 1")
+    year = request.args.get("year", datetime.utcnow().year, type=int)
+    return jsonify(gradebook_stats.heatmap(term, year))
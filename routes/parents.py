@@ -2,6 +2,7 @@ from flask import Blueprint, render_template, redirect, url_for, flash, abort
 from flask_login import login_required, current_user
 from sqlalchemy import func
 from extensions import db
+from term_summaries import term_summary_service
 from models import (
     Student,
     Grade,
@@ -77,21 +78,18 @@ def parent_dashboard():
         .all()
     )
 
-    # prepare small performance summary per child (average percentage)
+    # performance summary per child: latest term summary row (one query)
+    latest = term_summary_service.latest(child_ids)
     performance_summary = {}
     for c in children:
-        grades_for_child = [g for g in recent_grades if g.student_id == c.id]
-        if grades_for_child:
-            # compute average of available percentages (skip None)
-            vals = [
-                (g.percentage or 0)
-                for g in grades_for_child
-                if g.percentage is not None
-            ]
-            avg = sum(vals) / len(vals) if vals else None
-        else:
-            avg = None
-        performance_summary[c.id] = {"avg": avg, "count": len(grades_for_child)}
+        summary = latest.get(c.id)
+        performance_summary[c.id] = {
+            "avg": summary.mean if summary else None,
+            "count": summary.grade_count if summary else 0,
+            "rubric": summary.rubric if summary else None,
+            "rank": summary.rank if summary else None,
+            "term": f"{summary.term} {summary.year}" if summary else None,
+        }
 
     return render_template(
         "parent_dashboard.html",
@@ -7,13 +7,18 @@ from flask import (
     flash,
     redirect,
     url_for,
+    Response,
+    stream_with_context,
+    current_app,
 )
 from flask_login import login_required, current_user
 import csv
 import io
+import tempfile
 from fpdf import FPDF  # pip install fpdf2
 from datetime import datetime
 from decorators import roles_required
+from report_card_pdfs import report_card_batch, load_render_context
 
 reports_bp = Blueprint("reports_bp", __name__, url_prefix="/reports")
 
@@ -285,3 +290,53 @@ def finance_reports():
             )
 
     return render_template("finance/reports.html", report_type=report_type)
+
+
+# ----------------------------------------------------
+# Batch report cards for a class / the school
+# GET /reports/report-cards/batch?term=Term 1&year=2026&class_id=3&format=zip|pdf
+# ----------------------------------------------------
+@reports_bp.route("/report-cards/batch")
+@login_required
+@roles_required("admin", "teacher")
+def batch_report_cards():
+    term = request.args.get("term", "Term 1")
+    year = request.args.get("year", datetime.utcnow().year, type=int)
+    class_id = request.args.get("class_id", type=int)
+    output = request.args.get("format", "zip")
+
+    cards = report_card_batch.load(term, year, class_id=class_id)
+    if not cards:
+        flash("No students found for the selected class.", "warning")
+        return redirect(url_for("reports_bp.generate_reports"))
+
+    context = load_render_context()
+    scope = f"class_{class_id}" if class_id else "school"
+    label = f"{term.replace(' ', '')}_{year}"
+    logger = current_app.logger
+
+    def progress(done, total):
+        if done == total or done % 100 == 0:
+            logger.info("Report cards %s/%s rendered (%s, %s)", done, total, scope, label)
+
+    if output == "pdf":
+        out = tempfile.SpooledTemporaryFile(max_size=10 * 1024 * 1024)
+        report_card_batch.write_merged(cards, out, context=context, on_progress=progress)
+        out.seek(0)
+        return send_file(
+            out,
+            mimetype="application/pdf",
+            as_attachment=True,
+            download_name=f"report_cards_{scope}_{label}.pdf",
+        )
+
+    return Response(
+        stream_with_context(
+            report_card_batch.stream_zip(cards, context=context, on_progress=progress)
+        ),
+        mimetype="application/zip",
+        headers={
+            "Content-Disposition": f"attachment; filename=report_cards_{scope}_{label}.zip",
+            "X-Report-Card-Count": str(len(cards)),
+        },
+    )
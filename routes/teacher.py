@@ -13,6 +13,7 @@ from flask_login import login_required, current_user
 from sqlalchemy import func
 from sqlalchemy.orm import joinedload
 from extensions import db
+from grade_entry import grade_entry_service
 from models import (
     Teacher,
     Student,
@@ -282,26 +283,29 @@ def enter_grades(class_id, subject_id):
 
     if request.method == "POST":
         term = request.form.get("term")
-        year = request.form.get("year", datetime.now().year)
+        year = request.form.get("year", type=int)
+        exam_type = request.form.get("exam_type") or "Summative"
+        if not term or not year:
+            flash("Term and year are required.", "warning")
+            return redirect(
+                url_for("teacher_bp.enter_grades", class_id=class_id, subject_id=subject_id)
+            )
 
+        # One upsert for the whole sheet; resubmitting updates the same rows
+        rows = []
         for student in students:
             mark = request.form.get(f"mark_{student.id}")
             if mark:
-                mark = float(mark)
-
-                grade = Grade(
-                    student_id=student.id,
-                    teacher_id=current_user.id,
-                    class_id=class_id,
-                    subject_id=subject_id,
-                    year=year,
-                    term=term,
-                    marks=mark,
-                    created_at=datetime.utcnow(),
-                )
-                db.session.add(grade)
+                try:
+                    rows.append(
+                        grade_entry_service.row(
+                            student.id, subject_id, mark, term, year, exam_type
+                        )
+                    )
+                except ValueError:
+                    flash(f"Invalid mark for {student.full_name}", "warning")
 
-        db.session.commit()
+        grade_entry_service.upsert(rows)
         flash("Marks submitted successfully!", "success")
         return redirect(url_for("teacher_bp.teacher_dashboard"))
 
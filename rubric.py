@@ -0,0 +1,92 @@
+# rubric.py
+# The CBC rubric as one table of bands. Every conversion from marks to a
+# rubric code (EE1 ... BE2), achievement level or points goes through it:
+# bisect for single marks, NumPy searchsorted for arrays and a generated SQL
+# CASE so distributions can be grouped inside the database.
+# Schools can replace the bands with CBC_RUBRIC in the app config.
+from bisect import bisect_right
+from collections import namedtuple
+import numpy as np
+from flask import current_app, has_app_context
+from sqlalchemy import case, null
+
+Band = namedtuple("Band", "minimum code level points color")
+Band.__new__.__defaults__ = ("black",)
+
+# KNEC 8-level scale (marks out of 100), highest band first
+DEFAULT_BANDS = (
+    Band(90, "EE1", "Exceeding Expectations", 8, "green"),
+    Band(75, "EE2", "Exceeding Expectations", 7, "limegreen"),
+    Band(58, "ME1", "Meeting Expectations", 6, "yellowgreen"),
+    Band(41, "ME2", "Meeting Expectations", 5, "yellow"),
+    Band(31, "AE1", "Approaching Expectations", 4, "orange"),
+    Band(21, "AE2", "Approaching Expectations", 3, "darkorange"),
+    Band(11, "BE1", "Below Expectations", 2, "red"),
+    Band(0, "BE2", "Below Expectations", 1, "darkred"),
+)
+
+
+class Rubric:
+    def __init__(self, bands=DEFAULT_BANDS):
+        self.bands = sorted((Band(*b) for b in bands), key=lambda b: b.minimum)
+        self.minimums = [b.minimum for b in self.bands]
+        self.by_code = {b.code: b for b in self.bands}
+        # Achievement levels, highest first
+        self.levels = list(dict.fromkeys(b.level for b in reversed(self.bands)))
+        self._columns = {
+            field: np.array([getattr(b, field) for b in self.bands], dtype=object)
+            for field in Band._fields
+        }
+
+    def band(self, mark):
+        """Band for one mark; None for missing or non-numeric marks."""
+        try:
+            mark = float(mark)
+        except (TypeError, ValueError):
+            return None
+        if mark != mark:  # NaN
+            return None
+        return self.bands[max(bisect_right(self.minimums, mark) - 1, 0)]
+
+    def code(self, mark, default=None):
+        band = self.band(mark)
+        return band.code if band else default
+
+    def level(self, mark, default=None):
+        band = self.band(mark)
+        return band.level if band else default
+
+    def points(self, mark, default=None):
+        band = self.band(mark)
+        return band.points if band else default
+
+    def color(self, code):
+        band = self.by_code.get(code)
+        return band.color if band else "black"
+
+    def lookup(self, marks, field="code"):
+        """Vectorized ``field`` for an array of marks; None where a mark is NaN."""
+        marks = np.asarray(marks, dtype=float)
+        idx = np.clip(np.searchsorted(self.minimums, marks, side="right") - 1, 0, None)
+        out = self._columns[field][idx]
+        out[np.isnan(marks)] = None
+        return out
+
+    def case(self, column, field="code"):
+        """SQL CASE mapping a marks column to ``field``; NULL marks give NULL."""
+        highest_first = list(reversed(self.bands))
+        whens = [(column.is_(None), null())]
+        whens += [(column >= b.minimum, getattr(b, field)) for b in highest_first[:-1]]
+        return case(*whens, else_=getattr(highest_first[-1], field))
+
+
+_rubrics = {}
+
+
+def rubric():
+    """The active rubric: CBC_RUBRIC from the app config, else DEFAULT_BANDS."""
+    bands = current_app.config.get("CBC_RUBRIC") if has_app_context() else None
+    key = tuple(tuple(b) for b in bands) if bands else DEFAULT_BANDS
+    if key not in _rubrics:
+        _rubrics[key] = Rubric(key)
+    return _rubrics[key]
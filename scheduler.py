@@ -25,6 +25,16 @@ def init_scheduler(app):
         replace_existing=True
     )
     
+    # Nightly finance KPI snapshot for the historical charts
+    scheduler.add_job(
+        func=snapshot_finance_kpis,
+        args=[app],
+        trigger=CronTrigger(hour=23, minute=55),
+        id='finance_kpi_snapshot',
+        name='Snapshot finance KPIs',
+        replace_existing=True
+    )
+    
     scheduler.start()
     
     # Shut down the scheduler when exiting the app
@@ -34,3 +44,10 @@ def send_weekly_grade_summary():
     """Send weekly grade summary to all parents"""
     # Implementation for weekly summaries
     pass
+
+def snapshot_finance_kpis(app):
+    """Persist today's finance KPI snapshot"""
+    from finance_kpis import finance_kpi_service
+
+    with app.app_context():
+        finance_kpi_service.take_snapshot()
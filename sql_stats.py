@@ -0,0 +1,136 @@
+# sql_stats.py
+# Statistical aggregates that work on every engine the app runs on.
+# PostgreSQL has stddev/variance/percentile_cont natively; SQLite has none of
+# them, so the same names are registered on each SQLite connection as Python
+# aggregates (Welford's streaming update for variance, a sorted group for
+# percentiles). Queries build the expressions through sql_stats and stay
+# database-side on both engines.
+import math
+import sqlite3
+from sqlalchemy import event, func
+from extensions import db
+
+
+class _Welford:
+    """Running mean and sum of squared deviations in one pass."""
+
+    ddof = 1
+
+    def __init__(self):
+        self.n = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def step(self, value):
+        if value is None:
+            return
+        value = float(value)
+        self.n += 1
+        delta = value - self.mean
+        self.mean += delta / self.n
+        self.m2 += delta * (value - self.mean)
+
+    def variance(self):
+        return self.m2 / (self.n - self.ddof) if self.n > self.ddof else None
+
+    def finalize(self):
+        return self.variance()
+
+
+class _VarPop(_Welford):
+    ddof = 0
+
+
+class _StddevSamp(_Welford):
+    def finalize(self):
+        variance = self.variance()
+        return math.sqrt(variance) if variance is not None else None
+
+
+class _StddevPop(_StddevSamp):
+    ddof = 0
+
+
+class _PercentileCont:
+    """percentile_cont(value, fraction): linear interpolation between ranks."""
+
+    def __init__(self):
+        self.values = []
+        self.fraction = None
+
+    def step(self, value, fraction):
+        if value is None:
+            return
+        fraction = float(fraction)
+        if not 0 <= fraction <= 1:
+            raise ValueError("percentile fraction must be between 0 and 1")
+        self.values.append(float(value))
+        self.fraction = fraction
+
+    def finalize(self):
+        if not self.values:
+            return None
+        values = sorted(self.values)
+        position = (len(values) - 1) * self.fraction
+        low = math.floor(position)
+        high = min(low + 1, len(values) - 1)
+        return values[low] + (values[high] - values[low]) * (position - low)
+
+
+class _Median(_PercentileCont):
+    def step(self, value):
+        super().step(value, 0.5)
+
+
+# name -> (argument count, aggregate class), mirroring PostgreSQL's names
+SQLITE_AGGREGATES = {
+    "stddev": (1, _StddevSamp),
+    "stddev_samp": (1, _StddevSamp),
+    "stddev_pop": (1, _StddevPop),
+    "variance": (1, _Welford),
+    "var_samp": (1, _Welford),
+    "var_pop": (1, _VarPop),
+    "median": (1, _Median),
+    "percentile_cont": (2, _PercentileCont),
+}
+
+
+def _register_sqlite_aggregates(dbapi_connection, connection_record):
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    for name, (n_args, aggregate) in SQLITE_AGGREGATES.items():
+        dbapi_connection.create_aggregate(name, n_args, aggregate)
+
+
+class SqlStats:
+    @staticmethod
+    def register(engine):
+        """Install the SQLite aggregates on every new connection of ``engine``."""
+        if engine.dialect.name == "sqlite" and not event.contains(
+            engine, "connect", _register_sqlite_aggregates
+        ):
+            event.listen(engine, "connect", _register_sqlite_aggregates)
+
+    @staticmethod
+    def stddev(column):
+        """Sample standard deviation."""
+        return func.stddev_samp(column)
+
+    @staticmethod
+    def variance(column):
+        """Sample variance."""
+        return func.var_samp(column)
+
+    @staticmethod
+    def percentile(column, fraction):
+        """Continuous percentile of ``column``; ``fraction`` from 0 to 1."""
+        if db.session.get_bind().dialect.name == "sqlite":
+            return func.percentile_cont(column, fraction)
+        return func.percentile_cont(fraction).within_group(column)
+
+    @staticmethod
+    def median(column):
+        return SqlStats.percentile(column, 0.5)
+
+
+sql_stats = SqlStats()
@@ -0,0 +1,212 @@
+# subject_resolver.py
+# In-memory subject resolution for imports and mark entry.
+# Subjects (plus the CBC catalogue in subjects_cbc.json) are loaded once into
+# dictionaries keyed by normalized aliases and token-prefix signatures, so a
+# header like "Int. Science" or "Maths" resolves with dict lookups. The index
+# is dropped whenever a Subject row changes and otherwise refreshed on a TTL.
+import difflib
+import json
+import os
+import re
+import time
+from collections import defaultdict, namedtuple
+from flask import current_app, has_app_context
+from sqlalchemy import event
+from extensions import db
+from models import Subject
+
+CATALOGUE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "subjects_cbc.json")
+DEFAULT_TTL = 300  # seconds; override with SUBJECT_INDEX_TTL
+STOPWORDS = {"and", "of", "the", "in", "or", "a"}
+PREFIX_LEN = 3
+LEVEL_CODE_SUFFIXES = ("JS", "SS")
+
+SubjectMatch = namedtuple("SubjectMatch", "subject_id name level pathway method")
+
+
+def normalize(text):
+    """'Int. Science' -> 'int science'; '&' -> 'and'; punctuation to spaces."""
+    text = (text or "").lower().replace("&", " and ").replace("_", " ")
+    text = re.sub(r"[^\w\s]", " ", text)
+    return " ".join(text.split())
+
+
+def tokens(text):
+    return [t for t in normalize(text).split() if t not in STOPWORDS]
+
+
+def signature(text):
+    """Token-prefix key: 'Integrated Science' and 'Int. Sci' -> ('int', 'sci')."""
+    return tuple(t[:PREFIX_LEN] for t in tokens(text))
+
+
+def aliases_for(name, code=None):
+    """Every spelling a subject should answer to."""
+    found = {normalize(name)}
+    without_parens = re.sub(r"\(.*?\)", " ", name)
+    found.add(normalize(without_parens))
+    for acronym in re.findall(r"\(([^)]+)\)", name):
+        found.add(normalize(acronym))
+    for part in re.split(r"/| or ", without_parens):
+        found.add(normalize(part))
+    if code:
+        found.add(normalize(code))
+        for suffix in LEVEL_CODE_SUFFIXES:
+            if code.upper().endswith(suffix) and len(code) > len(suffix) + 1:
+                found.add(normalize(code[: -len(suffix)]))
+    return {a for a in found if a}
+
+
+def level_for_grade(class_grade):
+    if class_grade is None:
+        return None
+    if class_grade < 7:
+        return "primary"
+    if class_grade < 10:
+        return "junior secondary"
+    return "senior secondary"
+
+
+def load_catalogue(path=CATALOGUE_PATH):
+    """code -> {"name", "level", "pathway"} from subjects_cbc.json (empty if missing)."""
+    try:
+        with open(path) as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+    catalogue = {}
+    for level, entries in data.items():
+        if isinstance(entries, list):
+            groups = [(None, entries)]
+        else:
+            groups = [(None, entries.get("core", []))] + list(
+                entries.get("pathways", {}).items()
+            )
+        for pathway, items in groups:
+            for item in items:
+                catalogue[item["code"].upper()] = {
+                    "name": item["name"],
+                    "level": item.get("level", level),
+                    "pathway": pathway,
+                }
+    return catalogue
+
+
+class SubjectIndex:
+    def __init__(self, subjects, catalogue=None):
+        """``subjects``: [(id, name, code, level, pathway)] in id order."""
+        self.entries = {}
+        self.by_alias = defaultdict(list)
+        self.by_signature = defaultdict(list)
+        catalogue = catalogue or {}
+
+        for subject_id, name, code, level, pathway in subjects:
+            known = catalogue.get((code or "").upper(), {})
+            self.entries[subject_id] = (
+                name,
+                normalize(level or known.get("level")),
+                normalize(pathway or known.get("pathway")),
+            )
+            names = aliases_for(name, code)
+            if known:
+                names |= aliases_for(known["name"])
+            for alias in names:
+                self.by_alias[alias].append(subject_id)
+                self.by_signature[signature(alias)].append(subject_id)
+        self.alias_keys = list(self.by_alias)
+        self._memo = {}
+
+    @classmethod
+    def load(cls):
+        rows = db.session.query(
+            Subject.id, Subject.name, Subject.code, Subject.level, Subject.pathway
+        ).order_by(Subject.id)
+        return cls(rows.all(), load_catalogue())
+
+    def _best(self, candidates, level, pathway):
+        """Prefer the caller's level, then pathway, then the oldest subject."""
+        unique = list(dict.fromkeys(candidates))
+
+        def rank(subject_id):
+            _name, subject_level, subject_pathway = self.entries[subject_id]
+            return (
+                0 if level and subject_level == level else 1,
+                0 if level and level.split()[-1] in subject_level else 1,
+                0 if pathway and subject_pathway == pathway else 1,
+                subject_id,
+            )
+
+        return min(unique, key=rank)
+
+    def match(self, subject_name, level=None, pathway=None):
+        level, pathway = normalize(level), normalize(pathway)
+        key = (normalize(subject_name), level, pathway)
+        if key not in self._memo:
+            self._memo[key] = self._match(*key)
+        return self._memo[key]
+
+    def _match(self, name, level, pathway):
+        if not name:
+            return None
+        method, candidates = "alias", self.by_alias.get(name)
+        if not candidates:
+            method, candidates = "abbreviation", self.by_signature.get(signature(name))
+        if not candidates:
+            # Substring of a longer name, e.g. "environmental" -> "science and environmental activities"
+            method = "partial"
+            candidates = [
+                sid for alias in self.alias_keys if name in alias for sid in self.by_alias[alias]
+            ]
+        if not candidates:
+            method = "fuzzy"
+            close = difflib.get_close_matches(name, self.alias_keys, n=3, cutoff=0.82)
+            candidates = [sid for alias in close for sid in self.by_alias[alias]]
+        if not candidates:
+            return None
+
+        subject_id = self._best(candidates, level, pathway)
+        subject_name, subject_level, subject_pathway = self.entries[subject_id]
+        return SubjectMatch(subject_id, subject_name, subject_level, subject_pathway, method)
+
+
+class SubjectResolver:
+    def __init__(self):
+        self._index = None
+        self._loaded_at = 0.0
+
+    @staticmethod
+    def ttl():
+        if has_app_context():
+            return current_app.config.get("SUBJECT_INDEX_TTL", DEFAULT_TTL)
+        return DEFAULT_TTL
+
+    def index(self):
+        if self._index is None or time.monotonic() - self._loaded_at > self.ttl():
+            self._index = SubjectIndex.load()
+            self._loaded_at = time.monotonic()
+        return self._index
+
+    def invalidate(self):
+        self._index = None
+
+    def match(self, subject_name, level=None, pathway=None, class_grade=None):
+        """SubjectMatch for a free-text subject name, or None."""
+        return self.index().match(
+            subject_name, level or level_for_grade(class_grade), pathway
+        )
+
+    def resolve(self, subject_name, level=None, pathway=None, class_grade=None):
+        """Subject id for a free-text subject name, or None."""
+        found = self.match(subject_name, level, pathway, class_grade)
+        return found.subject_id if found else None
+
+
+subject_resolver = SubjectResolver()
+
+
+@event.listens_for(Subject, "after_insert")
+@event.listens_for(Subject, "after_update")
+@event.listens_for(Subject, "after_delete")
+def _invalidate_subject_index(mapper, connection, target):
+    subject_resolver.invalidate()
@@ -0,0 +1,83 @@
+# term_summaries.py
+# Reads and rebuilds of the student_term_summary table. The table is kept
+# current by the Grade flush hooks in models.py; pages that show a student's
+# standing read one row per student/term instead of averaging raw grades.
+from sqlalchemy import case, select, union
+from extensions import db
+from models import Grade, StudentTermSummary, refresh_student_term_summary
+
+TERM_ORDER = case(
+    (StudentTermSummary.term == "Term 3", 3),
+    (StudentTermSummary.term == "Term 2", 2),
+    else_=1,
+)
+
+
+class TermSummaryService:
+    @staticmethod
+    def get(student_id, term, year):
+        return StudentTermSummary.query.filter_by(
+            student_id=student_id, term=term, year=year
+        ).first()
+
+    @staticmethod
+    def latest(student_ids):
+        """student_id -> most recent summary, in one query."""
+        student_ids = list(student_ids)
+        if not student_ids:
+            return {}
+        rows = StudentTermSummary.query.filter(
+            StudentTermSummary.student_id.in_(student_ids)
+        ).order_by(StudentTermSummary.year, TERM_ORDER)
+        # Ascending order: the last row seen per student is the latest
+        return {row.student_id: row for row in rows}
+
+    @staticmethod
+    def history(student_id, year=None):
+        """Summaries for a student in term order, optionally for one year."""
+        query = StudentTermSummary.query.filter_by(student_id=student_id)
+        if year:
+            query = query.filter_by(year=year)
+        return query.order_by(StudentTermSummary.year, TERM_ORDER).all()
+
+    @staticmethod
+    def latest_term(year=None):
+        """(term, year) of the most recent summarised term (in ``year`` if given), or None."""
+        query = db.session.query(StudentTermSummary.term, StudentTermSummary.year)
+        if year is not None:
+            query = query.filter(StudentTermSummary.year == year)
+        row = query.order_by(StudentTermSummary.year.desc(), TERM_ORDER.desc()).first()
+        return tuple(row) if row else None
+
+    @staticmethod
+    def rebuild(year=None, batch_size=500):
+        """
+        Recompute every summary (or one year's) from grades in batches of
+        ``batch_size`` keys, committing after each batch. Rows whose grades
+        are gone are removed. Returns {"keys": n, "rows": n}.
+        """
+        graded = select(Grade.student_id, Grade.term, Grade.year).where(
+            Grade.term.isnot(None), Grade.year.isnot(None)
+        )
+        stored = select(
+            StudentTermSummary.student_id, StudentTermSummary.term, StudentTermSummary.year
+        )
+        if year:
+            graded = graded.where(Grade.year == year)
+            stored = stored.where(StudentTermSummary.year == year)
+        keys = [tuple(row) for row in db.session.execute(union(graded, stored))]
+
+        rows = 0
+        try:
+            for start in range(0, len(keys), batch_size):
+                rows += refresh_student_term_summary(
+                    db.session.connection(), keys[start : start + batch_size]
+                )
+                db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        return {"keys": len(keys), "rows": rows}
+
+
+term_summary_service = TermSummaryService()
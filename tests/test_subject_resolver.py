@@ -0,0 +1,35 @@
+import time
+import pytest
+from grade_import import parse_class_grade
+from subject_resolver import SubjectIndex, SubjectResolver, load_catalogue
+
+# Kiswahili and Mathematics exist at both Primary and Junior Secondary; the
+# Primary rows are older, so a resolver ignoring the level picks them.
+SUBJECTS = [
+    (1, "Kiswahili", "KISW", "Primary", None),
+    (2, "Mathematics", "MATH", "Primary", None),
+    (3, "Kiswahili", "KISWJS", "Junior Secondary", None),
+    (4, "Mathematics", "MATHJS", "Junior Secondary", None),
+]
+
+
+@pytest.fixture
+def resolver():
+    resolver = SubjectResolver()
+    resolver._index = SubjectIndex(SUBJECTS, load_catalogue())
+    resolver._loaded_at = time.monotonic()
+    return resolver
+
+
+@pytest.mark.parametrize(
+    "class_level, expected",
+    [("Grade 8", {"Kiswahili": 3, "Maths": 4}), ("Grade 4", {"Kiswahili": 1, "Maths": 2})],
+)
+def test_name_at_two_levels_follows_class_grade(resolver, class_level, expected):
+    class_grade = parse_class_grade(class_level)
+    for name, subject_id in expected.items():
+        assert resolver.resolve(name, class_grade=class_grade) == subject_id
+
+
+def test_explicit_level_wins_over_class_grade(resolver):
+    assert resolver.resolve("Kiswahili", "Primary", class_grade=8) == 1
@@ -1,54 +1,28 @@
 # utils.py
 # Utility functions for grades, CBC rubrics, and styling
 from reportlab.platypus import SimpleDocTemplate, Paragraph, Table, TableStyle, Spacer
-from reportlab.lib.pagesizes import A4
+from reportlab.lib.pagesizes import A4, landscape
+from reportlab.pdfgen import canvas
 from reportlab.lib.styles import getSampleStyleSheet
 from reportlab.lib import colors
 from io import BytesIO
 from datetime import datetime
+import tempfile
+from rubric import rubric
 
 
 def numeric_to_cbc(mark: float) -> str:
     """
-    Converts a numeric mark (0-100) to a CBC rubric.
+    Converts a numeric mark (0-100) to a CBC rubric code (see rubric.py).
     """
-    mark = float(mark)
-    if mark >= 90:
-        return "EE1"
-    elif mark >= 80:
-        return "EE2"
-    elif mark >= 70:
-        return "EE3"
-    elif mark >= 60:
-        return "ME1"
-    elif mark >= 50:
-        return "ME2"
-    elif mark >= 40:
-        return "ME3"
-    elif mark >= 30:
-        return "BE1"
-    elif mark >= 20:
-        return "BE2"
-    else:
-        return "BE3"
-
-
-def rubric_color(rubric: str) -> str:
+    return rubric().code(mark)
+
+
+def rubric_color(rubric_code: str) -> str:
     """
     Returns a color associated with the CBC rubric for styling.
     """
-    colors = {
-        "EE1": "green",
-        "EE2": "limegreen",
-        "EE3": "yellowgreen",
-        "ME1": "yellow",
-        "ME2": "orange",
-        "ME3": "darkorange",
-        "BE1": "red",
-        "BE2": "darkred",
-        "BE3": "maroon",
-    }
-    return colors.get(rubric, "black")
+    return rubric().color(rubric_code)
 
 
 def generate_receipt_pdf(payment):
@@ -103,3 +77,62 @@ class SchoolPDF:
         self.doc.build(self.story)
         self.buffer.seek(0)
         return self.buffer
+
+
+def write_table_pdf(rows, keys, labels, title, amount_keys=(), rows_per_page=32):
+    """
+    Draw a landscape table page by page as ``rows`` (dicts) arrive and return a
+    spooled file. Only the current page is held in Python; large PDFs spill to
+    disk. Columns in ``amount_keys`` are right-aligned and totalled.
+    """
+    out = tempfile.SpooledTemporaryFile(max_size=5 * 1024 * 1024)
+    page_w, page_h = landscape(A4)
+    pdf = canvas.Canvas(out, pagesize=(page_w, page_h))
+    col_w = (page_w - 60) / len(labels)
+    max_chars = max(int(col_w / 4.5), 6)
+    generated = datetime.utcnow().strftime("%Y-%m-%d %H:%M UTC")
+    totals = {key: 0.0 for key in amount_keys}
+
+    def start_page(page_no):
+        pdf.setFont("Helvetica-Bold", 13)
+        pdf.drawString(30, page_h - 35, title)
+        pdf.setFont("Helvetica", 8)
+        pdf.drawRightString(page_w - 30, page_h - 35, f"{generated} - page {page_no}")
+        pdf.setFont("Helvetica-Bold", 8)
+        for i, label in enumerate(labels):
+            pdf.drawString(30 + i * col_w, page_h - 60, label)
+        pdf.line(30, page_h - 64, page_w - 30, page_h - 64)
+        pdf.setFont("Helvetica", 8)
+
+    page_no, line = 1, 0
+    start_page(page_no)
+    for row in rows:
+        if line == rows_per_page:
+            pdf.showPage()
+            page_no, line = page_no + 1, 0
+            start_page(page_no)
+        y = page_h - 78 - line * 14
+        for i, key in enumerate(keys):
+            value = row[key]
+            if key in totals:
+                totals[key] += float(value or 0)
+                pdf.drawRightString(30 + (i + 1) * col_w - 6, y, f"{value or 0:,.2f}")
+            else:
+                pdf.drawString(30 + i * col_w, y, str(value or "")[:max_chars])
+        line += 1
+
+    if totals:
+        if line >= rows_per_page:
+            pdf.showPage()
+            page_no, line = page_no + 1, 0
+            start_page(page_no)
+        pdf.setFont("Helvetica-Bold", 8)
+        y = page_h - 78 - line * 14 - 6
+        pdf.line(30, y + 10, page_w - 30, y + 10)
+        pdf.drawString(30, y, "TOTAL")
+        for i, key in enumerate(keys):
+            if key in totals:
+                pdf.drawRightString(30 + (i + 1) * col_w - 6, y, f"{totals[key]:,.2f}")
+    pdf.save()
+    out.seek(0)
+    return out